@@ -0,0 +1,89 @@
+import os
+import gc
+import logging
+from typing import Any, Dict, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16, "fp32": torch.float32}
+
+def resolve_device(device: str = "auto") -> str:
+    """Maps "auto" to cuda when available; a CUDA device on a GPU-less box falls back to the CPU."""
+    device = (device or "auto").lower()
+    if device == "auto": return "cuda" if torch.cuda.is_available() else "cpu"
+    if device.startswith("cuda") and not torch.cuda.is_available():
+        logger.warning(f"Device '{device}' requested but CUDA is not available, using the CPU")
+        return "cpu"
+    return device
+
+def cpu_supports_bf16() -> bool:
+    """True if the CPU has native bf16 matmuls (AVX512-BF16 or AMX); elsewhere bf16 is emulated and slow."""
+    try:
+        return torch.cpu._is_avx512_bf16_supported() or torch.cpu._is_amx_tile_supported()
+    except AttributeError:
+        return False
+
+def resolve_dtype(device: str, dtype: str = "auto") -> torch.dtype:
+    """fp16 on GPUs; on CPUs bf16 where the hardware supports it, else fp32 (CPU fp16 kernels are slow)."""
+    dtype = (dtype or "auto").lower()
+    if dtype in DTYPES: return DTYPES[dtype]
+    if dtype != "auto": logger.warning(f"Unknown dtype '{dtype}', using auto")
+    if not device.startswith("cpu"): return torch.float16
+    return torch.bfloat16 if cpu_supports_bf16() else torch.float32
+
+class ExecutionBackend:
+    """
+    Device, dtype and kernel settings of the engine.
+
+    On the CPU it sets the intra-op thread count and can switch the UNet and VAE to
+    channels_last, which the oneDNN convolutions prefer. torch.compile of the UNet is
+    optional on every device; the first generation then pays for the compilation.
+    """
+
+    def __init__(self, device: str = "auto", dtype: str = "auto", num_threads: Optional[int] = None,
+                 channels_last: Optional[bool] = None, compile_unet: bool = False):
+        self.device = resolve_device(device)
+        self.dtype = resolve_dtype(self.device, dtype)
+        self.is_cpu = self.device.startswith("cpu")
+        self.is_cuda = self.device.startswith("cuda")
+        # Default: channels_last only where it is a measurable win (CPU convolutions)
+        self.channels_last = self.is_cpu if channels_last is None else channels_last
+        self.compile_unet = compile_unet
+
+        if self.is_cpu:
+            # Default: every core this process may run on (respects taskset/cgroup pinning)
+            threads = num_threads or (len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count())
+            torch.set_num_threads(max(1, threads or 1))
+        elif num_threads:
+            torch.set_num_threads(num_threads)
+        logger.info(f"Execution backend: {self.device}, {self.dtype_name}, {torch.get_num_threads()} threads")
+
+    @property
+    def dtype_name(self) -> str:
+        return next(name for name, dt in DTYPES.items() if dt == self.dtype)
+
+    def optimize(self, pipeline: Any) -> None:
+        """Applies attention kernels, memory format and compilation to a loaded pipeline."""
+        if self.is_cuda:
+            try: pipeline.enable_xformers_memory_efficient_attention()
+            except Exception: pipeline.enable_attention_slicing()
+        if self.channels_last:
+            for name in ("unet", "vae"):
+                module = getattr(pipeline, name, None)
+                if module is not None: module.to(memory_format=torch.channels_last)
+        if self.compile_unet and getattr(pipeline.unet, "_compiled_call_impl", None) is None:
+            try:
+                # In place, so the pipeline keeps a plain UNet (LoRA adapters, offload hooks)
+                pipeline.unet.compile(mode="reduce-overhead" if self.is_cuda else "default")
+            except Exception as e:
+                logger.warning(f"torch.compile failed, running eagerly: {e}")
+
+    def empty_cache(self) -> None:
+        gc.collect()
+        if self.is_cuda: torch.cuda.empty_cache()
+
+    def status(self) -> Dict[str, Any]:
+        return {"device": self.device, "dtype": self.dtype_name, "threads": torch.get_num_threads(),
+                "channels_last": self.channels_last, "compile_unet": self.compile_unet}
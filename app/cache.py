@@ -0,0 +1,265 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def module_bytes(modules: Iterable[Any]) -> int:
+    """
+    Sums the parameter and buffer sizes of the given torch modules.
+    Modules appearing more than once (e.g. a shared VAE) are only counted once.
+    """
+    seen = set()
+    total = 0
+    for module in modules:
+        if not isinstance(module, torch.nn.Module) or id(module) in seen:
+            continue
+        seen.add(id(module))
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def tensor_bytes(tensors: Iterable[Optional[torch.Tensor]]) -> int:
+    """Sums the storage size of the given tensors, ignoring None entries."""
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and an optional byte budget.
+
+    The most recently inserted entry is never evicted, even if it alone exceeds
+    the budget. Hit, miss and eviction counters are kept for reporting.
+    """
+
+    def __init__(self, max_entries: int, budget_bytes: Optional[int] = None):
+        self.max_entries = max(1, max_entries)
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def size_of(self, value: Any) -> int:
+        """Estimates the memory footprint of a value. Overridden by subclasses."""
+        return 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for key (marking it most recently used) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size_bytes: Optional[int] = None) -> List[Hashable]:
+        """
+        Inserts a value and evicts old entries until the limits are respected.
+        Returns the keys that were evicted so the caller can release memory.
+        """
+        if size_bytes is None:
+            size_bytes = self.size_of(value)
+
+        evicted: List[Hashable] = []
+        with self._lock:
+            self._entries[key] = (value, size_bytes)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > 1 and self._over_limit():
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+                self.evictions += 1
+        return evicted
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Removes an entry without counting it as an eviction."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[0] if entry else None
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Removes all entries whose key matches predicate. Returns the number removed."""
+        with self._lock:
+            stale = [k for k in self._entries if predicate(k)]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _over_limit(self) -> bool:
+        if len(self._entries) > self.max_entries:
+            return True
+        if self.budget_bytes is not None:
+            return sum(size for _, size in self._entries.values()) > self.budget_bytes
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable snapshot of the cache state and counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(size for _, size in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class PipelineCache(LRUCache):
+    """
+    LRU cache for fully constructed diffusers pipelines.
+    The engine keys entries by model id; LoRAs are adapters on top (see app.lora).
+    """
+
+    def __init__(self, max_entries: int = 3, budget_bytes: Optional[int] = None):
+        super().__init__(max_entries, budget_bytes)
+
+    def size_of(self, value: Any) -> int:
+        return module_bytes(getattr(value, "components", {}).values())
+
+    def put(self, key: Hashable, value: Any, size_bytes: Optional[int] = None) -> List[Hashable]:
+        evicted = super().put(key, value, size_bytes)
+        for old_key in evicted:
+            logger.info(f"Evicted pipeline from cache: {old_key}")
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        with self._lock:
+            data["keys"] = [list(k) if isinstance(k, tuple) else k for k in self._entries.keys()]
+        return data
+
+
+class LoraCache(LRUCache):
+    """
+    LRU cache of raw LoRA state dicts in CPU memory.
+    Keys are (absolute path, mtime); values are {name: tensor} dicts.
+    """
+
+    def __init__(self, max_entries: int = 32, budget_bytes: Optional[int] = 1024**3):
+        super().__init__(max_entries, budget_bytes)
+
+    def size_of(self, value: Any) -> int:
+        return tensor_bytes(value.values())
+
+
+class FusedLoraCache(LRUCache):
+    """
+    LRU cache of LoRA-fused base weights in CPU memory.
+    Keys are (model key, LoRA set with weights); values are {layer name: fused weight}.
+
+    The original weights a pipeline keeps for unfusing are charged to the same budget
+    via reserve(). They cannot be evicted while the pipeline lives, so fused variants
+    make room for them instead.
+    """
+
+    def __init__(self, max_entries: int = 4, budget_bytes: Optional[int] = 2 * 1024**3):
+        super().__init__(max_entries, budget_bytes)
+        self._reserved: Dict[Hashable, int] = {}
+
+    def size_of(self, value: Any) -> int:
+        return tensor_bytes(value.values())
+
+    @property
+    def reserved_bytes(self) -> int:
+        with self._lock:
+            return sum(self._reserved.values())
+
+    def reserve(self, model_key: Hashable, size_bytes: int) -> List[Hashable]:
+        """Adds original weights of a pipeline to the budget and evicts fused variants over it."""
+        evicted: List[Hashable] = []
+        with self._lock:
+            self._reserved[model_key] = self._reserved.get(model_key, 0) + size_bytes
+            while self._entries and self._over_limit():
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+                self.evictions += 1
+        return evicted
+
+    def drop_model(self, model_key: Hashable) -> int:
+        with self._lock:
+            self._reserved.pop(model_key, None)
+        return self.discard_where(lambda k: k[0] == model_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reserved.clear()
+        super().clear()
+
+    def _over_limit(self) -> bool:
+        if len(self._entries) > self.max_entries:
+            return True
+        if self.budget_bytes is not None:
+            used = sum(size for _, size in self._entries.values()) + sum(self._reserved.values())
+            return used > self.budget_bytes
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        data["reserved_bytes"] = self.reserved_bytes
+        return data
+
+
+class Conditioning(NamedTuple):
+    """Prompt conditioning tensors as consumed by StableDiffusionXLPipeline."""
+    embeds: torch.Tensor
+    pooled_embeds: torch.Tensor
+    negative_embeds: Optional[torch.Tensor]
+    negative_pooled_embeds: Optional[torch.Tensor]
+
+    @classmethod
+    def from_compel(cls, cond: Any, device: str = "cpu") -> "Conditioning":
+        """Detaches Compel output and moves it off the GPU so cached entries hold no VRAM."""
+        def _move(t: Optional[torch.Tensor]) -> Optional[torch.Tensor]:
+            return t.detach().to(device) if t is not None else None
+        return cls(
+            _move(cond.embeds), _move(cond.pooled_embeds),
+            _move(cond.negative_embeds), _move(cond.negative_pooled_embeds)
+        )
+
+
+class ConditioningCache(LRUCache):
+    """
+    LRU cache of encoded prompt conditioning.
+    Keys are (model identity, prompt, negative prompt); values are Conditioning tuples.
+    """
+
+    def __init__(self, max_entries: int = 64, budget_bytes: Optional[int] = 256 * 1024**2):
+        super().__init__(max_entries, budget_bytes)
+
+    def size_of(self, value: Any) -> int:
+        return tensor_bytes(value)
+
+    def drop_model(self, model_key: Hashable) -> int:
+        """Forgets all conditioning produced by the given model (e.g. after eviction)."""
+        return self.discard_where(lambda k: k[0] == model_key)
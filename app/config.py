@@ -61,6 +61,44 @@ class SessionConfig:
         self.lora_path: Optional[str] = None
         self.lora_scale: float = 0.8
         
+        # Pipeline cache (number of checkpoints kept loaded, optional memory budget in GB)
+        self.pipeline_cache_size: int = 3
+        self.pipeline_cache_budget_gb: Optional[float] = None
+        
+        # Minimum seconds between live latent previews streamed to remote clients
+        self.preview_interval: float = 0.5
+        
+        # Keep the gallery in sync with output_images without rescans (inotify, else polling)
+        self.watch_library: bool = False
+        self.watch_poll_interval: float = 10.0
+        
+        # Size limit of the on-disk thumbnail cache (least recently used files are evicted)
+        self.thumbnail_cache_mb: int = 512
+        
+        # LoRA files kept in RAM as state dicts, and adapters kept loaded per checkpoint
+        self.lora_cache_mb: int = 1024
+        self.max_lora_adapters: int = 8
+        # Fuse the active LoRAs into the base weights; fused variants are cached up to fused_lora_cache_mb
+        self.fuse_loras: bool = False
+        self.fused_lora_cache_mb: int = 2048
+        
+        # Weight placement: auto, resident, vae_tiling, model_offload or sequential_offload
+        # (the KAMI_OFFLOAD_MODE environment variable takes precedence)
+        self.offload_mode: str = "auto"
+        
+        # Execution backend: device (auto, cuda, cpu), dtype (auto, fp16, bf16, fp32),
+        # intra-op threads (0 = all available cores), channels_last (None = CPU only), torch.compile of the UNet
+        self.device: str = "auto"
+        self.dtype: str = "auto"
+        self.num_threads: int = 0
+        self.channels_last: Optional[bool] = None
+        self.compile_unet: bool = False
+        
+        # Load model_path (and optionally the refiner) at startup and run a short dummy denoise
+        self.warmup_on_start: bool = True
+        self.warmup_refiner: bool = False
+        self.warmup_steps: int = 2
+        
         # Style configuration
         self.current_style: str = "None"
         
@@ -142,6 +180,25 @@ class SessionConfig:
                 self.pony_mode = data.get("pony_mode", self.pony_mode)
                 self.current_style = data.get("current_style", self.current_style)
                 self.use_freeu = data.get("use_freeu", self.use_freeu)
+                self.pipeline_cache_size = data.get("pipeline_cache_size", self.pipeline_cache_size)
+                self.pipeline_cache_budget_gb = data.get("pipeline_cache_budget_gb", self.pipeline_cache_budget_gb)
+                self.preview_interval = data.get("preview_interval", self.preview_interval)
+                self.watch_library = data.get("watch_library", self.watch_library)
+                self.watch_poll_interval = data.get("watch_poll_interval", self.watch_poll_interval)
+                self.thumbnail_cache_mb = data.get("thumbnail_cache_mb", self.thumbnail_cache_mb)
+                self.lora_cache_mb = data.get("lora_cache_mb", self.lora_cache_mb)
+                self.max_lora_adapters = data.get("max_lora_adapters", self.max_lora_adapters)
+                self.fuse_loras = data.get("fuse_loras", self.fuse_loras)
+                self.fused_lora_cache_mb = data.get("fused_lora_cache_mb", self.fused_lora_cache_mb)
+                self.offload_mode = data.get("offload_mode", self.offload_mode)
+                self.device = data.get("device", self.device)
+                self.dtype = data.get("dtype", self.dtype)
+                self.num_threads = data.get("num_threads", self.num_threads)
+                self.channels_last = data.get("channels_last", self.channels_last)
+                self.compile_unet = data.get("compile_unet", self.compile_unet)
+                self.warmup_on_start = data.get("warmup_on_start", self.warmup_on_start)
+                self.warmup_refiner = data.get("warmup_refiner", self.warmup_refiner)
+                self.warmup_steps = data.get("warmup_steps", self.warmup_steps)
                 
                 if "freeu_args" in data:
                     self.freeu_args = data["freeu_args"]
@@ -162,7 +219,26 @@ class SessionConfig:
             "pony_mode": self.pony_mode,
             "current_style": self.current_style,
             "use_freeu": self.use_freeu,
-            "freeu_args": self.freeu_args
+            "freeu_args": self.freeu_args,
+            "pipeline_cache_size": self.pipeline_cache_size,
+            "pipeline_cache_budget_gb": self.pipeline_cache_budget_gb,
+            "preview_interval": self.preview_interval,
+            "watch_library": self.watch_library,
+            "watch_poll_interval": self.watch_poll_interval,
+            "thumbnail_cache_mb": self.thumbnail_cache_mb,
+            "lora_cache_mb": self.lora_cache_mb,
+            "max_lora_adapters": self.max_lora_adapters,
+            "fuse_loras": self.fuse_loras,
+            "fused_lora_cache_mb": self.fused_lora_cache_mb,
+            "offload_mode": self.offload_mode,
+            "device": self.device,
+            "dtype": self.dtype,
+            "num_threads": self.num_threads,
+            "channels_last": self.channels_last,
+            "compile_unet": self.compile_unet,
+            "warmup_on_start": self.warmup_on_start,
+            "warmup_refiner": self.warmup_refiner,
+            "warmup_steps": self.warmup_steps
         }
         try:
             with open(SESSION_FILE, 'w', encoding='utf-8') as f:
@@ -1,23 +1,100 @@
 import sqlite3
 import os
-import glob
+import re
+import json
+import base64
 import logging
+import threading
 from datetime import datetime
-from typing import List, Optional, Any, Tuple, Dict
-from PIL import Image
+from typing import List, Optional, Any, Tuple, Dict, NamedTuple
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 DB_FILE = "library.db"
 
-def init_db() -> None:
+# Seconds a statement waits for another writer before failing with "database is locked"
+BUSY_TIMEOUT = 15.0
+
+# True once images_fts is populated; until then searches fall back to LIKE
+_fts_ready = False
+
+# --- CONNECTIONS ---
+
+_local = threading.local()
+_connections_lock = threading.Lock()
+# Open connections by owning thread; entries of finished threads are closed lazily
+_connections: Dict[threading.Thread, sqlite3.Connection] = {}
+# Bumped by close_connections() so every thread reconnects
+_generation = 0
+_initialized: set = set()
+_init_lock = threading.Lock()
+
+def _connect(path: str) -> sqlite3.Connection:
+    # check_same_thread is off only so close_connections() can close them; each thread uses its own
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=256, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers (UI, API) run while the writer/scanner commits
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-32768")      # 32 MB page cache
+    conn.execute("PRAGMA mmap_size=268435456")    # 256 MB memory-mapped reads
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns this thread's connection to DB_FILE, opening it on first use.
+    Connections stay open for the life of the thread so the statement cache is reused.
+    Use `with conn:` around writes to commit (or roll back) them.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == (DB_FILE, _generation):
+        return conn
+
+    if conn is not None and _local.key[1] == _generation:
+        conn.close()
+    conn = _connect(DB_FILE)
+    _local.conn, _local.key = conn, (DB_FILE, _generation)
+
+    stale = []
+    with _connections_lock:
+        for thread in [t for t in _connections if not t.is_alive()]:
+            stale.append(_connections.pop(thread))
+        _connections[threading.current_thread()] = conn
+    for old in stale:
+        try: old.close()
+        except sqlite3.Error: pass
+    return conn
+
+def close_connections() -> None:
+    """Closes all pooled connections (e.g. on shutdown). Threads reconnect on next use."""
+    global _generation
+    with _connections_lock:
+        conns = list(_connections.values())
+        _connections.clear()
+        _generation += 1
+    for conn in conns:
+        try: conn.close()
+        except sqlite3.Error: pass
+
+def init_db(force: bool = False) -> None:
     """
     Initializes the SQLite database tables if they do not exist.
     Creates tables for: images (gallery), characters, and presets.
+    Runs once per database file and process unless force is set.
     """
+    with _init_lock:
+        if DB_FILE in _initialized and not force: return
+        _init_db()
+        _initialized.add(DB_FILE)
+
+def _init_db() -> None:
+    global _fts_ready
+    rebuild_fts = False
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         with conn:
             c = conn.cursor()
             
@@ -33,10 +110,37 @@ def init_db() -> None:
                     cfg REAL,
                     seed TEXT,
                     timestamp DATETIME,
-                    favorite INTEGER DEFAULT 0
+                    favorite INTEGER DEFAULT 0,
+                    metrics TEXT
                 )
             ''')
 
+            # Migration: older libraries lack the generation metrics column
+            c.execute("PRAGMA table_info(images)")
+            if "metrics" not in [row[1] for row in c.fetchall()]:
+                c.execute("ALTER TABLE images ADD COLUMN metrics TEXT")
+
+            # Indexes for the gallery sort orders (keyset pagination walks these). They index the
+            # exact sort key from _sort_expr, otherwise SQLite scans and sorts the whole table
+            c.execute("DROP INDEX IF EXISTS idx_images_timestamp")
+            c.execute("DROP INDEX IF EXISTS idx_images_steps")
+            for column in _NULL_SORT_KEYS:
+                c.execute(f"CREATE INDEX IF NOT EXISTS idx_images_sort_{column} ON images ({_sort_expr(column)}, id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_images_model ON images (model)")
+
+            # Small key/value table for migration state
+            c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+            # Folder mtimes seen by the last library scan (unchanged folders are skipped)
+            c.execute("CREATE TABLE IF NOT EXISTS scan_state (dir TEXT PRIMARY KEY, mtime REAL)")
+
+            # Full-text index over the searchable image columns
+            if _create_fts(c):
+                c.execute("SELECT value FROM meta WHERE key = 'fts_ready'")
+                row = c.fetchone()
+                _fts_ready = bool(row and row[0] == "1")
+                rebuild_fts = not _fts_ready
+
             # 2. Characters Table
             c.execute('''
                 CREATE TABLE IF NOT EXISTS characters (
@@ -66,9 +170,68 @@ def init_db() -> None:
             
     except sqlite3.Error as e:
         logger.error(f"Failed to initialize database: {e}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+    if rebuild_fts:
+        # Indexing a large existing library takes a while; don't block startup
+        threading.Thread(target=_rebuild_fts, name="FTSRebuild", daemon=True).start()
+
+def _create_fts(c: sqlite3.Cursor) -> bool:
+    """
+    Creates the images_fts table (external content over images) and its sync triggers.
+    Returns False if this SQLite build has no FTS5.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images_fts'")
+    if c.fetchone() is None:
+        try:
+            c.execute('''
+                CREATE VIRTUAL TABLE images_fts USING fts5(
+                    prompt, negative_prompt, seed, model,
+                    content='images', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 not available, search uses LIKE: {e}")
+            return False
+        # New libraries are ready right away, existing ones need a one-time rebuild
+        c.execute("SELECT EXISTS (SELECT 1 FROM images)")
+        ready = "0" if c.fetchone()[0] else "1"
+        c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_ready', ?)", (ready,))
+
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+            INSERT INTO images_fts (rowid, prompt, negative_prompt, seed, model)
+            VALUES (new.id, new.prompt, new.negative_prompt, new.seed, new.model);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+            INSERT INTO images_fts (images_fts, rowid, prompt, negative_prompt, seed, model)
+            VALUES ('delete', old.id, old.prompt, old.negative_prompt, old.seed, old.model);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE OF prompt, negative_prompt, seed, model ON images BEGIN
+            INSERT INTO images_fts (images_fts, rowid, prompt, negative_prompt, seed, model)
+            VALUES ('delete', old.id, old.prompt, old.negative_prompt, old.seed, old.model);
+            INSERT INTO images_fts (rowid, prompt, negative_prompt, seed, model)
+            VALUES (new.id, new.prompt, new.negative_prompt, new.seed, new.model);
+        END
+    ''')
+    return True
+
+def _rebuild_fts() -> None:
+    """Populates images_fts from the images table (one-time migration of existing libraries)."""
+    global _fts_ready
+    logger.info("Building full-text search index...")
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("INSERT INTO images_fts (images_fts) VALUES ('rebuild')")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_ready', '1')")
+        _fts_ready = True
+        logger.info("Full-text search index ready.")
+    except sqlite3.Error as e:
+        logger.error(f"Failed to build search index: {e}")
 
 # --- IMAGE OPERATIONS ---
 
@@ -79,29 +242,36 @@ def add_image_record(
     model: str, 
     steps: int, 
     cfg: float, 
-    seed: str | int
+    seed: str | int,
+    metrics: Optional[str] = None
 ) -> None:
-    """Inserts a new image record into the database."""
+    """
+    Inserts the record of a generated image. `metrics` is the JSON generation profile, if any.
+    If the library watcher or a scan indexed the file first, the generation fields replace
+    what was read from the PNG; id and timestamp of the row are kept.
+    """
     try:
         abs_path = os.path.abspath(path)
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         with conn:
             c = conn.cursor()
             c.execute('''
-                INSERT OR IGNORE INTO images (path, prompt, negative_prompt, model, steps, cfg, seed, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (abs_path, prompt, neg, model, steps, cfg, str(seed), datetime.now()))
+                INSERT INTO images (path, prompt, negative_prompt, model, steps, cfg, seed, timestamp, metrics)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    prompt = excluded.prompt, negative_prompt = excluded.negative_prompt, model = excluded.model,
+                    steps = excluded.steps, cfg = excluded.cfg, seed = excluded.seed,
+                    metrics = COALESCE(excluded.metrics, images.metrics)
+            ''', (abs_path, prompt, neg, model, steps, cfg, str(seed), datetime.now(), metrics))
         logger.debug(f"Added record for: {abs_path}")
     except sqlite3.Error as e:
         logger.error(f"Could not add record to DB: {e}")
-    finally:
-        if 'conn' in locals(): conn.close()
 
 def delete_image_record(path: str) -> bool:
     """Deletes an image record from the database based on its file path."""
     try:
         abs_path = os.path.abspath(path)
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         with conn:
             c = conn.cursor()
             c.execute("DELETE FROM images WHERE path = ?", (abs_path,))
@@ -109,55 +279,193 @@ def delete_image_record(path: str) -> bool:
     except sqlite3.Error as e:
         logger.error(f"Could not delete record: {e}")
         return False
-    finally:
-        if 'conn' in locals(): conn.close()
+
+def get_image(image_id: int) -> Optional[sqlite3.Row]:
+    """Returns one image record by id (None if it does not exist)."""
+    c = get_connection().cursor()
+    c.execute("SELECT * FROM images WHERE id = ?", (image_id,))
+    return c.fetchone()
+
+def get_image_by_path(path: str) -> Optional[sqlite3.Row]:
+    """Returns the image record of a file (None if it is not indexed)."""
+    c = get_connection().cursor()
+    c.execute("SELECT * FROM images WHERE path = ?", (os.path.abspath(path),))
+    return c.fetchone()
+
+# Sort column per gallery sort option; ties are broken by id so keyset cursors are stable
+_SORT_ORDERS: Dict[str, Tuple[str, str]] = {
+    "Newest": ("timestamp", "DESC"),
+    "Newest First": ("timestamp", "DESC"),
+    "Oldest": ("timestamp", "ASC"),
+    "Oldest First": ("timestamp", "ASC"),
+    "Steps (High-Low)": ("steps", "DESC"),
+    # bm25() scores are negative; lower means more relevant
+    "Relevance": ("score", "ASC"),
+}
+
+# Stand-ins for NULL sort values (legacy rows without timestamp or steps): a row comparison
+# with NULL is NULL, so such rows would never match a keyset cursor. Both sort as the lowest value.
+_NULL_SORT_KEYS: Dict[str, Tuple[str, Any]] = {
+    "timestamp": ("''", ""),
+    "steps": ("-1", -1),
+}
+
+def _sort_expr(column: str) -> str:
+    """SQL sort key of a column, with NULLs replaced by the column's stand-in."""
+    if column not in _NULL_SORT_KEYS: return column
+    return f"COALESCE({column}, {_NULL_SORT_KEYS[column][0]})"
+
+def _sort_value(row: sqlite3.Row, column: str) -> Any:
+    """The sort key of a fetched row, as _sort_expr computes it in SQL."""
+    value = row[column]
+    return _NULL_SORT_KEYS[column][1] if value is None and column in _NULL_SORT_KEYS else value
+
+class ImagePage(NamedTuple):
+    """One page of gallery rows. next_cursor is None on the last page; total only if requested."""
+    items: List[sqlite3.Row]
+    next_cursor: Optional[str]
+    total: Optional[int]
+
+_FTS_TERM = re.compile(r'(neg:)?(?:"([^"]*)"?|(\S+))')
+
+def fts_query(search_text: str) -> Optional[str]:
+    """
+    Translates gallery search input into an FTS5 MATCH expression.
+    Words match as prefixes ("lio" finds "lion"), "quoted text" as a phrase,
+    and neg:word searches the negative prompt. All terms must match.
+    """
+    terms = []
+    for m in _FTS_TERM.finditer(search_text):
+        neg, phrase, word = m.groups()
+        text = phrase if phrase is not None else word
+        if not re.search(r"\w", text or ""): continue
+        term = '"' + text.replace('"', '""') + '"'
+        if phrase is None: term += "*"
+        columns = "negative_prompt" if neg else "{prompt seed model}"
+        terms.append(f"{columns} : {term}")
+    return " AND ".join(terms) or None
+
+def _image_filters(search_text: str, model_filter: str, rank: bool = False) -> Tuple[str, str, List[Any]]:
+    """
+    Builds the FROM and WHERE clauses shared by the gallery queries.
+    With rank=True (and a full-text search) the bm25 score is available as `score`.
+    """
+    source = "images"
+    where = "WHERE 1=1"
+    params: List[Any] = []
+    
+    match = fts_query(search_text) if search_text and _fts_ready else None
+    if match and rank:
+        # Weights: prompt, negative prompt, seed, model
+        source = ("images JOIN (SELECT rowid AS fts_id, bm25(images_fts, 1.0, 0.3, 1.0, 0.5) AS score "
+                  "FROM images_fts WHERE images_fts MATCH ?) AS fts ON fts.fts_id = images.id")
+        params.append(match)
+    elif match:
+        where += " AND images.id IN (SELECT rowid FROM images_fts WHERE images_fts MATCH ?)"
+        params.append(match)
+    elif search_text:
+        where += " AND (prompt LIKE ? OR seed LIKE ? OR model LIKE ?)"
+        term = f"%{search_text}%"
+        params.extend([term, term, term])
+        
+    if model_filter and model_filter not in ["All Models", "All"]:
+        where += " AND model LIKE ?"
+        params.append(f"%{model_filter}%")
+    return source, where, params
+
+def _sort_order(sort_by: str, search_text: str) -> Tuple[str, str]:
+    column, direction = _SORT_ORDERS.get(sort_by, _SORT_ORDERS["Newest"])
+    if column == "score" and not (search_text and _fts_ready and fts_query(search_text)):
+        # Nothing to rank by
+        return _SORT_ORDERS["Newest"]
+    return column, direction
+
+def _encode_cursor(value: Any, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[Any, int]:
+    value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return value, int(row_id)
 
 def get_filtered_images(
     search_text: str = "", 
     sort_by: str = "Newest", 
     model_filter: str = "All"
 ) -> List[sqlite3.Row]:
-    """Queries the database with search filters and sorting."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
+    """Queries the database with search filters and sorting. Returns all matches; see get_images_page."""
+    conn = get_connection()
     try:
         c = conn.cursor()
-        query = "SELECT * FROM images WHERE 1=1"
-        params: List[Any] = []
-        
-        if search_text:
-            query += " AND (prompt LIKE ? OR seed LIKE ? OR model LIKE ?)"
-            term = f"%{search_text}%"
-            params.extend([term, term, term])
-            
-        if model_filter and model_filter not in ["All Models", "All"]:
-            query += " AND model LIKE ?"
-            params.append(f"%{model_filter}%")
-            
-        if sort_by in ["Newest First", "Newest"]:
-            query += " ORDER BY timestamp DESC"
-        elif sort_by in ["Oldest First", "Oldest"]:
-            query += " ORDER BY timestamp ASC"
-        elif sort_by == "Steps (High-Low)":
-            query += " ORDER BY steps DESC"
+        ranked = sort_by == "Relevance"
+        source, where, params = _image_filters(search_text, model_filter, rank=ranked)
+        query = f"SELECT images.* FROM {source} {where}"
+        if sort_by in _SORT_ORDERS:
+            column, direction = _sort_order(sort_by, search_text)
+            query += f" ORDER BY {_sort_expr(column)} {direction}"
             
         c.execute(query, params)
         return c.fetchall()
     except sqlite3.Error as e:
         logger.error(f"Database query error: {e}")
         return []
-    finally:
-        conn.close()
 
-def get_all_models() -> List[str]:
-    """Returns a list of all unique model names currently in the DB."""
-    conn = sqlite3.connect(DB_FILE)
+def get_images_page(
+    search_text: str = "", 
+    sort_by: str = "Newest", 
+    model_filter: str = "All",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    with_total: bool = False
+) -> ImagePage:
+    """
+    Returns one page of gallery rows, filtered and sorted in SQL.
+    Pass the previous page's next_cursor to continue (keyset pagination, cheap at any depth);
+    offset is only used without a cursor, e.g. to jump to a page number.
+    """
+    column, direction = _sort_order(sort_by, search_text)
+    ranked = column == "score"
+    conn = get_connection()
     try:
         c = conn.cursor()
-        c.execute("SELECT DISTINCT model FROM images")
-        return [r[0] for r in c.fetchall() if r[0]]
-    finally:
-        conn.close()
+        source, where, params = _image_filters(search_text, model_filter, rank=ranked)
+
+        total = None
+        if with_total:
+            c.execute(f"SELECT COUNT(*) FROM {source} {where}", params)
+            total = c.fetchone()[0]
+
+        query = f"SELECT images.*{', fts.score AS score' if ranked else ''} FROM {source} {where}"
+        page_params = list(params)
+        if cursor:
+            try:
+                value, last_id = _decode_cursor(cursor)
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"Invalid cursor: {cursor}") from e
+            query += f" AND ({_sort_expr(column)}, images.id) {'<' if direction == 'DESC' else '>'} (?, ?)"
+            page_params.extend([value, last_id])
+            offset = 0
+
+        # Fetch one extra row to know whether there is a next page
+        query += f" ORDER BY {_sort_expr(column)} {direction}, images.id {direction} LIMIT ? OFFSET ?"
+        page_params.extend([limit + 1, max(0, offset)])
+        c.execute(query, page_params)
+        rows = c.fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(_sort_value(rows[-1], column), rows[-1]["id"])
+        return ImagePage(rows, next_cursor, total)
+    except sqlite3.Error as e:
+        logger.error(f"Database query error: {e}")
+        return ImagePage([], None, 0 if with_total else None)
+
+def get_all_models() -> List[str]:
+    """Returns a list of all unique model names currently in the DB."""
+    c = get_connection().cursor()
+    c.execute("SELECT DISTINCT model FROM images")
+    return [r[0] for r in c.fetchall() if r[0]]
 
 # --- CHARACTER OPERATIONS ---
 
@@ -166,7 +474,7 @@ def get_all_models() -> List[str]:
 def add_character(name: str, description: str, trigger_words: str, preview_path: str = "", notes: str = "", default_lora: str = "None", lora_scale: float = 0.8) -> bool:
     """Adds a new character to the registry including LoRA settings."""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         with conn:
             c = conn.cursor()
             c.execute('''
@@ -181,36 +489,24 @@ def add_character(name: str, description: str, trigger_words: str, preview_path:
     except Exception as e:
         logger.error(f"Error adding character: {e}")
         return False
-    finally:
-        if 'conn' in locals(): conn.close()
 
 def get_characters() -> List[Dict[str, Any]]:
     """Returns all characters as a list of dictionaries."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    try:
-        c = conn.cursor()
-        # Ensure we select all columns, including new ones
-        c.execute("SELECT * FROM characters ORDER BY name ASC")
-        return [dict(row) for row in c.fetchall()]
-    finally:
-        conn.close()
+    c = get_connection().cursor()
+    # Ensure we select all columns, including new ones
+    c.execute("SELECT * FROM characters ORDER BY name ASC")
+    return [dict(row) for row in c.fetchall()]
 
 def delete_character(char_id: int) -> bool:
     """Deletes a character by ID."""
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        with conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM characters WHERE id = ?", (char_id,))
-        return True
-    finally:
-        if 'conn' in locals(): conn.close()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM characters WHERE id = ?", (char_id,))
+    return True
 
 def update_character(char_id: int, name: str, description: str, trigger_words: str, preview_path: str, notes: str, default_lora: str, lora_scale: float) -> bool:
     """Updates an existing character."""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         with conn:
             c = conn.cursor()
             c.execute('''
@@ -222,15 +518,13 @@ def update_character(char_id: int, name: str, description: str, trigger_words: s
     except Exception as e:
         logger.error(f"Error updating character: {e}")
         return False
-    finally:
-        if 'conn' in locals(): conn.close()
 
 # --- PRESET OPERATIONS ---
 
 def add_preset(name: str, model: str, lora: str, lora_scale: float, steps: int, cfg: float, prompt: str, neg: str) -> bool:
     """Adds a new generation preset."""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_connection()
         with conn:
             c = conn.cursor()
             c.execute('''
@@ -242,81 +536,22 @@ def add_preset(name: str, model: str, lora: str, lora_scale: float, steps: int,
     except sqlite3.IntegrityError:
         logger.warning(f"Preset '{name}' already exists.")
         return False
-    finally:
-        if 'conn' in locals(): conn.close()
 
 def get_presets() -> List[Dict[str, Any]]:
     """Returns all presets as a list of dictionaries."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    try:
-        c = conn.cursor()
-        c.execute("SELECT * FROM presets ORDER BY name ASC")
-        return [dict(row) for row in c.fetchall()]
-    finally:
-        conn.close()
+    c = get_connection().cursor()
+    c.execute("SELECT * FROM presets ORDER BY name ASC")
+    return [dict(row) for row in c.fetchall()]
 
 def delete_preset(preset_id: int) -> bool:
     """Deletes a preset by ID."""
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        with conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM presets WHERE id = ?", (preset_id,))
-        return True
-    finally:
-        if 'conn' in locals(): conn.close()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM presets WHERE id = ?", (preset_id,))
+    return True
 
 # --- UTILS ---
 
 def scan_and_import_folder(base_dir: str = "output_images") -> int:
-    """Scans output folder for new PNGs."""
-    init_db()
-    conn = sqlite3.connect(DB_FILE)
-    new_count = 0
-    
-    try:
-        c = conn.cursor()
-        c.execute("SELECT path FROM images")
-        existing_paths = set(r[0] for r in c.fetchall())
-        search_path = os.path.join(base_dir, "**", "*.png")
-        found_files = glob.glob(search_path, recursive=True)
-        
-        with conn:
-            for file_path in found_files:
-                abs_path = os.path.abspath(file_path)
-                if abs_path not in existing_paths:
-                    try:
-                        prompt = "Unknown"; neg = ""; steps = 0; cfg = 0.0; seed = "Random"; model = "Unknown"
-                        with Image.open(abs_path) as img:
-                            img.load()
-                            params = img.info.get("parameters", "")
-                            
-                        if params:
-                            lines = params.split('\n')
-                            if len(lines) > 0: prompt = lines[0]
-                            for line in lines:
-                                if line.startswith("Negative prompt:"): neg = line.split(":", 1)[1].strip()
-                                if "Steps:" in line:
-                                    parts = line.split(", ")
-                                    for p in parts:
-                                        if "Steps:" in p: 
-                                            try: steps = int(p.split(":")[1])
-                                            except ValueError: pass
-                                        if "CFG scale:" in p: 
-                                            try: cfg = float(p.split(":")[1])
-                                            except ValueError: pass
-                                        if "Seed:" in p: seed = p.split(":")[1].strip()
-                                        if "Model:" in p: model = p.split(":")[1].strip()
-
-                        ts = datetime.fromtimestamp(os.path.getmtime(abs_path))
-                        c.execute('''
-                            INSERT INTO images (path, prompt, negative_prompt, model, steps, cfg, seed, timestamp)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (abs_path, prompt, neg, model, steps, cfg, seed, ts))
-                        new_count += 1
-                    except Exception as e:
-                        logger.warning(f"Skipping corrupt file {file_path}: {e}")
-        return new_count
-    finally:
-        conn.close()
+    """Scans output folder for new PNGs. See app.scanner.scan_library for the options."""
+    from app.scanner import scan_library  # scanner imports this module
+    return scan_library(base_dir)
@@ -7,20 +7,34 @@ from diffusers import (
 )
 from compel import CompelForSDXL
 from PIL import Image
-from PIL.PngImagePlugin import PngInfo
 import os
-import gc
 import re
+import time
 import logging
 import threading
 from datetime import datetime
-from typing import Optional, Dict, Any, Union, Callable
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Union, Callable, Tuple, List, Iterable
 
 # Import Database Function
-from app.database import add_image_record, init_db
+from app.database import init_db
+from app.image_writer import ImageWriter
+from app.cache import PipelineCache, ConditioningCache, Conditioning, module_bytes
+from app.metrics import MetricsRegistry, GenerationProfile
+from app.thumbnails import ThumbnailService
+from app.lora import LoraManager, LoraSpec, normalize_loras, format_loras
+from app.offload import OffloadPolicy, MODEL_OFFLOAD, SEQUENTIAL_OFFLOAD
+from app.backend import ExecutionBackend
 
 logger = logging.getLogger(__name__)
 
+# Edge length of the throwaway warm-up image: 32x32 latents, cheap even on the CPU
+WARMUP_SIZE = 256
+
+# Readiness of the engine for the next generation:
+# nothing loaded / weights loading / loaded but no denoise run yet / kernels warm
+COLD, LOADING, WARM, READY = "cold", "loading", "warm", "ready"
+
 class GenerationCancelled(Exception):
     """Custom exception to handle generation cancellation."""
     pass
@@ -35,19 +49,60 @@ class T2IEngine:
     def __init__(self, 
                  base_model_id: str = "stabilityai/stable-diffusion-xl-base-1.0", 
                  refiner_model_id: str = "stabilityai/stable-diffusion-xl-refiner-1.0",
-                 device: str = "cuda"):
+                 device: str = "cuda",
+                 pipeline_cache_size: int = 3,
+                 pipeline_cache_budget_gb: Optional[float] = None,
+                 thumbnail_cache_mb: int = 512,
+                 lora_cache_mb: int = 1024,
+                 max_lora_adapters: int = 8,
+                 fuse_loras: bool = False,
+                 fused_lora_cache_mb: int = 2048,
+                 offload_mode: str = "auto",
+                 dtype: str = "auto",
+                 num_threads: Optional[int] = None,
+                 channels_last: Optional[bool] = None,
+                 compile_unet: bool = False):
         self.base_model_id = base_model_id
         self.refiner_model_id = refiner_model_id
-        self.device = device
+        # Resolves "auto"/missing CUDA to the CPU and picks the dtype (fp16 on GPUs, bf16/fp32 on CPUs)
+        self.backend = ExecutionBackend(device, dtype, num_threads, channels_last, compile_unet)
+        self.device = self.backend.device
+        self.dtype = self.backend.dtype
         
         self.base_pipeline: Optional[StableDiffusionXLPipeline] = None
+        # Key (model id,) of the pipeline currently assigned to base_pipeline
+        self._base_key: Optional[tuple] = None
+        budget = int(pipeline_cache_budget_gb * 1024**3) if pipeline_cache_budget_gb else None
+        self.pipeline_cache = PipelineCache(max_entries=pipeline_cache_size, budget_bytes=budget)
+        self.conditioning_cache = ConditioningCache()
+        # LoRAs are named adapters on the cached pipelines, switched per job without reloading
+        self.loras = LoraManager(cache_mb=lora_cache_mb, max_adapters=max_lora_adapters, fused_cache_mb=fused_lora_cache_mb)
+        # Fuse the active LoRAs into the base weights (faster steps, costs a fuse on every change)
+        self.fuse_loras = fuse_loras
         self.refiner_pipeline: Optional[StableDiffusionXLImg2ImgPipeline] = None
         self.vae: Optional[AutoencoderKL] = None
+        # Where weights live (resident, VAE tiling, model/sequential offload); "auto" decides from free VRAM
+        self.offload = OffloadPolicy(offload_mode, self.device)
+        
+        # Per-stage timings (rolling) and the profile of the job currently running
+        self.metrics = MetricsRegistry()
+        self._profile: Optional[GenerationProfile] = None
+        
+        # Shared by both UIs and the API; new images get their thumbnails right after saving
+        self.thumbnails = ThumbnailService(max_bytes=thumbnail_cache_mb * 1024 * 1024)
+        
+        # PNG encoding, disk write and DB insert run off the engine lock
+        self.image_writer = ImageWriter(metrics=self.metrics, thumbnails=self.thumbnails)
         
         # Mutex lock & Cancel Event
         self.lock = threading.Lock()
         self.abort_event = threading.Event()
         
+        # Readiness state for UIs and /api/status; listeners are called with the new state
+        self.readiness = COLD
+        self.readiness_error: Optional[str] = None
+        self._readiness_listeners: List[Callable[[str], None]] = []
+        
         # Ensure DB exists
         init_db()
         
@@ -55,67 +110,103 @@ class T2IEngine:
         if self.vae is not None: return self.vae
         logger.info("Loading VAE (fp16-fix)...")
         try:
-            self.vae = AutoencoderKL.from_pretrained("madebyollin/sdxl-vae-fp16-fix", torch_dtype=torch.float16)
+            with self.metrics.timer("vae_load", self._profile):
+                self.vae = AutoencoderKL.from_pretrained("madebyollin/sdxl-vae-fp16-fix", torch_dtype=self.dtype)
+            # Shared by all pipelines whatever their offload mode, so it stays on the device
+            self.offload.pin(self.vae)
             return self.vae
         except Exception as e:
             logger.error(f"Failed to load VAE: {e}")
             raise
 
-    def load_base_model(self, lora_path: Optional[str] = None) -> None:
-        if self.base_pipeline is not None:
-            has_lora_loaded = getattr(self.base_pipeline, "has_lora", False)
-            lora_needs_reload = (lora_path and not has_lora_loaded) or \
-                                (not lora_path and has_lora_loaded)
-            if lora_needs_reload:
-                logger.info("Reloading pipeline due to LoRA change configuration.")
-                self.base_pipeline = None
-            else:
-                return
+    def pipeline_key(self, model_id: Optional[str] = None) -> tuple:
+        """Cache key identifying a base pipeline. LoRAs are adapters on top and not part of it."""
+        return (model_id or self.base_model_id,)
+
+    @property
+    def loaded_key(self) -> Optional[tuple]:
+        """Pipeline key of the currently active base pipeline, or None if nothing is loaded."""
+        return self._base_key if self.base_pipeline is not None else None
+
+    def load_base_model(self, loras: Optional[List[LoraSpec]] = None) -> None:
+        """Makes the pipeline of base_model_id current and activates the given LoRAs on it."""
+        self._activate_base_pipeline()
+        self.offload.configure_vae(self.base_pipeline)
+        # Sequentially offloaded weights live in accelerate hooks and cannot be fused in place
+        fuse = self.fuse_loras and self.offload.mode_of(self.base_pipeline) != SEQUENTIAL_OFFLOAD
+        seconds = self.loras.apply(self.base_pipeline, loras or [], fuse=fuse, model_key=self._base_key)
+        if seconds: self._record_stage("lora_load", seconds)
+
+    def _activate_base_pipeline(self) -> None:
+        key = self.pipeline_key()
+        if self.base_pipeline is not None and self._base_key == key:
+            return
+
+        # A resident pipeline going back to the cache makes room on the device first
+        self.offload.park(self.base_pipeline)
+        cached = self.pipeline_cache.get(key)
+        if cached is not None:
+            logger.info(f"Using cached pipeline: {self.base_model_id}")
+            self.offload.activate(cached, "base")
+            self.base_pipeline = cached
+            self._base_key = key
+            self._set_readiness(READY if getattr(cached, "kami_warm", False) else WARM)
+            return
 
         logger.info(f"Loading Base Model: {self.base_model_id}")
+        # Drop the reference to the previous pipeline; it stays alive in the cache if still cached
+        self.base_pipeline = None
+        self._base_key = None
+        self._set_readiness(LOADING)
         vae = self._load_vae()
 
+        started = time.perf_counter()
         try:
             if self.base_model_id.endswith((".safetensors", ".ckpt")):
-                self.base_pipeline = StableDiffusionXLPipeline.from_single_file(
-                    self.base_model_id, vae=vae, torch_dtype=torch.float16, use_safetensors=True
+                pipeline = StableDiffusionXLPipeline.from_single_file(
+                    self.base_model_id, vae=vae, torch_dtype=self.dtype, use_safetensors=True
                 )
             else:
-                self.base_pipeline = StableDiffusionXLPipeline.from_pretrained(
-                    self.base_model_id, vae=vae, torch_dtype=torch.float16, variant="fp16", use_safetensors=True
+                pipeline = StableDiffusionXLPipeline.from_pretrained(
+                    self.base_model_id, vae=vae, torch_dtype=self.dtype, variant="fp16", use_safetensors=True
                 )
             
-            self.base_pipeline.scheduler = DPMSolverMultistepScheduler.from_config(
-                self.base_pipeline.scheduler.config, use_karras_sigmas=True, algorithm_type="dpmsolver++"
+            pipeline.scheduler = DPMSolverMultistepScheduler.from_config(
+                pipeline.scheduler.config, use_karras_sigmas=True, algorithm_type="dpmsolver++"
             )
-            self.base_pipeline.enable_vae_tiling()
-            self.base_pipeline.enable_vae_slicing()
-            if torch.cuda.is_available():
-                try: self.base_pipeline.enable_xformers_memory_efficient_attention()
-                except Exception: self.base_pipeline.enable_attention_slicing()
-            self.base_pipeline.enable_model_cpu_offload()
-            
-            self.base_pipeline.has_lora = False
-            if lora_path and os.path.exists(lora_path):
-                logger.info(f"Loading LoRA weights from: {lora_path}")
-                self.base_pipeline.load_lora_weights(lora_path)
-                self.base_pipeline.has_lora = True
+            # Kernels and memory format before placement; offload hooks keep them
+            self.backend.optimize(pipeline)
+            self.offload.apply(pipeline, "base")
                 
         except Exception as e:
             logger.error(f"Error loading base model: {e}")
+            self._set_readiness(COLD, str(e))
             raise
+        self._record_stage("model_load", time.perf_counter() - started)
+
+        # The VAE is shared by all pipelines, so it is not charged against the budget
+        size = module_bytes(c for c in pipeline.components.values() if c is not vae)
+        evicted = self.pipeline_cache.put(key, pipeline, size)
+        self.base_pipeline = pipeline
+        self._base_key = key
+        self._set_readiness(WARM)
+        if evicted:
+            for old_key in evicted:
+                self.conditioning_cache.drop_model(old_key); self.loras.drop_model(old_key)
+            self.backend.empty_cache()
 
     def load_refiner_model(self) -> None:
         if self.refiner_pipeline: return
         logger.info(f"Loading Refiner: {self.refiner_model_id}")
         try:
             vae = self._load_vae()
-            self.refiner_pipeline = StableDiffusionXLImg2ImgPipeline.from_pretrained(
-                self.refiner_model_id, vae=vae, torch_dtype=torch.float16, variant="fp16", use_safetensors=True
-            )
-            self.refiner_pipeline.enable_vae_tiling()
-            self.refiner_pipeline.enable_vae_slicing()
-            self.refiner_pipeline.enable_model_cpu_offload()
+            with self.metrics.timer("refiner_load", self._profile):
+                self.refiner_pipeline = StableDiffusionXLImg2ImgPipeline.from_pretrained(
+                    self.refiner_model_id, vae=vae, torch_dtype=self.dtype, variant="fp16", use_safetensors=True
+                )
+                self.backend.optimize(self.refiner_pipeline)
+                # Decided after the base pipeline is placed, so it only gets what is left
+                self.offload.apply(self.refiner_pipeline, "refiner")
         except Exception as e:
             logger.error(f"Error loading refiner: {e}")
             raise
@@ -126,13 +217,13 @@ class T2IEngine:
         sanitized = re.sub(r'[^a-zA-Z0-9]+', '_', clean).strip('_').lower()
         return sanitized[:max_len].rstrip('_') if sanitized else "image"
 
-    def _create_output_path(self, prompt: str, use_refiner: bool, lora_path: Optional[str] = None) -> str:
+    def _create_output_path(self, prompt: str, use_refiner: bool, loras: Optional[List[LoraSpec]] = None) -> str:
         name = self._sanitize_prompt(prompt)
         now = datetime.now()
         date_str = now.strftime("%Y%m%d")
         time_str = now.strftime("%H%M%S")
         suffix = ""
-        if lora_path: suffix += "_lora"
+        if loras: suffix += "_lora"
         if use_refiner: suffix += "_refiner"
         filename = f"{time_str}_{name}{suffix}.png"
         output_dir = os.path.join("output_images", date_str)
@@ -142,24 +233,109 @@ class T2IEngine:
 
     def _save_image(self, image: Image.Image, output_path: str, prompt: str, negative_prompt: str, 
                     steps: int, guidance_scale: float, seed_value: Union[str, int], 
-                    freeu_args: Optional[Dict[str, float]], lora_path: Optional[str]) -> None:
-        metadata = PngInfo()
+                    freeu_args: Optional[Dict[str, float]], loras: List[LoraSpec],
+                    on_saved: Optional[Callable[[Future], None]] = None,
+                    profile: Optional[GenerationProfile] = None) -> Future:
+        """Hands the decoded image to the background writer and returns its completion future."""
+        lora_txt = format_loras(loras)
         parameters_txt = (
             f"{prompt}\nNegative prompt: {negative_prompt}\n"
             f"Steps: {steps}, CFG scale: {guidance_scale}, Seed: {seed_value}, "
             f"Mode: T2I, Model: {os.path.basename(self.base_model_id)}, "
             f"Scheduler: DPM++ 2M Karras, FreeU: {bool(freeu_args)}, "
-            f"LoRA: {os.path.basename(lora_path) if lora_path else 'None'}"
+            f"LoRA: {lora_txt}"
         )
-        metadata.add_text("parameters", parameters_txt)
-        metadata.add_text("Software", "Kami - Local SDXL Station")
-        try:
-            image.save(output_path, pnginfo=metadata)
-            logger.info(f"Image saved to: {output_path}")
-            add_image_record(path=output_path, prompt=prompt, neg=negative_prompt, model=os.path.basename(self.base_model_id),
-                             steps=steps, cfg=guidance_scale, seed=seed_value)
-        except Exception as e:
-            logger.error(f"Failed to save image or update DB: {e}")
+        text_chunks = {"parameters": parameters_txt, "Software": "Kami - Local SDXL Station"}
+        record = {"prompt": prompt, "neg": negative_prompt, "model": os.path.basename(self.base_model_id),
+                  "steps": steps, "cfg": guidance_scale, "seed": seed_value}
+        return self.image_writer.submit(image, output_path, text_chunks, record, on_saved, profile)
+
+    def _encode_prompt(self, prompt: str, negative_prompt: str) -> Conditioning:
+        """
+        Returns Compel conditioning for the active base pipeline.
+        Re-rolls and seed sweeps reuse cached tensors without touching the text encoders.
+        """
+        # LoRAs can patch the text encoders, so the active set is part of the key
+        cache_key = (self._base_key, self.loras.active(self.base_pipeline), prompt, negative_prompt)
+        cond = self.conditioning_cache.get(cache_key)
+        if cond is not None:
+            logger.debug("Prompt conditioning cache hit.")
+            return cond
+
+        cond = self._run_compel(prompt, negative_prompt)
+        self.conditioning_cache.put(cache_key, cond)
+        return cond
+
+    def _run_compel(self, prompt: str, negative_prompt: str) -> Conditioning:
+        """Encodes a prompt with the active base pipeline's text encoders, bypassing the cache."""
+        # Compel & Offloading: only model offload needs the encoders moved by hand
+        # (resident ones are already there, sequential offload streams them itself)
+        move = self.offload.mode_of(self.base_pipeline) == MODEL_OFFLOAD
+        if move: self.base_pipeline.text_encoder.to(self.device); self.base_pipeline.text_encoder_2.to(self.device)
+        compel = CompelForSDXL(self.base_pipeline)
+        if hasattr(compel, 'conditioning_provider'): compel.conditioning_provider.device = self.device
+        cond = Conditioning.from_compel(compel(prompt, negative_prompt=negative_prompt))
+        if move: self.base_pipeline.text_encoder.to("cpu"); self.base_pipeline.text_encoder_2.to("cpu")
+        del compel; self.offload.release(self.base_pipeline)
+        return cond
+
+    def add_readiness_listener(self, listener: Callable[[str], None]) -> None:
+        self._readiness_listeners.append(listener)
+
+    def _set_readiness(self, state: str, error: Optional[str] = None) -> None:
+        self.readiness_error = error
+        if state == self.readiness: return
+        self.readiness = state
+        logger.info(f"Engine readiness: {state}")
+        for listener in list(self._readiness_listeners):
+            try: listener(state)
+            except Exception as e: logger.warning(f"Readiness listener failed: {e}")
+
+    def warm_up(self, model_id: Optional[str] = None, use_refiner: bool = False, steps: int = 2) -> bool:
+        """
+        Loads the base model (and optionally the refiner) and runs a short throwaway
+        denoise on small latents (no VAE decode), so the first real image does not pay for
+        pipeline loading, text encoding setup and first kernel launches. It holds the engine
+        lock, so it is kept to a few seconds even on the CPU. Returns True when ready.
+        """
+        with self.lock:
+            started = time.perf_counter()
+            try:
+                if model_id and model_id != self.base_model_id:
+                    self.base_model_id = model_id
+                self.load_base_model([])
+                if use_refiner: self.load_refiner_model()
+                if not getattr(self.base_pipeline, "kami_warm", False):
+                    logger.info(f"Warming up {os.path.basename(self.base_model_id)} ({steps} steps at {WARMUP_SIZE}px)")
+                    with torch.no_grad():
+                        # Not cached: the throwaway prompt would otherwise occupy a cache entry for good
+                        cond = self._run_compel("", "")
+                        self.base_pipeline(
+                            prompt_embeds=cond.embeds, pooled_prompt_embeds=cond.pooled_embeds,
+                            negative_prompt_embeds=cond.negative_embeds, negative_pooled_prompt_embeds=cond.negative_pooled_embeds,
+                            num_inference_steps=steps, guidance_scale=5.0, width=WARMUP_SIZE, height=WARMUP_SIZE,
+                            output_type="latent", generator=torch.Generator("cpu").manual_seed(0)
+                        )
+                    self.base_pipeline.kami_warm = True
+                self._record_stage("warmup", time.perf_counter() - started)
+                self._set_readiness(READY)
+                return True
+            except Exception as e:
+                logger.error(f"Warm-up failed: {e}")
+                self._set_readiness(WARM if self.base_pipeline is not None else COLD, str(e))
+                return False
+            finally:
+                self.offload.release(self.base_pipeline)
+
+    def start_warm_up(self, **kwargs) -> threading.Thread:
+        """Runs warm_up() on a daemon thread; jobs submitted meanwhile wait for the engine lock."""
+        thread = threading.Thread(target=self.warm_up, kwargs=kwargs, name="EngineWarmUp", daemon=True)
+        thread.start()
+        return thread
+
+    def _record_stage(self, stage: str, seconds: float) -> None:
+        self.metrics.observe(stage, seconds)
+        if self._profile is not None: self._profile.add(stage, seconds)
 
     def abort_generation(self):
         """Signals the engine to abort the current generation."""
@@ -169,7 +345,19 @@ class T2IEngine:
     def generate(self, prompt: str, negative_prompt: str = "", steps: int = 30, guidance_scale: float = 7.5, 
                  seed: Optional[int] = None, use_refiner: bool = False, lora_path: Optional[str] = None, 
                  lora_scale: float = 1.0, freeu_args: Optional[Dict[str, float]] = None,
-                 progress_callback: Optional[Callable[[int, int], None]] = None) -> str:
+                 loras: Optional[Iterable[Any]] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 model_id: Optional[str] = None,
+                 on_saved: Optional[Callable[[Future], None]] = None,
+                 preview_callback: Optional[Callable[[int, int, torch.Tensor], None]] = None) -> str:
+        """
+        Runs one generation and returns the output path as soon as the image is decoded.
+        The PNG is written in the background; on_saved receives the writer's future
+        once the file is on disk and indexed (or failed).
+        preview_callback receives (step, total, latents) after every step.
+        loras stacks several LoRAs (paths, (path, weight) pairs or {"path", "scale"} dicts)
+        in addition to the single lora_path/lora_scale.
+        """
         
         if not self.lock.acquire(blocking=False):
             logger.warning("Engine is busy. Waiting for lock...")
@@ -177,8 +365,14 @@ class T2IEngine:
             
         try:
             self.abort_event.clear()
-            output_path = self._create_output_path(prompt, use_refiner, lora_path)
-            self.load_base_model(lora_path) 
+            profile = self._profile = GenerationProfile(self.device)
+            # Switch checkpoints under the lock so a running job never sees a foreign model id
+            if model_id and model_id != self.base_model_id:
+                logger.info(f"Switching base model to: {model_id}")
+                self.base_model_id = model_id
+            active_loras = normalize_loras(loras, lora_path, lora_scale)
+            output_path = self._create_output_path(prompt, use_refiner, active_loras)
+            self.load_base_model(active_loras)
             if use_refiner: self.load_refiner_model()
 
             if self.base_pipeline is None: raise RuntimeError("Base pipeline failed to initialize")
@@ -193,56 +387,77 @@ class T2IEngine:
 
             logger.info(f"Starting Generation: '{prompt[:50]}...'")
             
+            # Timestamp of the last finished step; everything after it inside the pipeline call is VAE decode
+            marks = {"last_step": None}
+
+            def timed_call(stage: str, call: Callable[[], Any]) -> Tuple[Any, float]:
+                """Runs a pipeline call, records its denoise time and returns (result, seconds after the last step)."""
+                marks["last_step"] = None
+                started = time.perf_counter()
+                result = call()
+                ended = time.perf_counter()
+                last_step = marks["last_step"] or ended
+                self._record_stage(stage, last_step - started)
+                profile.denoise_seconds += last_step - started
+                return result, ended - last_step
+
             # --- CALLBACK WRAPPER FOR PROGRESS & CANCELLATION ---
             def step_callback(pipe, step_index, timestep, callback_kwargs):
+                marks["last_step"] = time.perf_counter()
+                profile.steps += 1
+                profile.sample()
                 if self.abort_event.is_set():
                     raise GenerationCancelled("User cancelled generation.")
                 
                 if progress_callback:
                     # step_index starts at 0
                     progress_callback(step_index + 1, steps)
+                if preview_callback and "latents" in callback_kwargs:
+                    preview_callback(step_index + 1, steps, callback_kwargs["latents"])
                 
                 return callback_kwargs
 
             with torch.no_grad():
-                # Compel & Offloading
-                self.base_pipeline.text_encoder.to(self.device); self.base_pipeline.text_encoder_2.to(self.device)
-                compel = CompelForSDXL(self.base_pipeline)
-                if hasattr(compel, 'conditioning_provider'): compel.conditioning_provider.device = self.device
-                cond = compel(prompt, negative_prompt=negative_prompt)
-                self.base_pipeline.text_encoder.to("cpu"); self.base_pipeline.text_encoder_2.to("cpu")
-                del compel; gc.collect(); torch.cuda.empty_cache()
-
-                kwargs = {"scale": lora_scale} if getattr(self.base_pipeline, "has_lora", False) else None
+                with self.metrics.timer("text_encode", profile):
+                    cond = self._encode_prompt(prompt, negative_prompt)
 
                 # Generate
                 if not use_refiner:
-                    image = self.base_pipeline(
+                    image, decode_seconds = timed_call("denoise", lambda: self.base_pipeline(
                         prompt_embeds=cond.embeds, pooled_prompt_embeds=cond.pooled_embeds,
                         negative_prompt_embeds=cond.negative_embeds, negative_pooled_prompt_embeds=cond.negative_pooled_embeds,
-                        num_inference_steps=steps, guidance_scale=guidance_scale, generator=generator, cross_attention_kwargs=kwargs,
+                        num_inference_steps=steps, guidance_scale=guidance_scale, generator=generator,
                         callback_on_step_end=step_callback
-                    ).images[0]
+                    ).images[0])
                 else:
-                    latents = self.base_pipeline(
+                    latents, _ = timed_call("denoise", lambda: self.base_pipeline(
                         prompt_embeds=cond.embeds, pooled_prompt_embeds=cond.pooled_embeds,
                         negative_prompt_embeds=cond.negative_embeds, negative_pooled_prompt_embeds=cond.negative_pooled_embeds,
                         num_inference_steps=steps, guidance_scale=guidance_scale, generator=generator,
-                        denoising_end=0.8, output_type="latent", cross_attention_kwargs=kwargs,
+                        denoising_end=0.8, output_type="latent",
                         callback_on_step_end=step_callback
-                    ).images
+                    ).images)
                     
-                    gc.collect(); torch.cuda.empty_cache()
+                    self.offload.release(self.base_pipeline)
                     if self.abort_event.is_set(): raise GenerationCancelled("Cancelled before refiner.")
                     if self.refiner_pipeline is None: raise RuntimeError("Refiner pipeline not initialized")
+                    # The refiner decodes with the shared VAE, which gets the tiling of its mode
+                    self.offload.configure_vae(self.refiner_pipeline)
 
-                    image = self.refiner_pipeline(
+                    image, decode_seconds = timed_call("refine", lambda: self.refiner_pipeline(
                         prompt=prompt, negative_prompt=negative_prompt, num_inference_steps=steps, 
                         guidance_scale=guidance_scale, generator=generator, denoising_start=0.8, image=latents,
                         callback_on_step_end=step_callback
-                    ).images[0]
+                    ).images[0])
 
-                self._save_image(image, output_path, prompt, negative_prompt, steps, guidance_scale, seed_value, freeu_args, lora_path)
+                self._record_stage("vae_decode", decode_seconds)
+                profile.finish()
+                self.metrics.record_profile(profile)
+                self.base_pipeline.kami_warm = True
+                self._set_readiness(READY)
+                logger.info(f"Generation finished in {profile.stages['total']:.1f}s"
+                            f" ({profile.it_per_s or 0:.2f} it/s, decode {decode_seconds * 1000:.0f} ms)")
+                self._save_image(image, output_path, prompt, negative_prompt, steps, guidance_scale, seed_value, freeu_args, active_loras, on_saved, profile)
             
             return output_path
             
@@ -253,11 +468,16 @@ class T2IEngine:
             logger.error(f"Generation failed: {e}")
             raise
         finally:
+            self._profile = None
+            # Still under the lock, so a queued job cannot swap in its pipeline first
+            self.offload.release(self.base_pipeline)
             self.lock.release()
-            gc.collect()
-            if torch.cuda.is_available(): torch.cuda.empty_cache()
 
     def cleanup(self) -> None:
+        self.image_writer.shutdown(wait=True)
+        self.thumbnails.shutdown()
         self.base_pipeline = None; self.refiner_pipeline = None; self.vae = None
-        gc.collect(); torch.cuda.empty_cache()
+        self._set_readiness(COLD)
+        self._base_key = None; self.pipeline_cache.clear(); self.conditioning_cache.clear()
+        self.backend.empty_cache()
         logger.info("Engine cleanup complete.")
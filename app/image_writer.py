@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Callable
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from app.database import add_image_record
+from app.metrics import MetricsRegistry, GenerationProfile
+from app.thumbnails import ThumbnailService
+
+logger = logging.getLogger(__name__)
+
+class _SaveTask:
+    def __init__(self, image: Image.Image, output_path: str, text_chunks: Dict[str, str],
+                 record: Dict[str, Any], future: Future, profile: Optional[GenerationProfile] = None):
+        self.image = image
+        self.output_path = output_path
+        self.text_chunks = text_chunks
+        self.record = record
+        self.future = future
+        self.profile = profile
+        self.enqueued_at = time.perf_counter()
+
+class ImageWriter:
+    """
+    Background stage that encodes PNGs, writes them atomically and indexes them in the DB.
+
+    The engine hands over decoded images and continues with the next job while
+    this thread compresses and stores the previous one. The queue is bounded, so
+    a slow disk applies back-pressure instead of piling up images in RAM.
+    """
+
+    def __init__(self, max_queue: int = 8, latency_window: int = 200, metrics: Optional[MetricsRegistry] = None,
+                 thumbnails: Optional[ThumbnailService] = None):
+        self.metrics = metrics or MetricsRegistry(latency_window)
+        self.thumbnails = thumbnails
+        self._queue: "queue.Queue[Optional[_SaveTask]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.written = 0
+        self.failed = 0
+        # Seconds from hand-over until the record is indexed
+        self.latencies: deque = deque(maxlen=latency_window)
+        self.last_latency: Optional[float] = None
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread and self._thread.is_alive(): return
+            self._thread = threading.Thread(target=self._run, name="ImageWriter", daemon=True)
+            self._thread.start()
+
+    def submit(self, image: Image.Image, output_path: str, text_chunks: Dict[str, str],
+               record: Dict[str, Any], on_saved: Optional[Callable[[Future], None]] = None,
+               profile: Optional[GenerationProfile] = None) -> Future:
+        """
+        Queues an image for writing. Blocks only if the queue is full.
+        The returned future resolves to output_path once the file is on disk and indexed.
+        If a profile is given, save timings are added to it and it is stored with the record.
+        """
+        self.start()
+        future: Future = Future()
+        if on_saved: future.add_done_callback(on_saved)
+        self._queue.put(_SaveTask(image, output_path, text_chunks, record, future, profile))
+        return future
+
+    def drain(self) -> None:
+        """Blocks until every queued image has been written."""
+        self._queue.join()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Writes all pending images and stops the worker thread."""
+        with self._start_lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive(): return
+        logger.info(f"Flushing {self._queue.qsize()} pending image(s)...")
+        self._queue.put(None)
+        if wait: thread.join()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self.latencies)
+        def pct(p: float) -> Optional[float]:
+            if not samples: return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 1)
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "failed": self.failed,
+            "last_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+        }
+
+    # --- Worker ---
+
+    def _run(self) -> None:
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None: return
+                self._write(task)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, task: _SaveTask) -> None:
+        metadata = PngInfo()
+        for key, value in task.text_chunks.items():
+            metadata.add_text(key, value)
+
+        out_dir = os.path.dirname(task.output_path) or "."
+        tmp_path = None
+        try:
+            # Write next to the target and rename, so readers never see a half-written PNG.
+            # (open() instead of mkstemp keeps the usual umask-based file permissions)
+            tmp_path = os.path.join(out_dir, f".{os.path.basename(task.output_path)}.{uuid.uuid4().hex[:8]}.tmp")
+            with self.metrics.timer("png_save", task.profile):
+                with open(tmp_path, "xb") as f:
+                    task.image.save(f, format="PNG", pnginfo=metadata)
+                os.replace(tmp_path, task.output_path)
+            tmp_path = None
+
+            # db_insert is measured here but can't be part of the stored profile
+            record = dict(task.record)
+            if task.profile is not None: record["metrics"] = json.dumps(task.profile.summary())
+            with self.metrics.timer("db_insert"):
+                add_image_record(path=task.output_path, **record)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to save image or update DB: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                try: os.remove(tmp_path)
+                except OSError: pass
+            task.future.set_exception(e)
+            return
+
+        latency = time.perf_counter() - task.enqueued_at
+        self.last_latency = latency
+        self.latencies.append(latency)
+        self.written += 1
+        logger.info(f"Image saved to: {task.output_path} ({latency * 1000:.0f} ms)")
+        task.future.set_result(task.output_path)
+
+        # The decoded image is still in memory, so the thumbnails cost no extra PNG decode
+        if self.thumbnails:
+            try:
+                with self.metrics.timer("thumbnails"):
+                    self.thumbnails.pregenerate(task.output_path, task.image)
+            except Exception as e:
+                logger.warning(f"Could not create thumbnails for {task.output_path}: {e}")
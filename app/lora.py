@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import torch
+
+from app.cache import LoraCache, FusedLoraCache, tensor_bytes
+from app.pnginfo import quote_parameter
+
+logger = logging.getLogger(__name__)
+
+# (absolute path, weight)
+LoraSpec = Tuple[str, float]
+
+# Pipeline components that can carry LoRA layers
+LORA_COMPONENTS = ("unet", "text_encoder", "text_encoder_2")
+
+def normalize_loras(loras: Optional[Iterable[Any]] = None, lora_path: Optional[str] = None,
+                    lora_scale: float = 1.0) -> List[LoraSpec]:
+    """
+    Turns the LoRA arguments of a job into a sorted list of (absolute path, weight).
+
+    `loras` may contain paths, (path, weight) pairs or {"path": ..., "scale": ...} dicts;
+    the legacy single `lora_path`/`lora_scale` pair is appended. Missing files and "None"
+    entries are skipped, and duplicate paths keep their last weight.
+    """
+    specs: Dict[str, float] = {}
+    items = list(loras or [])
+    if lora_path: items.append((lora_path, lora_scale))
+    for item in items:
+        if isinstance(item, dict): path, scale = item.get("path"), item.get("scale", 1.0)
+        elif isinstance(item, (tuple, list)): path, scale = item[0], (item[1] if len(item) > 1 else 1.0)
+        else: path, scale = item, 1.0
+        if not path or path == "None": continue
+        if not os.path.exists(path):
+            logger.warning(f"LoRA not found, skipping: {path}")
+            continue
+        specs[os.path.abspath(path)] = float(scale)
+    return sorted(specs.items())
+
+def format_loras(loras: Iterable[LoraSpec]) -> str:
+    """The "LoRA" value of the PNG parameters text: "a.safetensors:0.8, b.safetensors:1" (quoted if several)."""
+    return quote_parameter(", ".join(f"{os.path.basename(path)}:{scale:g}" for path, scale in loras) or "None")
+
+def adapter_name(path: str) -> str:
+    """Stable PEFT adapter name for a LoRA file (readable stem + hash of the full path)."""
+    stem = re.sub(r'[^a-zA-Z0-9_]+', '_', os.path.splitext(os.path.basename(path))[0]).strip('_')[:40]
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return f"{stem or 'lora'}_{digest}"
+
+def load_state_dict(path: str) -> Dict[str, torch.Tensor]:
+    """Reads a LoRA file into CPU memory without any conversion."""
+    if path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(path, device="cpu")
+    return torch.load(path, map_location="cpu", weights_only=True)
+
+class LoraManager:
+    """
+    Keeps LoRAs as named PEFT adapters on the base pipelines.
+
+    Raw state dicts are cached in CPU RAM (LoraCache), so an adapter that was evicted
+    from a pipeline, or is needed by another checkpoint, is not read from disk again.
+    Each pipeline holds up to `max_adapters` adapters; switching between them is a
+    set_adapters() call instead of rebuilding the pipeline.
+
+    With fusing, the weighted LoRA deltas are added to the base weights and the adapter
+    layers are bypassed, so denoising runs at plain base model speed. The untouched
+    weights are kept in RAM so the next combination starts from the exact originals
+    (no unfuse round-off), and the fused weights of recent combinations are cached.
+    """
+
+    def __init__(self, cache_mb: int = 1024, max_adapters: int = 8, fused_cache_mb: int = 2048):
+        self.cache = LoraCache(budget_bytes=cache_mb * 1024 * 1024)
+        self.fused_cache = FusedLoraCache(budget_bytes=fused_cache_mb * 1024 * 1024)
+        self.max_adapters = max(1, max_adapters)
+        self.loads = 0
+        self.fuses = 0
+
+    def loaded_adapters(self, pipeline: Any) -> "OrderedDict[str, str]":
+        """Adapters loaded into the pipeline, least recently used first (name -> path)."""
+        adapters = getattr(pipeline, "kami_adapters", None)
+        if adapters is None:
+            adapters = pipeline.kami_adapters = OrderedDict()
+        return adapters
+
+    def active(self, pipeline: Any) -> Tuple[LoraSpec, ...]:
+        return getattr(pipeline, "kami_active_loras", ())
+
+    def fused(self, pipeline: Any) -> bool:
+        return getattr(pipeline, "kami_fused", False)
+
+    def apply(self, pipeline: Any, loras: List[LoraSpec], fuse: bool = False,
+              model_key: Optional[Hashable] = None) -> float:
+        """
+        Activates exactly the given LoRAs with their weights, fused into the base weights
+        if requested. Returns the seconds spent loading or fusing (0 when nothing changed
+        but the adapter weights).
+        """
+        loras = tuple(loras)
+        fuse = fuse and bool(loras)
+        if loras == self.active(pipeline) and fuse == self.fused(pipeline): return 0.0
+
+        started = time.perf_counter()
+        # Always start from the original weights; adapters are switched on the clean model
+        if self.fused(pipeline): self._restore(pipeline)
+        adapters = self.loaded_adapters(pipeline)
+        loaded_any = False
+        names = []
+        for path, _ in loras:
+            name = adapter_name(path)
+            if name not in adapters:
+                self._evict(pipeline, keep={adapter_name(p) for p, _ in loras})
+                logger.info(f"Loading LoRA adapter '{name}' from: {path}")
+                # diffusers pops keys while converting, so it gets its own dict
+                pipeline.load_lora_weights(dict(self._state_dict(path)), adapter_name=name)
+                loaded_any = True
+            adapters[name] = path
+            adapters.move_to_end(name)
+            names.append(name)
+
+        if names:
+            pipeline.enable_lora()
+            pipeline.set_adapters(names, adapter_weights=[scale for _, scale in loras])
+        elif adapters:
+            pipeline.disable_lora()
+        pipeline.kami_active_loras = loras
+
+        if fuse:
+            self._fuse(pipeline, names, (model_key, loras))
+            loaded_any = True
+        return time.perf_counter() - started if loaded_any else 0.0
+
+    def _lora_layers(self, pipeline: Any, names: List[str]) -> Dict[str, Any]:
+        """PEFT LoRA layers of the pipeline that belong to one of the given adapters."""
+        from peft.tuners.tuners_utils import BaseTunerLayer
+        layers = {}
+        for component in LORA_COMPONENTS:
+            model = getattr(pipeline, component, None)
+            if model is None: continue
+            for module_name, module in model.named_modules():
+                if isinstance(module, BaseTunerLayer) and any(n in getattr(module, "lora_A", {}) for n in names):
+                    layers[f"{component}.{module_name}"] = module
+        return layers
+
+    def _fuse(self, pipeline: Any, names: List[str], key: tuple) -> None:
+        layers = self._lora_layers(pipeline, names)
+        originals = getattr(pipeline, "kami_original_weights", None)
+        if originals is None: originals = pipeline.kami_original_weights = {}
+
+        fused = self.fused_cache.get(key)
+        build = fused is None
+        if build: fused = {}
+        saved = 0
+        with torch.no_grad():
+            for layer_name, layer in layers.items():
+                weight = layer.get_base_layer().weight
+                if layer_name not in originals:
+                    originals[layer_name] = weight.detach().to("cpu", copy=True)
+                    saved += tensor_bytes([originals[layer_name]])
+                if build:
+                    # Scaling includes the set_adapters() weight of every adapter
+                    delta = sum(layer.get_delta_weight(n).float() for n in names if n in layer.lora_A)
+                    fused[layer_name] = (originals[layer_name].float() + delta.to("cpu")).to(weight.dtype)
+                weight.copy_(fused[layer_name])
+        # Originals stay in RAM as long as the pipeline, so they count against the fused budget
+        if saved: self.fused_cache.reserve(key[0], saved)
+        if build:
+            self.fuses += 1
+            self.fused_cache.put(key, fused)
+            logger.info(f"Fused {len(names)} LoRA(s) into {len(layers)} layers")
+        # Adapter layers now only forward through their (fused) base layer
+        pipeline.disable_lora()
+        pipeline.kami_fused = True
+
+    def _restore(self, pipeline: Any) -> None:
+        originals = getattr(pipeline, "kami_original_weights", {})
+        layers = self._lora_layers(pipeline, list(self.loaded_adapters(pipeline)))
+        with torch.no_grad():
+            for layer_name, layer in layers.items():
+                if layer_name in originals: layer.get_base_layer().weight.copy_(originals[layer_name])
+        pipeline.kami_fused = False
+        pipeline.kami_active_loras = ()
+
+    def drop_model(self, model_key: Hashable) -> None:
+        """Forgets fused weights of a pipeline that left the pipeline cache."""
+        self.fused_cache.drop_model(model_key)
+
+    def _state_dict(self, path: str) -> Dict[str, torch.Tensor]:
+        key = (path, os.stat(path).st_mtime_ns)
+        state_dict = self.cache.get(key)
+        if state_dict is None:
+            state_dict = load_state_dict(path)
+            self.loads += 1
+            # An edited file replaces its old entry
+            self.cache.discard_where(lambda k: k[0] == path)
+            self.cache.put(key, state_dict)
+        return state_dict
+
+    def _evict(self, pipeline: Any, keep: set) -> None:
+        adapters = self.loaded_adapters(pipeline)
+        while len(adapters) >= self.max_adapters:
+            victim = next((n for n in adapters if n not in keep), None)
+            if victim is None: return
+            logger.info(f"Unloading LoRA adapter '{victim}'")
+            pipeline.delete_adapters(victim)
+            del adapters[victim]
+
+    def stats(self) -> Dict[str, Any]:
+        data = self.cache.stats()
+        data["disk_loads"] = self.loads
+        data["fused"] = {**self.fused_cache.stats(), "fuses": self.fuses}
+        return data
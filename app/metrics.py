@@ -0,0 +1,168 @@
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+def current_ram_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def reset_peak_ram() -> bool:
+    """Resets the kernel's peak RSS mark (VmHWM) of this process; False where that is not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_ram_bytes() -> Optional[int]:
+    """
+    Peak resident set size of this process: since the last reset_peak_ram() on Linux,
+    otherwise since process start (ru_maxrss), where the platform reports it.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(r"^VmHWM:\s+(\d+) kB", f.read(), re.MULTILINE)
+        if match: return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class GenerationProfile:
+    """
+    Timings and memory figures collected during a single generate() call.
+    A summary is stored with the image record. VRAM is only tracked when the
+    engine runs on a CUDA device.
+
+    RAM figures cover this job only: the kernel's peak RSS mark is reset at the start
+    (Linux), or else RSS is sampled at every stage and step. peak_ram is the highest
+    RSS during the job, ram_increase how far that lies above the RSS at its start.
+    """
+
+    def __init__(self, device: str = "cpu"):
+        self.stages: Dict[str, float] = {}
+        self.steps = 0
+        self.denoise_seconds = 0.0
+        self.peak_vram_bytes: Optional[int] = None
+        self.peak_ram_bytes: Optional[int] = None
+        self.ram_increase_bytes: Optional[int] = None
+        self.started_at = time.perf_counter()
+
+        self.ram_at_start = current_ram_bytes()
+        self._ram_sampled = self.ram_at_start
+        self._peak_reset = self.ram_at_start is not None and reset_peak_ram()
+
+        self.cuda_device = torch.device(device) if str(device).startswith("cuda") and torch.cuda.is_available() else None
+        if self.cuda_device is not None:
+            torch.cuda.reset_peak_memory_stats(self.cuda_device)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.sample()
+
+    def sample(self) -> None:
+        """Records the current RSS; only needed where the peak mark cannot be reset."""
+        if self._peak_reset or self.ram_at_start is None: return
+        rss = current_ram_bytes()
+        if rss is not None: self._ram_sampled = max(self._ram_sampled, rss)
+
+    def finish(self) -> None:
+        """Captures peak memory figures at the end of the generation."""
+        self.add("total", time.perf_counter() - self.started_at)
+        if self.cuda_device is not None:
+            self.peak_vram_bytes = torch.cuda.max_memory_allocated(self.cuda_device)
+        self.sample()
+        if self.ram_at_start is None: return
+        self.peak_ram_bytes = peak_ram_bytes() if self._peak_reset else self._ram_sampled
+        if self.peak_ram_bytes is not None:
+            self.ram_increase_bytes = max(0, self.peak_ram_bytes - self.ram_at_start)
+
+    @property
+    def it_per_s(self) -> Optional[float]:
+        return self.steps / self.denoise_seconds if self.steps and self.denoise_seconds > 0 else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "stages_ms": {k: round(v * 1000, 1) for k, v in self.stages.items()},
+            "steps": self.steps,
+            "it_per_s": round(self.it_per_s, 3) if self.it_per_s else None,
+            "peak_vram_mb": round(self.peak_vram_bytes / 1024**2) if self.peak_vram_bytes else None,
+            "peak_ram_mb": round(self.peak_ram_bytes / 1024**2) if self.peak_ram_bytes else None,
+            "ram_increase_mb": round(self.ram_increase_bytes / 1024**2) if self.ram_increase_bytes is not None else None,
+        }
+
+class MetricsRegistry:
+    """Thread-safe rolling windows of per-stage samples with percentile summaries."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.last_profile: Optional[Dict[str, Any]] = None
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value)
+
+    @contextmanager
+    def timer(self, stage: str, profile: Optional[GenerationProfile] = None) -> Iterator[None]:
+        """Times a block and records it as a sample (and in the profile, if given)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(stage, elapsed)
+            if profile is not None: profile.add(stage, elapsed)
+
+    def record_profile(self, profile: GenerationProfile) -> None:
+        """Adds the per-job figures that are not already recorded by timer()."""
+        self.observe("total", profile.stages.get("total", 0.0))
+        if profile.it_per_s: self.observe("it_per_s", profile.it_per_s)
+        if profile.peak_vram_bytes: self.observe("peak_vram_mb", profile.peak_vram_bytes / 1024**2)
+        self.last_profile = profile.summary()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Returns count/mean/p50/p95/max per metric. Durations are reported in milliseconds."""
+        with self._lock:
+            data = {name: sorted(samples) for name, samples in self._samples.items()}
+
+        result = {}
+        for name, values in data.items():
+            if not values: continue
+            # Rates and memory figures are reported as-is, durations in ms
+            scale = 1 if name in ("it_per_s", "peak_vram_mb") else 1000
+            pick = lambda p: round(values[min(len(values) - 1, int(p * len(values)))] * scale, 2)
+            result[name] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values) * scale, 2),
+                "p50": pick(0.50),
+                "p95": pick(0.95),
+                "max": round(values[-1] * scale, 2),
+            }
+        return result
@@ -0,0 +1,168 @@
+import os
+import gc
+import logging
+from typing import Any, Dict, List, Optional
+
+import torch
+
+from app.cache import module_bytes
+
+logger = logging.getLogger(__name__)
+
+# Placement modes, from fastest to most memory-frugal
+RESIDENT = "resident"                  # everything on the GPU, no tiling
+VAE_TILING = "vae_tiling"              # everything on the GPU, VAE decodes in tiles/slices
+MODEL_OFFLOAD = "model_offload"        # one model at a time on the GPU (accelerate hooks)
+SEQUENTIAL_OFFLOAD = "sequential_offload"  # submodules streamed to the GPU; slowest, least VRAM
+MODES = (RESIDENT, VAE_TILING, MODEL_OFFLOAD, SEQUENTIAL_OFFLOAD)
+AUTO = "auto"
+
+# Overrides the configured mode for a deployment without touching session.json
+ENV_OFFLOAD_MODE = "KAMI_OFFLOAD_MODE"
+
+# Rough SDXL fp16 working set at 1024x1024: UNet activations, and an untiled VAE decode
+WORKSPACE_BYTES = 3 * 1024**3
+VAE_DECODE_BYTES = 3 * 1024**3
+
+class OffloadPolicy:
+    """
+    Decides where pipeline weights live and configures the pipelines accordingly.
+
+    In "auto" mode the fastest mode that fits is picked per pipeline from the free
+    device memory (torch.cuda.mem_get_info) and the size of the models that have to
+    be resident. Resident pipelines are moved back to the CPU when another pipeline
+    becomes active, so several cached checkpoints never compete for VRAM.
+
+    Pinned modules (the VAE shared by all pipelines) always stay on the device and are
+    never hooked, so pipelines in different modes can share them.
+    """
+
+    def __init__(self, mode: str = AUTO, device: str = "cuda", headroom_gb: float = 1.0):
+        mode = (os.environ.get(ENV_OFFLOAD_MODE) or mode or AUTO).lower()
+        if mode != AUTO and mode not in MODES:
+            logger.warning(f"Unknown offload mode '{mode}', using auto")
+            mode = AUTO
+        self.mode = mode
+        self.device = device
+        self.headroom = int(headroom_gb * 1024**3)
+        # Last decision per role ("base", "refiner") for status reporting
+        self.chosen: Dict[str, str] = {}
+        self.pinned: List[Any] = []
+
+    def pin(self, module: Any) -> None:
+        """Keeps a shared module on the device in every mode."""
+        if module is None or any(m is module for m in self.pinned): return
+        self.pinned.append(module)
+        if self.uses_cuda: module.to(self.device)
+
+    def _is_pinned(self, module: Any) -> bool:
+        return any(m is module for m in self.pinned)
+
+    @property
+    def uses_cuda(self) -> bool:
+        return str(self.device).startswith("cuda") and torch.cuda.is_available()
+
+    def memory(self) -> Optional[Dict[str, int]]:
+        if not self.uses_cuda: return None
+        free, total = torch.cuda.mem_get_info(torch.device(self.device))
+        return {"free": free, "total": total}
+
+    def select(self, pipeline: Any) -> str:
+        """Picks the placement mode for a pipeline that currently lives on the CPU."""
+        if not self.uses_cuda:
+            # Nothing to offload to on the CPU; tiled decoding keeps the VAE's peak RAM bounded
+            if self.mode in (RESIDENT, VAE_TILING): return self.mode
+            if self.mode != AUTO: logger.warning(f"Offload mode '{self.mode}' needs CUDA, using {VAE_TILING}")
+            return VAE_TILING
+        if self.mode != AUTO: return self.mode
+        memory = self.memory()
+
+        # Pinned modules are already on the device
+        components = [c for c in pipeline.components.values() if not self._is_pinned(c)]
+        weights = module_bytes(components)
+        largest = max((module_bytes([c]) for c in components), default=0)
+        available = memory["free"] - self.headroom
+        if available >= weights + WORKSPACE_BYTES + VAE_DECODE_BYTES: return RESIDENT
+        if available >= weights + WORKSPACE_BYTES: return VAE_TILING
+        if available >= largest + WORKSPACE_BYTES: return MODEL_OFFLOAD
+        return SEQUENTIAL_OFFLOAD
+
+    def apply(self, pipeline: Any, role: str = "base") -> str:
+        """Configures a freshly loaded pipeline and returns the chosen mode."""
+        mode = self.select(pipeline)
+        if mode in (RESIDENT, VAE_TILING):
+            pipeline.to(self.device)
+        else:
+            self._keep_pinned_on_move(pipeline)
+            # Leave pinned components out of the offload chain; diffusers moves excluded ones to the device
+            pinned = [name for name, c in pipeline.components.items() if self._is_pinned(c)]
+            pipeline.model_cpu_offload_seq = "->".join(n for n in pipeline.model_cpu_offload_seq.split("->") if n not in pinned)
+            pipeline._exclude_from_cpu_offload = list(pipeline._exclude_from_cpu_offload) + pinned
+            if mode == MODEL_OFFLOAD: pipeline.enable_model_cpu_offload(device=self.device)
+            else: pipeline.enable_sequential_cpu_offload(device=self.device)
+
+        pipeline.kami_offload_mode = mode
+        self.configure_vae(pipeline)
+        self.chosen[role] = mode
+        logger.info(f"Offload mode for {role} pipeline: {mode}")
+        return mode
+
+    def _keep_pinned_on_move(self, pipeline: Any) -> None:
+        """
+        enable_model_cpu_offload() (and maybe_free_model_hooks() after every call) runs
+        pipeline.to("cpu"), which would send the shared VAE to the CPU and back each time.
+        The wrapped to() hides pinned components from the move.
+        """
+        if getattr(pipeline, "kami_pinned_to", False): return
+        move = pipeline.to
+        def to(*args, **kwargs):
+            pinned = {name: c for name, c in pipeline.components.items() if self._is_pinned(c)}
+            # object.__setattr__ bypasses DiffusionPipeline.__setattr__, so the config stays untouched
+            for name in pinned: object.__setattr__(pipeline, name, None)
+            try: return move(*args, **kwargs)
+            finally:
+                for name, component in pinned.items(): object.__setattr__(pipeline, name, component)
+        pipeline.to = to
+        pipeline.kami_pinned_to = True
+
+    def mode_of(self, pipeline: Any) -> Optional[str]:
+        return getattr(pipeline, "kami_offload_mode", None)
+
+    def is_resident(self, pipeline: Any) -> bool:
+        return self.mode_of(pipeline) in (RESIDENT, VAE_TILING)
+
+    def activate(self, pipeline: Any, role: str = "base") -> None:
+        """Brings a cached pipeline back onto the device (only resident ones were parked)."""
+        if self.is_resident(pipeline): pipeline.to(self.device)
+        self.configure_vae(pipeline)
+        self.chosen[role] = self.mode_of(pipeline)
+
+    def configure_vae(self, pipeline: Any) -> None:
+        # Tiling is a flag on the (shared) VAE, so it is set whenever a pipeline becomes active
+        vae = getattr(pipeline, "vae", None)
+        if vae is None: return
+        if self.mode_of(pipeline) == RESIDENT:
+            vae.disable_tiling(); vae.disable_slicing()
+        else:
+            vae.enable_tiling(); vae.enable_slicing()
+
+    def park(self, pipeline: Any) -> None:
+        """Moves a resident pipeline that is no longer active to the CPU (pinned modules stay)."""
+        if pipeline is None or not self.is_resident(pipeline) or not self.uses_cuda: return
+        for component in pipeline.components.values():
+            if isinstance(component, torch.nn.Module) and not self._is_pinned(component): component.to("cpu")
+        self.release()
+
+    def release(self, pipeline: Any = None) -> None:
+        """Returns cached allocator blocks; skipped for resident pipelines that reuse them anyway."""
+        if pipeline is not None and self.is_resident(pipeline): return
+        gc.collect()
+        if torch.cuda.is_available(): torch.cuda.empty_cache()
+
+    def status(self) -> Dict[str, Any]:
+        memory = self.memory()
+        data: Dict[str, Any] = {"policy": self.mode, "modes": dict(self.chosen)}
+        if memory:
+            data["free_gb"] = round(memory["free"] / 1024**3, 2)
+            data["total_gb"] = round(memory["total"] / 1024**3, 2)
+        return data
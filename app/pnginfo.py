@@ -0,0 +1,132 @@
+import re
+import zlib
+import struct
+import logging
+from typing import Any, BinaryIO, Dict, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+# Text chunks larger than this are skipped rather than read into memory
+MAX_TEXT_CHUNK = 8 * 1024 * 1024
+
+def _decode_text_chunk(chunk_type: bytes, data: bytes) -> Optional[tuple]:
+    key, sep, rest = data.partition(b"\x00")
+    if not sep: return None
+    keyword = key.decode("latin-1")
+
+    if chunk_type == b"tEXt":
+        return keyword, rest.decode("latin-1")
+    if chunk_type == b"zTXt":
+        # rest = compression method (always 0 = zlib) + compressed text
+        return keyword, zlib.decompress(rest[1:]).decode("latin-1")
+
+    # iTXt: compression flag, method, language tag\0, translated keyword\0, UTF-8 text
+    if len(rest) < 2: return None
+    compressed = rest[0] == 1
+    _lang, _, rest = rest[2:].partition(b"\x00")
+    _translated, _, text = rest.partition(b"\x00")
+    if compressed: text = zlib.decompress(text)
+    return keyword, text.decode("utf-8", errors="replace")
+
+def read_text_chunks(source: Union[str, BinaryIO]) -> Dict[str, str]:
+    """
+    Returns the tEXt/zTXt/iTXt entries of a PNG without decoding any pixel data.
+    Reading stops at the first IDAT chunk (encoders put metadata before the image data),
+    so only the first few kilobytes of the file are touched.
+    Raises ValueError if the data is not a PNG.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return read_text_chunks(f)
+
+    f = source
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+
+    chunks: Dict[str, str] = {}
+    while True:
+        header = f.read(8)
+        if len(header) < 8: break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type in (b"IDAT", b"IEND"): break
+
+        if chunk_type in TEXT_CHUNKS and length <= MAX_TEXT_CHUNK:
+            data = f.read(length)
+            if len(data) < length: break
+            f.seek(4, 1)  # CRC
+            try:
+                entry = _decode_text_chunk(chunk_type, data)
+            except (zlib.error, UnicodeDecodeError) as e:
+                logger.debug(f"Skipping unreadable {chunk_type!r} chunk: {e}")
+                continue
+            if entry and entry[0] not in chunks:
+                chunks[entry[0]] = entry[1]
+        else:
+            f.seek(length + 4, 1)
+    return chunks
+
+def read_parameters(path: str) -> Optional[str]:
+    """Returns the A1111-style 'parameters' text of a PNG, or None if it has none."""
+    return read_text_chunks(path).get("parameters")
+
+class GenerationParameters(NamedTuple):
+    """Structured form of the 'parameters' text written by T2IEngine._save_image."""
+    prompt: str = "Unknown"
+    negative_prompt: str = ""
+    steps: int = 0
+    cfg: float = 0.0
+    seed: str = "Random"
+    model: str = "Unknown"
+    # Remaining "Key: value" pairs (Scheduler, FreeU, LoRA, ...)
+    extra: Dict[str, str] = {}
+
+# "Key: value" pairs of the settings line; values may be quoted and contain commas
+_PARAM_RE = re.compile(r'\s*([\w ./+\-]+):\s*("(?:\\.|[^\\"])*"|[^,]*)(?:,|$)')
+_SETTINGS_LINE = re.compile(r"^Steps: \d+")
+
+def quote_parameter(value: str) -> str:
+    """Quotes a settings value that contains commas, as A1111 does, so parse_parameters keeps it whole."""
+    return f'"{value}"' if "," in value else value
+
+def parse_parameters(text: str) -> GenerationParameters:
+    """
+    Parses "<prompt>\\nNegative prompt: <neg>\\nSteps: 30, CFG scale: 7, Seed: 1, Model: x, ..."
+    Prompts may span several lines. Missing fields keep their defaults.
+    """
+    if not text: return GenerationParameters(extra={})
+
+    lines = text.strip().split("\n")
+    settings: Dict[str, str] = {}
+    if lines and _SETTINGS_LINE.match(lines[-1].strip()):
+        for key, value in _PARAM_RE.findall(lines.pop().strip()):
+            value = value.strip()
+            if len(value) > 1 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            settings[key.strip()] = value
+
+    prompt_lines, neg_lines = [], None
+    for line in lines:
+        if neg_lines is None and line.startswith("Negative prompt:"):
+            neg_lines = [line[len("Negative prompt:"):].strip()]
+        elif neg_lines is not None:
+            neg_lines.append(line)
+        else:
+            prompt_lines.append(line)
+
+    values: Dict[str, Any] = {"extra": {}}
+    prompt = "\n".join(prompt_lines).strip()
+    if prompt: values["prompt"] = prompt
+    if neg_lines is not None: values["negative_prompt"] = "\n".join(neg_lines).strip()
+
+    for key, value in settings.items():
+        try:
+            if key == "Steps": values["steps"] = int(value)
+            elif key == "CFG scale": values["cfg"] = float(value)
+            elif key == "Seed": values["seed"] = value
+            elif key == "Model": values["model"] = value
+            else: values["extra"][key] = value
+        except ValueError:
+            values["extra"][key] = value
+    return GenerationParameters(**values)
@@ -0,0 +1,52 @@
+import io
+import time
+import base64
+import logging
+from typing import Optional
+
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Linear approximation of the SDXL VAE decoder: 4 latent channels -> RGB.
+# Good enough to judge composition and colours without running the VAE.
+SDXL_LATENT_RGB_FACTORS = torch.tensor([
+    [ 0.3651,  0.4232,  0.4341],
+    [-0.2533, -0.0042,  0.1068],
+    [ 0.1076,  0.1111, -0.0362],
+    [-0.3165, -0.2492, -0.2188],
+])
+SDXL_LATENT_RGB_BIAS = torch.tensor([0.1084, -0.0175, -0.0011])
+
+def latents_to_image(latents: torch.Tensor, max_size: int = 256) -> Image.Image:
+    """Converts SDXL latents (B, 4, H, W) of the first batch item to a small RGB preview."""
+    sample = latents[0].detach().to("cpu", torch.float32)
+    rgb = torch.einsum("chw,cr->hwr", sample, SDXL_LATENT_RGB_FACTORS) + SDXL_LATENT_RGB_BIAS
+    rgb = ((rgb + 1.0) / 2.0).clamp(0, 1).mul(255).to(torch.uint8).numpy()
+
+    image = Image.fromarray(rgb, mode="RGB")
+    # Latents are 1/8 of the output size; scale up a bit so the preview is readable
+    scale = max_size / max(image.size)
+    if scale > 1:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.Resampling.BILINEAR)
+    return image
+
+def encode_jpeg_base64(image: Image.Image, quality: int = 70) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+class PreviewThrottle:
+    """Lets through at most one preview per `interval` seconds (None disables previews)."""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval
+        self._last = 0.0
+
+    def due(self) -> bool:
+        if self.interval is None: return False
+        now = time.monotonic()
+        if now - self._last < self.interval: return False
+        self._last = now
+        return True
@@ -0,0 +1,194 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.database import get_connection, init_db
+from app.pnginfo import read_text_chunks, parse_parameters
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany() transaction; keeps write locks short for the engine's inserts
+BATCH_SIZE = 500
+
+# Only one scan at a time; the UIs trigger rescans freely
+_scan_lock = threading.Lock()
+
+ProgressCallback = Callable[[int, int], None]
+
+def _parse_file(path: str) -> Optional[Tuple]:
+    """Reads the metadata of one PNG into an images row (or None if unreadable)."""
+    try:
+        p = parse_parameters(read_text_chunks(path).get("parameters", ""))
+        ts = datetime.fromtimestamp(os.path.getmtime(path))
+        return (path, p.prompt, p.negative_prompt, p.model, p.steps, p.cfg, p.seed, ts)
+    except Exception as e:
+        logger.warning(f"Skipping corrupt file {path}: {e}")
+        return None
+
+def _prefix_range(directory: str) -> Tuple[str, str]:
+    prefix = directory.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+def _known_paths(directory: str) -> set:
+    """Paths already indexed below directory (range scan on the UNIQUE path index)."""
+    c = get_connection().cursor()
+    c.execute("SELECT path FROM images WHERE path >= ? AND path < ?", _prefix_range(directory))
+    return {r[0] for r in c.fetchall()}
+
+def _stale_paths(directory: str, known: set, present: set) -> List[str]:
+    """Indexed paths in directory (or in vanished subfolders of it) whose file is gone."""
+    stale = []
+    dir_exists: Dict[str, bool] = {}
+    for path in known:
+        parent = os.path.dirname(path)
+        if parent == directory:
+            if path not in present: stale.append(path)
+        else:
+            if parent not in dir_exists: dir_exists[parent] = os.path.isdir(parent)
+            if not dir_exists[parent]: stale.append(path)
+    return stale
+
+def _changed_dirs(root: str, state: Dict[str, float], full: bool) -> List[Tuple[str, float]]:
+    """Walks root and returns (directory, mtime) for directories whose mtime differs from the stored one."""
+    changed = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            mtime = os.stat(directory).st_mtime
+            with os.scandir(directory) as it:
+                subdirs = [e.path for e in it if e.is_dir(follow_symlinks=False) and not e.name.startswith(".")]
+        except OSError as e:
+            logger.warning(f"Cannot read {directory}: {e}")
+            continue
+        # A directory's mtime changes when files are added, removed or renamed in it
+        if full or state.get(directory) != mtime:
+            changed.append((directory, mtime))
+        stack.extend(subdirs)
+    return changed
+
+def scan_library(base_dir: str = "output_images", progress_callback: Optional[ProgressCallback] = None,
+                 workers: Optional[int] = None, full: bool = False) -> int:
+    """
+    Imports PNGs below base_dir that are not in the library yet and returns the number added.
+
+    Directories whose mtime is unchanged since the last scan are skipped (full=True
+    rescans everything). New files are parsed on a thread pool, since reading the
+    metadata is I/O bound, and inserted in batches. progress_callback receives
+    (processed, total) for the new files.
+    """
+    return sync_library(base_dir, progress_callback, workers, full, prune=False)[0]
+
+def sync_library(base_dir: str = "output_images", progress_callback: Optional[ProgressCallback] = None,
+                 workers: Optional[int] = None, full: bool = False, prune: bool = True) -> Tuple[int, int]:
+    """
+    Like scan_library, but also removes rows of files that disappeared from the
+    changed folders (prune). Returns (added, removed).
+    """
+    root = os.path.abspath(base_dir)
+    if not os.path.isdir(root): return 0, 0
+    init_db()
+
+    with _scan_lock:
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT dir, mtime FROM scan_state")
+        state = {r[0]: r[1] for r in c.fetchall()}
+
+        changed = _changed_dirs(root, state, full)
+        new_files: List[str] = []
+        stale: List[str] = []
+        for directory, _ in changed:
+            known = _known_paths(directory)
+            try:
+                with os.scandir(directory) as it:
+                    present = {e.path for e in it if _is_image(e.name) and e.is_file()}
+            except OSError as e:
+                logger.warning(f"Cannot read {directory}: {e}")
+                continue
+            new_files.extend(sorted(present - known))
+            if prune: stale.extend(_stale_paths(directory, known, present))
+
+        removed = 0
+        if stale:
+            logger.info(f"Library scan: removing {len(stale)} missing file(s)")
+            removed = delete_paths(stale)
+
+        total = len(new_files)
+        if total: logger.info(f"Library scan: {total} new file(s) in {len(changed)} changed folder(s)")
+        if progress_callback: progress_callback(0, total)
+
+        added = import_files(new_files, progress_callback, workers)
+
+        # Remember the folders only after their files are indexed
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO scan_state (dir, mtime) VALUES (?, ?)", changed)
+        return added, removed
+
+def _is_image(name: str) -> bool:
+    # Hidden files include the image writer's temporary files
+    return name.lower().endswith(".png") and not name.startswith(".")
+
+def import_files(paths: List[str], progress_callback: Optional[ProgressCallback] = None,
+                 workers: Optional[int] = None) -> int:
+    """Parses the given PNGs on a thread pool and inserts them in batches. Returns the number added."""
+    total = len(paths)
+    added = 0
+    processed = 0
+    batch: List[Tuple] = []
+    if not total: return 0
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 2) * 2),
+                            thread_name_prefix="LibraryScan") as pool:
+        for row in pool.map(_parse_file, paths):
+            processed += 1
+            if row: batch.append(row)
+            if len(batch) >= BATCH_SIZE or (processed == total and batch):
+                added += _insert_batch(batch)
+                batch = []
+            if progress_callback and (processed % 50 == 0 or processed == total):
+                progress_callback(processed, total)
+    return added
+
+def delete_paths(paths: Iterable[str] = (), directories: Iterable[str] = ()) -> int:
+    """Removes the rows of deleted files and of everything below deleted directories."""
+    conn = get_connection()
+    rows = [(p,) for p in paths]
+    removed = 0
+    with conn:
+        if rows: removed += conn.executemany("DELETE FROM images WHERE path = ?", rows).rowcount
+        for directory in directories:
+            removed += conn.execute("DELETE FROM images WHERE path >= ? AND path < ?",
+                                    _prefix_range(directory)).rowcount
+    return removed
+
+def apply_changes(created: Iterable[str] = (), deleted: Iterable[str] = (),
+                  deleted_dirs: Iterable[str] = ()) -> Tuple[int, int]:
+    """
+    Applies a batch of filesystem changes (e.g. from the watcher) to the library.
+    Created files that are already indexed are skipped without being parsed.
+    Returns (added, removed).
+    """
+    removed = delete_paths(deleted, deleted_dirs)
+    candidates = sorted(set(created))
+    if not candidates: return 0, removed
+
+    c = get_connection().cursor()
+    known = set()
+    # Stay below SQLite's bound-parameter limit
+    for i in range(0, len(candidates), 500):
+        chunk = candidates[i:i + 500]
+        c.execute(f"SELECT path FROM images WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+        known.update(r[0] for r in c.fetchall())
+    return import_files([p for p in candidates if p not in known]), removed
+
+def _insert_batch(rows: List[Tuple]) -> int:
+    conn = get_connection()
+    with conn:
+        c = conn.executemany('''
+            INSERT OR IGNORE INTO images (path, prompt, negative_prompt, model, steps, cfg, seed, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return max(0, c.rowcount)
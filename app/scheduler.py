@@ -0,0 +1,399 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable
+
+from app.engine import T2IEngine, GenerationCancelled
+from app.preview import PreviewThrottle, latents_to_image, encode_jpeg_base64
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first. Levels are spaced so waiting jobs can age upwards.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_API = 10
+PRIORITY_BATCH = 20
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SAVING = "saving"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+class Job:
+    """
+    A single generation request owned by the EngineScheduler.
+    `params` are keyword arguments for T2IEngine.generate (including model_id).
+    """
+
+    def __init__(self, params: Dict[str, Any], priority: int = PRIORITY_API, source: str = "api",
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 done_callback: Optional[Callable[["Job"], None]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.priority = priority
+        self.source = source
+        self.progress_callback = progress_callback
+        self.done_callback = done_callback
+
+        self.state = JobState.QUEUED
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.step = 0
+        self.total_steps = int(params.get("steps", 30))
+
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.first_step_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        # Latest latent preview (base64 JPEG, plus the image for in-process viewers);
+        # only produced while someone asked for previews
+        self.preview: Optional[str] = None
+        self.preview_image = None
+        self.preview_step = 0
+        self.preview_throttle = PreviewThrottle()
+
+        self._done = threading.Event()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.state in JobState.FINISHED
+
+    def request_previews(self, interval: float) -> None:
+        """Enables latent previews at most every `interval` seconds (the shortest request wins)."""
+        current = self.preview_throttle.interval
+        self.preview_throttle.interval = interval if current is None else min(current, interval)
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Registers a callable that is invoked (from worker threads) whenever the job changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        try: self._listeners.remove(listener)
+        except ValueError: pass
+
+    def _changed(self) -> None:
+        for listener in list(self._listeners):
+            try: listener()
+            except Exception as e: logger.error(f"Job listener failed: {e}")
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """
+        Blocks until the job has finished and returns the output path.
+        Raises GenerationCancelled or RuntimeError if the job did not succeed.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.id} did not finish within {timeout}s")
+        if self.state == JobState.CANCELLED:
+            raise GenerationCancelled(f"Job {self.id} was cancelled.")
+        if self.state == JobState.FAILED:
+            raise RuntimeError(self.error or "Generation failed")
+        return self.result
+
+class EngineScheduler:
+    """
+    Owns a priority queue of generation jobs for one shared T2IEngine.
+
+    A single worker thread feeds the engine. Among waiting jobs of the same
+    (aged) priority, jobs that match the currently loaded checkpoint + LoRA are
+    served first, so bursts of mixed requests cause as few model swaps as possible.
+    Waiting jobs gain one priority level per `aging_interval` seconds, which
+    bounds how long any job can be bypassed.
+    """
+
+    def __init__(self, engine: T2IEngine, aging_interval: float = 30.0, history_size: int = 200):
+        self.engine = engine
+        self.aging_interval = aging_interval
+        self.history_size = history_size
+
+        self._cond = threading.Condition()
+        self._queue: List[Job] = []
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.current_job: Optional[Job] = None
+        self._last_key: Optional[tuple] = None
+        self._stopping = False
+        self._worker: Optional[threading.Thread] = None
+
+        # Rolling estimates used for ETA (seconds)
+        self.sec_per_step = 0.5
+        self.swap_seconds = 15.0
+        self.completed = 0
+        self.swaps = 0
+        self.swap_time_total = 0.0
+
+    # --- Public API ---
+
+    def start(self) -> None:
+        with self._cond:
+            if self._worker and self._worker.is_alive(): return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="EngineScheduler", daemon=True)
+            self._worker.start()
+
+    def shutdown(self, cancel_pending: bool = True) -> None:
+        """Stops the worker thread. Pending jobs are cancelled unless cancel_pending is False."""
+        with self._cond:
+            self._stopping = True
+            cancelled = list(self._queue) if cancel_pending else []
+            for job in cancelled:
+                self._finish_locked(job, JobState.CANCELLED)
+            if cancel_pending: self._queue.clear()
+            self._cond.notify_all()
+        for job in cancelled: self._notify(job)
+        if self.current_job: self.engine.abort_generation()
+
+    def submit(self, params: Dict[str, Any], priority: int = PRIORITY_API, source: str = "api",
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               done_callback: Optional[Callable[[Job], None]] = None) -> Job:
+        """Queues a job and returns it immediately."""
+        job = Job(params, priority, source, progress_callback, done_callback)
+        with self._cond:
+            self._queue.append(job)
+            self._jobs[job.id] = job
+            self._trim_history_locked()
+            self._cond.notify_all()
+        logger.info(f"Queued job {job.id} from {source} (priority {priority}, depth {len(self._queue)})")
+        self.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a waiting job or aborts it if it is currently running."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            if job in self._queue:
+                self._queue.remove(job)
+                self._finish_locked(job, JobState.CANCELLED)
+                cancelled = True
+            else:
+                cancelled = False
+            running = self.current_job is job
+        if cancelled:
+            logger.info(f"Cancelled queued job {job.id}")
+            self._notify(job)
+            return True
+        if running:
+            self.engine.abort_generation()
+            return True
+        return False
+
+    def jobs(self, state: Optional[str] = None, limit: int = 50) -> List[Job]:
+        """Returns the most recent jobs (newest first), optionally filtered by state."""
+        with self._cond:
+            history = list(self._jobs.values())
+        history.reverse()
+        if state: history = [j for j in history if j.state == state]
+        return history[:limit]
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def describe(self, job: Job) -> Dict[str, Any]:
+        """JSON-serializable job description including queue position and ETA."""
+        position, eta = self._position_and_eta(job)
+        return {
+            "id": job.id,
+            "state": job.state,
+            "source": job.source,
+            "priority": job.priority,
+            "position": position,
+            "eta_seconds": eta,
+            "step": job.step,
+            "total_steps": job.total_steps,
+            "model": job.params.get("model_id") or self.engine.base_model_id,
+            "result": job.result,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """Snapshot of the queue for monitoring endpoints."""
+        with self._cond:
+            current = self.current_job
+            planned = self._planned_order_locked()
+        return {
+            "depth": len(planned),
+            "current": self.describe(current) if current else None,
+            "queue": [self.describe(j) for j in planned],
+            "completed": self.completed,
+            "swaps": self.swaps,
+            "swap_time_total": round(self.swap_time_total, 2),
+            "sec_per_step": round(self.sec_per_step, 3),
+            "swap_seconds": round(self.swap_seconds, 2),
+        }
+
+    # --- Ordering ---
+
+    def _job_key(self, job: Job) -> tuple:
+        # LoRA changes are adapter switches, not pipeline swaps
+        return self.engine.pipeline_key(job.params.get("model_id"))
+
+    def _effective_priority(self, job: Job, now: float) -> int:
+        waited_levels = int((now - job.created_at) / self.aging_interval) * 10 if self.aging_interval > 0 else 0
+        return (job.priority - waited_levels) // 10
+
+    def _pick(self, candidates: List[Job], loaded_key: Optional[tuple], now: float) -> Job:
+        return min(candidates, key=lambda j: (
+            self._effective_priority(j, now),
+            0 if self._job_key(j) == loaded_key else 1,
+            j.created_at,
+        ))
+
+    def _planned_order_locked(self) -> List[Job]:
+        """Simulates the order in which the queued jobs will run."""
+        now = time.time()
+        remaining = list(self._queue)
+        key = self._job_key(self.current_job) if self.current_job else (self.engine.loaded_key or self._last_key)
+        order = []
+        while remaining:
+            job = self._pick(remaining, key, now)
+            remaining.remove(job)
+            order.append(job)
+            key = self._job_key(job)
+        return order
+
+    def _estimate(self, job: Job, previous_key: Optional[tuple]) -> float:
+        steps = job.total_steps
+        seconds = steps * self.sec_per_step * (1.25 if job.params.get("use_refiner") else 1.0)
+        if self._job_key(job) != previous_key:
+            seconds += self.swap_seconds
+        return seconds
+
+    def _position_and_eta(self, job: Job):
+        with self._cond:
+            if job.finished:
+                return None, 0.0
+            current = self.current_job
+            eta = 0.0
+            key = self.engine.loaded_key or self._last_key
+            if current is not None:
+                if current is job:
+                    remaining = max(0, job.total_steps - job.step) * self.sec_per_step
+                    return 0, round(remaining, 1)
+                eta += max(0, current.total_steps - current.step) * self.sec_per_step
+                key = self._job_key(current)
+            for position, queued in enumerate(self._planned_order_locked(), start=1):
+                eta += self._estimate(queued, key)
+                if queued is job:
+                    return position, round(eta, 1)
+                key = self._job_key(queued)
+        return None, None
+
+    # --- Worker ---
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job = self._pick(self._queue, self.engine.loaded_key or self._last_key, time.time())
+                self._queue.remove(job)
+                job.state = JobState.RUNNING
+                job.started_at = time.time()
+                self.current_job = job
+            job._changed()
+            self._execute(job)
+
+    def _execute(self, job: Job) -> None:
+        key = self._job_key(job)
+        swapped = key != (self.engine.loaded_key or self._last_key)
+
+        def on_progress(step: int, total: int):
+            if job.first_step_at is None: job.first_step_at = time.time()
+            job.step, job.total_steps = step, total
+            if job.progress_callback: job.progress_callback(step, total)
+            job._changed()
+
+        def on_preview(step: int, total: int, latents):
+            if not job.preview_throttle.due(): return
+            try:
+                image = latents_to_image(latents)
+                job.preview = encode_jpeg_base64(image)
+                job.preview_image = image
+                job.preview_step = step
+            except Exception as e:
+                logger.warning(f"Preview failed: {e}")
+                return
+            job._changed()
+
+        def on_saved(future):
+            # Called from the image writer once the PNG is on disk and indexed
+            error = future.exception()
+            if error: job.error = str(error)
+            else: job.result = future.result()
+            with self._cond:
+                self._finish_locked(job, JobState.FAILED if error else JobState.DONE)
+            self._notify(job)
+
+        state = JobState.SAVING
+        try:
+            job.result = self.engine.generate(**job.params, progress_callback=on_progress, on_saved=on_saved,
+                                              preview_callback=on_preview)
+        except GenerationCancelled:
+            state = JobState.CANCELLED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            state = JobState.FAILED
+
+        self._update_estimates(job, swapped)
+        self._last_key = key
+        with self._cond:
+            self.current_job = None
+            if state == JobState.SAVING:
+                # The writer may already have finished the job
+                if job.finished: return
+                job.state = state
+            else:
+                self._finish_locked(job, state)
+        if state == JobState.SAVING: job._changed()
+        else: self._notify(job)
+
+    def _update_estimates(self, job: Job, swapped: bool) -> None:
+        now = time.time()
+        if job.first_step_at is None or job.started_at is None:
+            return
+        if job.step > 0:
+            self.sec_per_step = 0.8 * self.sec_per_step + 0.2 * ((now - job.first_step_at) / job.step)
+        if swapped:
+            load_time = job.first_step_at - job.started_at
+            self.swaps += 1
+            self.swap_time_total += load_time
+            self.swap_seconds = 0.7 * self.swap_seconds + 0.3 * load_time
+
+    def _finish_locked(self, job: Job, state: str) -> None:
+        job.state = state
+        job.finished_at = time.time()
+        if state == JobState.DONE: self.completed += 1
+        job._done.set()
+
+    def _notify(self, job: Job) -> None:
+        """Runs the job's completion callback outside the scheduler lock."""
+        job._changed()
+        if job.done_callback:
+            try: job.done_callback(job)
+            except Exception as e: logger.error(f"Job callback failed: {e}")
+
+    def _trim_history_locked(self) -> None:
+        while len(self._jobs) > self.history_size:
+            oldest_id = next(iter(self._jobs))
+            if not self._jobs[oldest_id].finished: break
+            del self._jobs[oldest_id]
@@ -1,24 +1,37 @@
+import json
+import asyncio
 import logging
 import threading
 import os
-from typing import Optional
+from typing import List, Optional
 from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
 
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 # Import the core engine and config
-from app.engine import T2IEngine
+from app.engine import T2IEngine, GenerationCancelled
+from app.scheduler import EngineScheduler, Job, JobState, PRIORITY_API
 from app.config import SessionConfig
-from app.database import get_filtered_images, delete_image_record
+from app.database import get_image, get_images_page, delete_image_record, close_connections
+from app.thumbnails import nearest_size
+from app.utils import resolve_model_path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("API")
 
 # --- Pydantic Models for Request Validation ---
+class LoraRequest(BaseModel):
+    path: str
+    scale: float = 1.0
+
 class GenerationRequest(BaseModel):
     prompt: str
     negative_prompt: str = ""
@@ -29,6 +42,8 @@ class GenerationRequest(BaseModel):
     model: str = "stabilityai/stable-diffusion-xl-base-1.0"
     lora_path: Optional[str] = None
     lora_scale: float = 0.8
+    # Additional LoRAs, stacked with lora_path
+    loras: List[LoraRequest] = []
     use_freeu: bool = False
 
 # --- Global Engine Instance ---
@@ -36,6 +51,8 @@ class GenerationRequest(BaseModel):
 # We initialize it as None and create it on startup to avoid import side-effects.
 shared_engine: Optional[T2IEngine] = None
 shared_config: Optional[SessionConfig] = None
+# All generation requests (API, desktop UI) go through this scheduler
+shared_scheduler: Optional[EngineScheduler] = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -43,24 +60,49 @@ async def lifespan(app: FastAPI):
     Lifecycle manager for the FastAPI app.
     Ensures the engine is ready when the server starts.
     """
-    global shared_engine, shared_config
+    global shared_engine, shared_config, shared_scheduler
     logger.info("Server starting up...")
     
     # In a real hybrid run, shared_engine might already be instantiated by main_hybrid.py.
     # If not (standalone server mode), we create it here.
-    if shared_engine is None:
-        logger.info("Initializing T2IEngine for standalone server mode.")
-        shared_engine = T2IEngine()
-    
     if shared_config is None:
         shared_config = SessionConfig()
+
+    if shared_engine is None:
+        logger.info("Initializing T2IEngine for standalone server mode.")
+        shared_engine = T2IEngine(
+            pipeline_cache_size=shared_config.pipeline_cache_size,
+            pipeline_cache_budget_gb=shared_config.pipeline_cache_budget_gb,
+            thumbnail_cache_mb=shared_config.thumbnail_cache_mb,
+            lora_cache_mb=shared_config.lora_cache_mb,
+            max_lora_adapters=shared_config.max_lora_adapters,
+            fuse_loras=shared_config.fuse_loras,
+            fused_lora_cache_mb=shared_config.fused_lora_cache_mb,
+            offload_mode=shared_config.offload_mode,
+            device=shared_config.device,
+            dtype=shared_config.dtype,
+            num_threads=shared_config.num_threads or None,
+            channels_last=shared_config.channels_last,
+            compile_unet=shared_config.compile_unet
+        )
+
+        if shared_config.warmup_on_start:
+            shared_engine.start_warm_up(model_id=resolve_model_path(shared_config.model_path),
+                                        use_refiner=shared_config.warmup_refiner, steps=shared_config.warmup_steps)
+
+    if shared_scheduler is None:
+        shared_scheduler = EngineScheduler(shared_engine)
+    shared_scheduler.start()
         
     yield
     
     logger.info("Server shutting down...")
     # Clean up resources if necessary
+    if shared_scheduler:
+        shared_scheduler.shutdown()
     if shared_engine:
         shared_engine.cleanup()
+    close_connections()
 
 # --- API Setup ---
 app = FastAPI(title="Kami Backend API", lifespan=lifespan)
@@ -86,72 +128,276 @@ async def get_status():
         "status": "online",
         "model": shared_engine.base_model_id,
         "device": shared_engine.device,
-        "is_generating": shared_engine.lock.locked()
+        "readiness": shared_engine.readiness,
+        "readiness_error": shared_engine.readiness_error,
+        "backend": shared_engine.backend.status(),
+        "offload": shared_engine.offload.status(),
+        "is_generating": shared_engine.lock.locked(),
+        "queue_depth": shared_scheduler.depth if shared_scheduler else 0,
+        "pipeline_cache": shared_engine.pipeline_cache.stats(),
+        "conditioning_cache": shared_engine.conditioning_cache.stats(),
+        "lora_cache": shared_engine.loras.stats(),
+        "image_writer": shared_engine.image_writer.stats(),
+        "thumbnails": shared_engine.thumbnails.stats()
     }
 
-@app.post("/api/generate")
-async def generate_image(req: GenerationRequest):
+def _image_url(path: str) -> str:
+    # Relative URL for frontend (images are stored in date subfolders below OUTPUT_ROOT)
+    rel = os.path.relpath(os.path.abspath(path), OUTPUT_ROOT)
+    if rel.startswith(os.pardir): rel = os.path.basename(path)
+    return "/images/" + quote(rel.replace(os.sep, "/"))
+
+# Responses for versioned URLs (?v=...) never change, so clients may keep them for a year
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+def _file_version(st: os.stat_result) -> str:
+    return f"{st.st_mtime_ns:x}"
+
+def _etag(st: os.stat_result, variant: str = "") -> str:
+    return f'"{_file_version(st)}-{st.st_size:x}{variant}"'
+
+def _versioned_urls(image_id: int, path: str) -> dict:
+    """Id-based image and thumbnail URLs; the version changes whenever the file does."""
+    try: v = f"?v={_file_version(os.stat(path))}"
+    except OSError: v = ""
+    return {"url": f"/api/images/{image_id}{v}", "thumb_url": f"/api/images/{image_id}/thumb{v}"}
+
+def _not_modified(request: Request, etag: str, st: os.stat_result) -> bool:
+    """Evaluates If-None-Match (which takes precedence) and If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    since = request.headers.get("if-modified-since")
+    if since:
+        try: return int(st.st_mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError): return False
+    return False
+
+def _cached_file_response(request: Request, path: str, source: os.stat_result, variant: str,
+                          media_type: str, v: Optional[str]) -> Response:
     """
-    Endpoint to trigger image generation.
+    FileResponse with ETag/Last-Modified of the source image, 304 for matching conditional
+    requests and Range support (handled by Starlette). Only requests carrying the current
+    version are marked immutable; others must revalidate.
     """
-    if not shared_engine:
-        raise HTTPException(status_code=503, detail="Engine not initialized")
-    
-    # Check if engine is busy (optional, as engine has internal lock, 
-    # but fast fail here is nicer for HTTP clients)
-    if shared_engine.lock.locked():
-        raise HTTPException(status_code=429, detail="Engine is busy processing another request.")
+    etag = _etag(source, variant)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(source.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE if v == _file_version(source) else REVALIDATE_CACHE,
+    }
+    if _not_modified(request, etag, source):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
 
+def _image_or_404(image_id: int):
+    row = get_image(image_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown image: {image_id}")
     try:
-        # Prepare FreeU args if enabled
-        freeu_args = shared_config.freeu_args if req.use_freeu and shared_config else None
+        return row, os.stat(row["path"])
+    except OSError:
+        raise HTTPException(status_code=404, detail="Image file is missing")
 
-        # Run generation (blocking call, so we ideally run it in a threadpool)
-        # For simplicity in this step, we call it directly, which blocks the event loop briefly.
-        # In production, we should use fastapi.concurrency.run_in_threadpool
-        
-        output_path = await app.router.dependency_overrides.get(
-            "generate_func", 
-            lambda: shared_engine.generate(
-                prompt=req.prompt,
-                negative_prompt=req.negative_prompt,
-                steps=req.steps,
-                guidance_scale=req.guidance_scale,
-                seed=req.seed,
-                use_refiner=req.use_refiner,
-                lora_path=req.lora_path if req.lora_path != "None" else None,
-                lora_scale=req.lora_scale,
-                freeu_args=freeu_args
-            )
-        )()
-
-        return {
-            "status": "success", 
-            "image_path": output_path,
-            "url": f"/images/{os.path.basename(output_path)}" # Relative URL for frontend
-        }
-        
+def _job_payload(job: Job) -> dict:
+    data = shared_scheduler.describe(job)
+    # The file only exists once the writer has finished
+    data["url"] = _image_url(job.result) if job.state == JobState.DONE and job.result else None
+    return data
+
+def _get_job_or_404(job_id: str) -> Job:
+    if not shared_scheduler:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+    job = shared_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.post("/api/generate", status_code=202)
+async def generate_image(req: GenerationRequest, response: Response, wait: bool = False):
+    """
+    Queues an image generation on the shared scheduler and returns the job right away.
+    Poll /api/jobs/{job_id} for state and result. With ?wait=true the call blocks
+    (off the event loop) until the image is saved, like before.
+    """
+    if not shared_engine or not shared_scheduler:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+
+    # Prepare FreeU args if enabled
+    freeu_args = shared_config.freeu_args if req.use_freeu and shared_config else None
+
+    job = shared_scheduler.submit({
+        "prompt": req.prompt,
+        "negative_prompt": req.negative_prompt,
+        "steps": req.steps,
+        "guidance_scale": req.guidance_scale,
+        "seed": req.seed,
+        "use_refiner": req.use_refiner,
+        "lora_path": req.lora_path if req.lora_path != "None" else None,
+        "lora_scale": req.lora_scale,
+        "loras": [(l.path, l.scale) for l in req.loras],
+        "freeu_args": freeu_args,
+        "model_id": req.model,
+    }, priority=PRIORITY_API, source="api")
+
+    if not wait:
+        return {"status": "queued", "job_id": job.id, **_job_payload(job)}
+
+    try:
+        # Wait in a worker thread so the event loop keeps serving other requests
+        output_path = await run_in_threadpool(job.wait)
+    except GenerationCancelled:
+        raise HTTPException(status_code=409, detail="Generation was cancelled.")
     except Exception as e:
         logger.error(f"Generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    response.status_code = 200
+    return {
+        "status": "success", 
+        "job_id": job.id,
+        "image_path": output_path,
+        "url": _image_url(output_path)
+    }
+
+@app.get("/api/jobs")
+def list_jobs(state: Optional[str] = None, limit: int = 50):
+    """Lists recent jobs (newest first), optionally filtered by state."""
+    if not shared_scheduler:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+    return [_job_payload(job) for job in shared_scheduler.jobs(state, max(1, min(limit, 200)))]
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Returns state, progress, queue position/ETA and (once saved) the result of a job."""
+    return _job_payload(_get_job_or_404(job_id))
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Removes a waiting job from the queue or aborts it if it is running."""
+    job = _get_job_or_404(job_id)
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Job already {job.state}")
+    if not shared_scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job can no longer be cancelled ({job.state})")
+    return _job_payload(job)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, preview: bool = False, preview_interval: Optional[float] = None):
+    """
+    Server-Sent Events stream for one job: a `progress` event on every step or state change,
+    `preview` events with an approximated low-res image (if preview=true, throttled to
+    preview_interval seconds) and a final `done` event.
+    """
+    job = _get_job_or_404(job_id)
+    if preview:
+        default_interval = shared_config.preview_interval if shared_config else 0.5
+        job.request_previews(max(0.1, preview_interval if preview_interval is not None else default_interval))
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    # Called from the scheduler/engine threads
+    listener = lambda: loop.call_soon_threadsafe(changed.set)
+    job.add_listener(listener)
+
+    async def stream():
+        sent_preview = None
+        try:
+            while True:
+                changed.clear()
+                data = _job_payload(job)
+                yield _sse("progress", data)
+                if preview and job.preview is not None and job.preview is not sent_preview:
+                    sent_preview = job.preview
+                    yield _sse("preview", {"step": job.preview_step, "image": f"data:image/jpeg;base64,{sent_preview}"})
+                if job.finished:
+                    yield _sse("done", data)
+                    return
+
+                # Coalesces bursts of updates; a comment line keeps proxies from closing the stream
+                while True:
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=15)
+                        break
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected(): return
+                        yield ": keep-alive\n\n"
+        finally:
+            job.remove_listener(listener)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/queue")
+async def get_queue():
+    """Returns queue depth, the running job and the planned order of waiting jobs with ETAs."""
+    if not shared_scheduler:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+    return shared_scheduler.status()
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Returns rolling per-stage timings (ms), throughput and memory figures plus the last job's profile."""
+    if not shared_engine:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+    return {
+        "stages": shared_engine.metrics.snapshot(),
+        "last_profile": shared_engine.metrics.last_profile,
+        "image_writer": shared_engine.image_writer.stats()
+    }
+
 @app.get("/api/gallery")
-async def get_gallery(limit: int = 50, offset: int = 0):
-    """Returns the latest images from the database."""
-    # Note: get_filtered_images currently returns all matches. 
-    # Pagination should ideally be moved to SQL level for performance.
-    images = get_filtered_images() # Returns sqlite3.Row objects
-    
-    # Convert rows to dicts
-    result = []
-    for row in images:
+def get_gallery(limit: int = 50, offset: int = 0, cursor: Optional[str] = None, search: str = "",
+                sort: str = "Newest", model: str = "All", total: bool = False):
+    """
+    Returns one page of images from the database.
+    Follow `next_cursor` for the next page; `offset` is only honoured without a cursor.
+    """
+    try:
+        page = get_images_page(search, sort, model, max(1, min(limit, 500)), cursor, offset, with_total=total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = []
+    for row in page.items:
         img_dict = dict(row)
-        # Add a web-accessible URL
-        filename = os.path.basename(img_dict['path'])
-        img_dict['url'] = f"/images/{filename}"
-        result.append(img_dict)
+        # Add web-accessible, cacheable URLs
+        img_dict.update(_versioned_urls(img_dict['id'], img_dict['path']))
+        items.append(img_dict)
         
-    return result[:limit] # Simple slicing for now
+    return {"items": items, "next_cursor": page.next_cursor, "total": page.total}
+
+@app.api_route("/api/images/{image_id}", methods=["GET", "HEAD"])
+def get_image_file(image_id: int, request: Request, v: Optional[str] = None):
+    """Returns the original PNG. Supports conditional GET (ETag/Last-Modified) and Range requests."""
+    row, st = _image_or_404(image_id)
+    return _cached_file_response(request, row["path"], st, "", "image/png", v)
+
+@app.api_route("/api/images/{image_id}/thumb", methods=["GET", "HEAD"])
+def get_thumbnail(image_id: int, request: Request, size: int = 256, v: Optional[str] = None):
+    """Returns a cached WebP/JPEG thumbnail (sizes are rounded up to 128/256/512)."""
+    if not shared_engine:
+        raise HTTPException(status_code=503, detail="Engine not initialized")
+    row, st = _image_or_404(image_id)
+    size = nearest_size(size)
+    thumbnails = shared_engine.thumbnails
+    variant = f"-{size}{thumbnails.extension}"
+    # Answer revalidations before touching the thumbnail cache
+    if _not_modified(request, _etag(st, variant), st):
+        return _cached_file_response(request, row["path"], st, variant, "", v)
+    try:
+        path = thumbnails.get(row["path"], size)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image file is missing")
+    except Exception as e:
+        logger.error(f"Thumbnail error for {row['path']}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return _cached_file_response(request, path, st, variant, f"image/{thumbnails.format.lower()}", v)
 
 # --- Static File Serving ---
 
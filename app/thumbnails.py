@@ -0,0 +1,221 @@
+import os
+import uuid
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# Fixed thumbnail edge lengths; requests are rounded up to the next one
+THUMBNAIL_SIZES = (128, 256, 512)
+CACHE_DIR = os.path.join("cache", "thumbnails")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Hits only refresh a file's mtime (the LRU marker) if it is older than this
+_TOUCH_INTERVAL = 3600
+# Files written or used this recently are never evicted (they may be about to be served)
+_EVICT_GRACE = 60
+
+def nearest_size(size: int) -> int:
+    """Smallest fixed size >= size (the largest one for bigger requests)."""
+    for s in THUMBNAIL_SIZES:
+        if size <= s: return s
+    return THUMBNAIL_SIZES[-1]
+
+class ThumbnailService:
+    """
+    Generates and caches downscaled copies of library images.
+
+    Thumbnails are keyed by source path + mtime + size, so an overwritten image
+    gets new thumbnails automatically and stale ones age out. Files live in a
+    sharded directory tree (256 subfolders) and the least recently used ones
+    are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 fmt: Optional[str] = None, quality: int = 80, workers: int = 2):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        # WebP is ~30% smaller than JPEG at the same quality, but Pillow may be built without it
+        self.format = fmt or ("WEBP" if features.check("webp") else "JPEG")
+        self.extension = ".webp" if self.format == "WEBP" else ".jpg"
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # Counted lazily on the first write
+        self._last_evict = 0.0
+        # Set while one thread counts or evicts; the directory walk runs outside the lock
+        self._maintaining = False
+        self._pending: Dict[str, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Thumbnails")
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    # --- Lookup ---
+
+    def cache_path(self, source: str, size: int, mtime_ns: Optional[int] = None) -> str:
+        """Path of the cached thumbnail (whether it exists or not). Raises OSError if source is missing."""
+        source = os.path.abspath(source)
+        if mtime_ns is None: mtime_ns = os.stat(source).st_mtime_ns
+        key = hashlib.sha1(f"{source}\0{mtime_ns}\0{nearest_size(size)}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + self.extension)
+
+    def lookup(self, source: str, size: int) -> Optional[str]:
+        """Returns the cached thumbnail if it exists, without generating it."""
+        try:
+            path = self.cache_path(source, size)
+            st = os.stat(path)
+        except OSError:
+            return None
+        self._touch(path, st.st_mtime)
+        return path
+
+    def get(self, source: str, size: int = 256) -> str:
+        """Returns the path of a thumbnail for source, generating it if needed. Raises OSError if source is missing."""
+        path = self.lookup(source, size)
+        if path:
+            self.hits += 1
+            return path
+        self.misses += 1
+        return self._generate(source, [nearest_size(size)])[0]
+
+    def request(self, source: str, sizes: Iterable[int] = THUMBNAIL_SIZES) -> Future:
+        """Generates thumbnails in the background; concurrent requests for one source share a future."""
+        source = os.path.abspath(source)
+        with self._lock:
+            future = self._pending.get(source)
+            if future is not None: return future
+            future = self._pool.submit(self._generate, source, sorted({nearest_size(s) for s in sizes}))
+            self._pending[source] = future
+        # Outside the lock: the callback runs right away if the future is already done
+        future.add_done_callback(lambda _: self._forget(source))
+        return future
+
+    # --- Generation ---
+
+    def pregenerate(self, source: str, image: Optional[Image.Image] = None) -> List[str]:
+        """Writes every fixed size for source, reusing an already decoded image if given."""
+        return self._generate(source, list(THUMBNAIL_SIZES), image)
+
+    def _generate(self, source: str, sizes: List[int], image: Optional[Image.Image] = None) -> List[str]:
+        mtime_ns = os.stat(source).st_mtime_ns
+        targets = [(size, self.cache_path(source, size, mtime_ns)) for size in sizes]
+        missing = [(size, path) for size, path in targets if not os.path.exists(path)]
+        if missing:
+            if image is None:
+                with Image.open(source) as src:
+                    self._write_all(src, missing)
+            else:
+                self._write_all(image, missing)
+        return [path for _, path in targets]
+
+    def _write_all(self, image: Image.Image, targets: List[Tuple[int, str]]) -> None:
+        # Largest first; each smaller size is derived from the previous thumbnail instead of the full image
+        current = image.copy()
+        for size, path in sorted(targets, reverse=True):
+            current.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            self._write(current, path)
+
+    def _write(self, thumb: Image.Image, path: str) -> None:
+        keep_alpha = self.format == "WEBP" and "A" in thumb.getbands()
+        if thumb.mode not in ("RGB", "RGBA") or (thumb.mode == "RGBA" and not keep_alpha):
+            thumb = thumb.convert("RGBA" if keep_alpha else "RGB")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            thumb.save(tmp_path, format=self.format, quality=self.quality)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+        self._account(os.path.getsize(path))
+
+    # --- Eviction ---
+
+    def _touch(self, path: str, mtime: float) -> None:
+        now = time.time()
+        if now - mtime > _TOUCH_INTERVAL:
+            try: os.utime(path, (now, now))
+            except OSError: pass
+
+    def _forget(self, source: str) -> None:
+        with self._lock: self._pending.pop(source, None)
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for directory, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                try: st = os.stat(path)
+                except OSError: continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _account(self, added: int) -> None:
+        # The lock only guards the counter; walking and deleting files happens outside it
+        with self._lock:
+            if self._bytes is not None: self._bytes += added
+            if self._maintaining: return
+            count = self._bytes is None
+            # Eviction walks the whole cache, so it runs at most every few seconds
+            evict = not count and self._bytes > self.max_bytes and time.monotonic() - self._last_evict >= 5
+            if not (count or evict): return
+            self._maintaining = True
+            if evict: self._last_evict = time.monotonic()
+        try:
+            if count:
+                total = sum(size for _, size, _ in self._scan())
+                with self._lock:
+                    self._bytes = total
+                    evict = total > self.max_bytes and time.monotonic() - self._last_evict >= 5
+                    if evict: self._last_evict = time.monotonic()
+            if evict: self._evict()
+        finally:
+            with self._lock: self._maintaining = False
+
+    def _evict(self) -> None:
+        """Deletes the least recently used thumbnails until the cache is at 90% of max_bytes."""
+        with self._lock: counted = self._bytes or 0
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        cutoff = time.time() - _EVICT_GRACE
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= target or mtime > cutoff: break
+            try:
+                os.remove(path)
+                total -= size; removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            # Resync with the scan, keeping bytes that other threads wrote meanwhile
+            self._bytes = max(0, self._bytes + total - counted)
+            self.evicted += removed
+        logger.info(f"Thumbnail cache: evicted {removed} file(s), {total / 1024 ** 2:.0f} MB left")
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, _, path in self._scan():
+                try: os.remove(path)
+                except OSError: pass
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "format": self.format,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
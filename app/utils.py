@@ -4,9 +4,10 @@ import random
 import sys
 import base64
 import glob
-from PIL import Image
 from typing import Dict, List, Optional
 
+from app.pnginfo import read_text_chunks
+
 def is_kitty_compatible() -> bool:
     """
     Checks if the current terminal supports the Kitty graphics protocol
@@ -55,12 +56,9 @@ def get_image_metadata(image_path: str) -> Dict[str, str]:
     """
     info = {}
     try:
-        with Image.open(image_path) as img:
-            img.load()  # Ensure image is loaded
-            if img.info and 'parameters' in img.info:
-                info['parameters'] = img.info['parameters']
-            else:
-                info['parameters'] = "No metadata found."
+        # Reads only the PNG text chunks, not the pixel data
+        chunks = read_text_chunks(image_path)
+        info['parameters'] = chunks.get('parameters', "No metadata found.")
     except Exception as e:
         info['parameters'] = f"Error reading metadata: {e}"
     return info
@@ -116,6 +114,17 @@ def get_file_list(directory: str, file_exts=('.safetensors', '.ckpt')) -> list:
              and f.lower().endswith(file_exts)]
     return sorted(files)
 
+DEFAULT_MODEL = "stabilityai/stable-diffusion-xl-base-1.0"
+CHECKPOINTS_DIR = "models/checkpoints"
+
+def resolve_model_path(model_name: str) -> str:
+    """
+    Maps a model selection (Hub id, path, or file name in models/checkpoints) to what the engine loads.
+    """
+    if not model_name or model_name == DEFAULT_MODEL or os.path.exists(model_name):
+        return model_name or DEFAULT_MODEL
+    return os.path.join(CHECKPOINTS_DIR, model_name)
+
 IOTD_FILE = "iotd_prompts.json"
 
 def generate_random_prompt():
@@ -0,0 +1,252 @@
+import os
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+from typing import Callable, Dict, Optional, Set
+
+from app.scanner import apply_changes, sync_library
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+ChangeCallback = Callable[[int, int], None]
+
+def _is_image(name: str) -> bool:
+    return name.lower().endswith(".png") and not name.startswith(".")
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch({path}): {os.strerror(err)}")
+        return wd
+
+    def read_events(self):
+        """Yields (wd, mask, name) for all pending events."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            yield wd, mask, name
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class LibraryWatcher:
+    """
+    Keeps the image library in sync with changes made to output_images outside the app.
+
+    Uses inotify on Linux and falls back to polling (an incremental scan with pruning)
+    elsewhere or if inotify cannot be used. Events are collected and applied in
+    debounced batches; on_change receives (added, removed) after each batch.
+    """
+
+    def __init__(self, root: str = "output_images", debounce: float = 1.0, max_delay: float = 5.0,
+                 poll_interval: float = 10.0, on_change: Optional[ChangeCallback] = None,
+                 use_inotify: bool = True):
+        self.root = os.path.abspath(root)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self.use_inotify = use_inotify
+        self.mode: Optional[str] = None
+
+        # Pending changes: path -> True (created/changed) or False (deleted)
+        self._pending: Dict[str, bool] = {}
+        self._deleted_dirs: Set[str] = set()
+        self._first_event_at: Optional[float] = None
+        self._last_event_at = 0.0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, str] = {}
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive(): return
+        os.makedirs(self.root, exist_ok=True)
+        self._stop.clear()
+        self.mode = "polling"
+        if self.use_inotify and hasattr(os, "O_NONBLOCK"):
+            try:
+                self._inotify = _Inotify()
+                self._watch_tree(self.root)
+                self.mode = "inotify"
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify unavailable ({e}), falling back to polling every {self.poll_interval}s")
+                self._close_inotify()
+        target = self._run_inotify if self.mode == "inotify" else self._run_polling
+        self._thread = threading.Thread(target=target, name="LibraryWatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.root} ({self.mode})")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread: self._thread.join(timeout=5)
+        self._thread = None
+        self._close_inotify()
+
+    # --- inotify ---
+
+    def _watch_tree(self, top: str) -> None:
+        for directory, subdirs, _ in os.walk(top):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            self._watches[self._inotify.add_watch(directory)] = directory
+
+    def _close_inotify(self) -> None:
+        if self._inotify:
+            try: self._inotify.close()
+            except OSError: pass
+        self._inotify = None
+        self._watches.clear()
+
+    def _queue_tree(self, top: str) -> None:
+        """Queues every image below a directory that was created or moved in."""
+        for directory, subdirs, files in os.walk(top):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            for name in files:
+                if _is_image(name): self._add(os.path.join(directory, name), True)
+
+    def _run_inotify(self) -> None:
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([self._inotify.fd], [], [], 0.25)
+                if readable:
+                    for wd, mask, name in self._inotify.read_events():
+                        self._handle_event(wd, mask, name)
+                self._flush_if_due()
+            self._flush()
+        except Exception as e:
+            logger.error(f"Library watcher stopped: {e}")
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # Events were lost; reconcile the whole tree once
+            logger.warning("inotify queue overflow, rescanning library")
+            self._record_change(*sync_library(self.root))
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+
+        directory = self._watches.get(wd)
+        if directory is None or not name: return
+        path = os.path.join(directory, name)
+
+        if mask & IN_ISDIR:
+            if name.startswith("."): return
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._watch_tree(path)
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        logger.warning("inotify watch limit reached; new folders are only picked up by rescans")
+                    else:
+                        logger.warning(f"Cannot watch {path}: {e}")
+                # Files may have landed before the watch existed (or the tree was moved in)
+                self._queue_tree(path)
+                self._touch()
+            elif mask & IN_MOVED_FROM:
+                self._deleted_dirs.add(path)
+                self._touch()
+            return
+
+        if not _is_image(name): return
+        # IN_CREATE alone is ignored: the file is complete at IN_CLOSE_WRITE / IN_MOVED_TO
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._add(path, True)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self._add(path, False)
+
+    # --- Polling fallback ---
+
+    def _run_polling(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._record_change(*sync_library(self.root))
+            except Exception as e:
+                logger.error(f"Library poll failed: {e}")
+
+    # --- Batching ---
+
+    def _touch(self) -> None:
+        now = time.monotonic()
+        if self._first_event_at is None: self._first_event_at = now
+        self._last_event_at = now
+
+    def _add(self, path: str, created: bool) -> None:
+        self._pending[path] = created
+        self._touch()
+
+    def _flush_if_due(self) -> None:
+        if self._first_event_at is None: return
+        now = time.monotonic()
+        # Wait for a quiet period, but never longer than max_delay after the first event
+        if now - self._last_event_at >= self.debounce or now - self._first_event_at >= self.max_delay:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending and not self._deleted_dirs:
+            self._first_event_at = None
+            return
+        created = [p for p, c in self._pending.items() if c]
+        deleted = [p for p, c in self._pending.items() if not c]
+        deleted_dirs = list(self._deleted_dirs)
+        self._pending.clear(); self._deleted_dirs.clear()
+        self._first_event_at = None
+        try:
+            added, removed = apply_changes(created, deleted, deleted_dirs)
+        except Exception as e:
+            logger.error(f"Failed to apply library changes: {e}")
+            return
+        if added or removed:
+            logger.info(f"Library updated: +{added} / -{removed}")
+        self._record_change(added, removed)
+
+    def _record_change(self, added: int, removed: int) -> None:
+        if self.on_change and (added or removed):
+            try: self.on_change(added, removed)
+            except Exception as e: logger.error(f"Library change callback failed: {e}")
@@ -0,0 +1,64 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+logger = logging.getLogger(__name__)
+
+class AsyncCalls(QObject):
+    """
+    Runs blocking bridge calls (DB queries, directory listings, deletes) on a worker pool.
+
+    Every call gets a request id that comes back with its result signal. Calls of the
+    same kind are coalesced: a new request supersedes the previous one, which is
+    cancelled if it has not started yet and whose result is dropped otherwise. So while
+    the user types a search, only the latest query reaches QML.
+    """
+
+    # Emitted on the GUI thread (queued from the workers)
+    resultReady = Signal(int, str, "QVariant")
+    requestFailed = Signal(int, str, str)
+
+    def __init__(self, workers: int = 4, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="BridgeCall")
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # Latest request id and future per kind
+        self._latest: Dict[str, int] = {}
+        self._pending: Dict[str, Future] = {}
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, coalesce: bool = True) -> int:
+        """Queues fn(*args) and returns the request id. With coalesce=False every call is delivered."""
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            if coalesce:
+                self._latest[kind] = request_id
+                previous = self._pending.pop(kind, None)
+                if previous: previous.cancel()
+            future = self._pool.submit(self._run, request_id, kind, fn, args, coalesce)
+            if coalesce: self._pending[kind] = future
+        return request_id
+
+    def is_current(self, kind: str, request_id: int) -> bool:
+        with self._lock:
+            return self._latest.get(kind, request_id) == request_id
+
+    def _run(self, request_id: int, kind: str, fn: Callable[..., Any], args: tuple, coalesce: bool) -> None:
+        if coalesce and not self.is_current(kind, request_id): return
+        try:
+            result = fn(*args)
+        except Exception as e:
+            logger.error(f"Bridge call '{kind}' failed: {e}")
+            if not coalesce or self.is_current(kind, request_id):
+                self.requestFailed.emit(request_id, kind, str(e))
+            return
+        # A newer request of the same kind was made meanwhile; its result will follow
+        if coalesce and not self.is_current(kind, request_id): return
+        self.resultReady.emit(request_id, kind, result)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
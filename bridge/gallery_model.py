@@ -0,0 +1,237 @@
+import os
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QObject, Qt, Property, Signal, Slot
+
+from app.database import get_images_page, get_image_by_path, delete_image_record
+from app.thumbnails import ThumbnailService
+from bridge.async_calls import AsyncCalls
+
+logger = logging.getLogger(__name__)
+
+# Rows per SQL page; fetchMore() is called again as the view scrolls
+PAGE_SIZE = 120
+THUMB_SIZE = 256
+
+ROLES = ("id", "path", "prompt", "negative_prompt", "model", "steps", "cfg", "seed", "timestamp", "thumb_path")
+_ROLE_IDS = {Qt.ItemDataRole.UserRole + 1 + i: name for i, name in enumerate(ROLES)}
+
+def delete_image_file(path: str) -> str:
+    """Deletes an image file and its record; returns the path, or "" if the record could not be deleted."""
+    if os.path.exists(path): os.remove(path)
+    return path if delete_image_record(path) else ""
+
+def _row_dict(row) -> Dict[str, Any]:
+    data = {key: row[key] for key in row.keys() if key in ROLES}
+    data["timestamp"] = str(data.get("timestamp") or "")
+    if not os.path.isabs(data["path"]): data["path"] = os.path.abspath(data["path"])
+    data["thumb_path"] = ""
+    return data
+
+class GalleryModel(QAbstractListModel):
+    """
+    List model behind the QML gallery.
+
+    Rows are loaded page by page (keyset pagination in SQL) on a background thread
+    when the view asks for more via canFetchMore()/fetchMore(). Changing the filter
+    resets the model; results of requests made for an older filter are dropped.
+    """
+
+    countChanged = Signal()
+    loadingChanged = Signal()
+    # Loader thread -> GUI thread (generation, rows, next cursor)
+    _pageLoaded = Signal(int, object, object)
+    _rowLoaded = Signal(int, object)
+    _thumbReady = Signal(str, str)
+
+    def __init__(self, thumbnails: Optional[ThumbnailService] = None, page_size: int = PAGE_SIZE,
+                 calls: Optional[AsyncCalls] = None, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        # Worker pool for deletes; finished deletes of any caller remove their row
+        self.calls = calls
+        if calls is not None: calls.resultReady.connect(self._on_call_result)
+        self.page_size = page_size
+
+        self._rows: List[Dict[str, Any]] = []
+        self._index: Optional[Dict[str, int]] = None  # path -> row, rebuilt lazily
+        self._search = ""
+        self._sort = "Newest First"
+        self._model_filter = "All Models"
+        self._cursor: Optional[str] = None
+        self._has_more = True
+        self._loading = False
+        # Bumped on every reset so that stale pages are ignored
+        self._generation = 0
+
+        self._pageLoaded.connect(self._on_page_loaded)
+        self._rowLoaded.connect(self._on_row_loaded)
+        self._thumbReady.connect(self._on_thumb_ready)
+
+    # --- QAbstractListModel ---
+
+    def roleNames(self):
+        # A role called "model" would shadow the delegate's `model` object in QML
+        return {role: (b"model_name" if name == "model" else name.encode()) for role, name in _ROLE_IDS.items()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows): return None
+        name = _ROLE_IDS.get(role)
+        if name is None and role == Qt.ItemDataRole.DisplayRole: name = "prompt"
+        return self._rows[index.row()].get(name) if name else None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.canFetchMore(): return
+        self._set_loading(True)
+        args = (self._generation, self._search, self._sort, self._model_filter, self._cursor)
+        threading.Thread(target=self._load_page, args=args, name="GalleryPage", daemon=True).start()
+
+    # --- QML API ---
+
+    @Property(int, notify=countChanged)
+    def count(self): return len(self._rows)
+
+    @Property(bool, notify=loadingChanged)
+    def loading(self): return self._loading
+
+    @Slot(str, str, str)
+    def setFilter(self, search_text: str, sort_by: str, model_filter: str):
+        self._search, self._sort, self._model_filter = search_text, sort_by, model_filter
+        self.refresh()
+
+    @Slot()
+    def refresh(self):
+        """Drops all rows and loads the first page again."""
+        self.beginResetModel()
+        self._generation += 1
+        self._rows = []; self._index = None
+        self._cursor = None; self._has_more = True
+        self._set_loading(False)
+        self.endResetModel()
+        self.countChanged.emit()
+        self.fetchMore()
+
+    @Slot(int, result="QVariantMap")
+    def get(self, row: int):
+        return dict(self._rows[row]) if 0 <= row < len(self._rows) else {}
+
+    @Slot(str)
+    def insertPath(self, path: str):
+        """Adds a newly generated image if it belongs at the top of the current view."""
+        if not path: return
+        generation = self._generation
+        def run():
+            try: row = get_image_by_path(path)
+            except Exception as e:
+                logger.error(f"Gallery: could not load {path}: {e}"); return
+            if row is not None: self._rowLoaded.emit(generation, _row_dict(row))
+        threading.Thread(target=run, name="GalleryInsert", daemon=True).start()
+
+    @Slot(str, result=bool)
+    def removePath(self, path: str) -> bool:
+        """Removes an image from the model (not from disk or the database)."""
+        row = self._row_of(path)
+        if row is None: return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]; self._index = None
+        self.endRemoveRows()
+        self.countChanged.emit()
+        return True
+
+    @Slot(int, result=int)
+    def deleteRow(self, row: int) -> int:
+        """
+        Deletes the image file and its record on the worker pool and returns the request id
+        (-1 if nothing was submitted). The row is removed once the delete succeeded.
+        """
+        if not 0 <= row < len(self._rows) or self.calls is None: return -1
+        return self.calls.submit("delete_image", delete_image_file, self._rows[row]["path"], coalesce=False)
+
+    def _on_call_result(self, request_id: int, kind: str, result) -> None:
+        if kind == "delete_image" and result: self.removePath(result)
+
+    # --- Loading ---
+
+    def _load_page(self, generation: int, search: str, sort: str, model_filter: str, cursor: Optional[str]) -> None:
+        try:
+            page = get_images_page(search, sort, model_filter, limit=self.page_size, cursor=cursor)
+            rows = [_row_dict(r) for r in page.items]
+            # Only stats here; missing thumbnails are rendered in the background
+            if self.thumbnails:
+                for data in rows:
+                    data["thumb_path"] = self.thumbnails.lookup(data["path"], THUMB_SIZE) or ""
+            self._pageLoaded.emit(generation, rows, page.next_cursor)
+        except Exception as e:
+            logger.error(f"Gallery page failed: {e}")
+            self._pageLoaded.emit(generation, [], None)
+
+    def _on_page_loaded(self, generation: int, rows: List[Dict[str, Any]], next_cursor: Optional[str]) -> None:
+        if generation != self._generation: return
+        self._cursor = next_cursor
+        self._has_more = next_cursor is not None
+        if rows:
+            # Skip rows that were already inserted live (e.g. a new generation)
+            known = self._ensure_index()
+            rows = [r for r in rows if r["path"] not in known]
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            if self._index is not None:
+                for i, r in enumerate(rows): self._index[r["path"]] = first + i
+            self.endInsertRows()
+            self.countChanged.emit()
+            self._request_thumbnails(rows)
+        self._set_loading(False)
+
+    def _on_row_loaded(self, generation: int, data: Dict[str, Any]) -> None:
+        if generation != self._generation or self._row_of(data["path"]) is not None: return
+        newest_first = self._sort in ("Newest", "Newest First")
+        unfiltered = not self._search and self._model_filter in ("All Models", "All", "")
+        if not (newest_first and (unfiltered or self._model_filter in (data.get("model") or ""))): return
+        if self.thumbnails: data["thumb_path"] = self.thumbnails.lookup(data["path"], THUMB_SIZE) or ""
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, data); self._index = None
+        self.endInsertRows()
+        self.countChanged.emit()
+        self._request_thumbnails([data])
+
+    def _request_thumbnails(self, rows: List[Dict[str, Any]]) -> None:
+        if not self.thumbnails: return
+        for data in rows:
+            if data["thumb_path"] or not os.path.exists(data["path"]): continue
+            future = self.thumbnails.request(data["path"], [THUMB_SIZE])
+            future.add_done_callback(lambda f, path=data["path"]: self._thumb_done(path, f))
+
+    def _thumb_done(self, path: str, future) -> None:
+        # Runs on a thumbnail worker thread
+        if future.cancelled() or future.exception() is not None: return
+        self._thumbReady.emit(path, future.result()[0])
+
+    def _on_thumb_ready(self, path: str, thumb_path: str) -> None:
+        row = self._row_of(path)
+        if row is None: return
+        self._rows[row]["thumb_path"] = thumb_path
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.UserRole + 1 + ROLES.index("thumb_path")])
+
+    def _ensure_index(self) -> Dict[str, int]:
+        if self._index is None:
+            self._index = {r["path"]: i for i, r in enumerate(self._rows)}
+        return self._index
+
+    def _row_of(self, path: str) -> Optional[int]:
+        return self._ensure_index().get(os.path.abspath(path))
+
+    def _set_loading(self, loading: bool) -> None:
+        if loading != self._loading:
+            self._loading = loading
+            self.loadingChanged.emit()
@@ -0,0 +1,136 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+from urllib.parse import unquote
+
+from PIL import Image
+from PySide6.QtCore import QRunnable, QSize, QThreadPool
+from PySide6.QtGui import QImage, QImageReader
+from PySide6.QtQuick import QQuickAsyncImageProvider, QQuickImageResponse, QQuickTextureFactory
+
+from app.thumbnails import ThumbnailService, nearest_size
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_ID = "kami"
+DEFAULT_THUMB_SIZE = 256
+
+def pil_to_qimage(image: Image.Image) -> QImage:
+    """Copies a PIL image into a QImage (RGB888 or RGBA8888)."""
+    if image.mode not in ("RGB", "RGBA"): image = image.convert("RGB")
+    fmt = QImage.Format.Format_RGBA8888 if image.mode == "RGBA" else QImage.Format.Format_RGB888
+    data = image.tobytes()
+    return QImage(data, image.width, image.height, len(image.getbands()) * image.width, fmt).copy()
+
+class ImageLRU:
+    """Decoded QImages by key, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, QImage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[QImage]:
+        with self._lock:
+            image = self._items.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key: str, image: QImage) -> None:
+        size = image.sizeInBytes()
+        if size > self.max_bytes: return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None: self._bytes -= old.sizeInBytes()
+            self._items[key] = image
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.sizeInBytes()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear(); self._bytes = 0
+
+class _Response(QQuickImageResponse):
+    def __init__(self):
+        super().__init__()
+        self.image = QImage()
+        self.error = ""
+
+    def textureFactory(self):
+        return QQuickTextureFactory.textureFactoryForImage(self.image)
+
+    def errorString(self):
+        return self.error
+
+class _Job(QRunnable):
+    def __init__(self, response: _Response, load: Callable[[], QImage]):
+        super().__init__()
+        self.response = response
+        self.load = load
+
+    def run(self):
+        try:
+            self.response.image = self.load()
+            if self.response.image.isNull(): self.response.error = "Image could not be loaded"
+        except Exception as e:
+            self.response.error = str(e)
+        self.response.finished.emit()
+
+class KamiImageProvider(QQuickAsyncImageProvider):
+    """
+    Serves "image://kami/..." URLs to QML off the GUI thread:
+
+      thumb/<path>      thumbnail from the memory LRU, else the on-disk thumbnail cache
+                        (sourceSize picks 128/256/512, default 256)
+      preview/<job id>  latest latent preview of a running job, straight from memory
+                        (append "/<step>" so QML re-requests it on every update)
+    """
+
+    def __init__(self, thumbnails: ThumbnailService, preview_source: Callable[[str], Optional[Image.Image]],
+                 memory_mb: int = 64, workers: int = 4):
+        super().__init__()
+        self.thumbnails = thumbnails
+        self.preview_source = preview_source
+        self.memory = ImageLRU(memory_mb * 1024 * 1024)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(workers)
+
+    def requestImageResponse(self, image_id: str, requested_size: QSize) -> QQuickImageResponse:
+        response = _Response()
+        kind, _, rest = image_id.partition("/")
+        if kind == "thumb":
+            load = lambda: self._load_thumbnail(unquote(rest), requested_size)
+        elif kind == "preview":
+            load = lambda: self._load_preview(rest.split("/")[0])
+        else:
+            load = lambda: QImage()
+        self.pool.start(_Job(response, load))
+        return response
+
+    def _load_thumbnail(self, path: str, requested_size: QSize) -> QImage:
+        edge = max(requested_size.width(), requested_size.height()) if requested_size.isValid() else 0
+        size = nearest_size(edge or DEFAULT_THUMB_SIZE)
+        # The cache path contains path, mtime and size, so edited files get a new key
+        key = self.thumbnails.cache_path(path, size)
+        image = self.memory.get(key)
+        if image is not None: return image
+
+        reader = QImageReader(self.thumbnails.get(path, size))
+        image = reader.read()
+        if image.isNull(): raise IOError(reader.errorString())
+        self.memory.put(key, image)
+        return image
+
+    def _load_preview(self, job_id: str) -> QImage:
+        image = self.preview_source(job_id)
+        return pil_to_qimage(image) if image is not None else QImage()
@@ -6,18 +6,24 @@ from typing import Optional, List, Dict, Any
 
 from PySide6.QtGui import QGuiApplication
 from PySide6.QtQml import QQmlApplicationEngine
-from PySide6.QtCore import QObject, Slot, Signal, QUrl
+from PySide6.QtCore import QObject, Slot, Signal, Property, QUrl
 
 # Import backend modules
-from app.engine import T2IEngine, GenerationCancelled
+from app.engine import T2IEngine
+from app.scheduler import EngineScheduler, Job, JobState, PRIORITY_INTERACTIVE
 from app.server import start_server_thread
-from app.utils import get_file_list
+from app.utils import get_file_list, resolve_model_path, DEFAULT_MODEL, CHECKPOINTS_DIR
 from app.config import SessionConfig
+from app.scanner import scan_library
+from app.watcher import LibraryWatcher
 import app.server as server_module
+from bridge.gallery_model import GalleryModel, delete_image_file
+from bridge.image_provider import KamiImageProvider, PROVIDER_ID
+from bridge.async_calls import AsyncCalls
 
 # Import DB functions
 from app.database import (
-    get_filtered_images, delete_image_record, get_all_models,
+    get_images_page, get_all_models, close_connections,
     add_character, get_characters, delete_character, update_character,
     add_preset, get_presets, delete_preset
 )
@@ -26,6 +32,9 @@ from app.database import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("Main")
 
+# Edge length of the gallery thumbnails requested from the thumbnail cache
+GALLERY_THUMB_SIZE = 256
+
 class KamiBridge(QObject):
     
     # Signals
@@ -34,11 +43,47 @@ class KamiBridge(QObject):
     statusUpdated = Signal(str, arguments=['message'])
     # NEW: Progress signal (current step, total steps)
     progressChanged = Signal(int, int, arguments=['step', 'total'])
+    # Library scan (processed / new files, then number of imported images)
+    scanProgress = Signal(int, int, arguments=['processed', 'total'])
+    scanFinished = Signal(int, arguments=['count'])
+    # Latent preview of the running job as an image://kami/preview/... URL
+    previewUpdated = Signal(str, arguments=['url'])
+    # Emitted by the library watcher after it indexed new or removed images
+    libraryChanged = Signal(int, int, arguments=['added', 'removed'])
+    # Results of the request_* slots, tagged with the id the slot returned
+    resultReady = Signal(int, str, "QVariant", arguments=['requestId', 'kind', 'result'])
+    requestFailed = Signal(int, str, str, arguments=['requestId', 'kind', 'message'])
+    # Engine readiness: cold, loading, warm or ready (emitted from engine threads, delivered queued)
+    engineStateChanged = Signal(str, arguments=['state'])
 
-    def __init__(self, engine: T2IEngine, config: SessionConfig):
+    def __init__(self, engine: T2IEngine, config: SessionConfig, scheduler: EngineScheduler):
         super().__init__()
         self.engine = engine
         self.config = config
+        self.scheduler = scheduler
+        self._active_job: Optional[Job] = None
+        # DB and filesystem calls run off the GUI thread; only the latest request per kind is answered
+        self._calls = AsyncCalls(parent=self)
+        self._calls.resultReady.connect(self.resultReady)
+        self._calls.requestFailed.connect(self.requestFailed)
+        # Paged gallery model for the QML CollectionView; new images are inserted live, deleted ones removed
+        self._gallery_model = GalleryModel(engine.thumbnails, calls=self._calls, parent=self)
+        self.generationFinished.connect(self._gallery_model.insertPath)
+        engine.add_readiness_listener(self.engineStateChanged.emit)
+
+    def shutdown(self):
+        self._calls.shutdown()
+
+    @Property(QObject, constant=True)
+    def galleryModel(self): return self._gallery_model
+
+    @Property(str, notify=engineStateChanged)
+    def engineState(self): return self.engine.readiness
+
+    def preview_image(self, job_id: str):
+        """Latest latent preview of a job for the image provider (None if there is none)."""
+        job = self.scheduler.get(job_id)
+        return job.preview_image if job else None
 
     # --- Config ---
     @Slot(result="QVariantMap")
@@ -55,41 +100,55 @@ class KamiBridge(QObject):
             setattr(self.config, key, value)
             self.config.save_session_state()
 
-    # --- Resources ---
-    @Slot(result=list)
-    def get_models(self):
-        return ["stabilityai/stable-diffusion-xl-base-1.0"] + get_file_list("models/checkpoints")
+    # --- Resources (async: results arrive via resultReady) ---
+    @Slot(result=int)
+    def request_models(self):
+        return self._calls.submit("models", lambda: [DEFAULT_MODEL] + get_file_list(CHECKPOINTS_DIR))
 
-    @Slot(result=list)
-    def get_loras(self):
-        return ["None"] + get_file_list("models/loras")
+    @Slot(result=int)
+    def request_loras(self):
+        return self._calls.submit("loras", lambda: ["None"] + get_file_list("models/loras"))
     
     # --- Gallery & DB ---
-    @Slot(str, str, str, int, int, result=list)
-    def get_gallery_images(self, search_text, sort_by, model_filter, limit, offset):
-        try:
-            rows = get_filtered_images(search_text, sort_by, model_filter)
-            start = offset; end = offset + limit; sliced = rows[start:end]
-            results = []
-            for row in sliced:
-                data = dict(row)
-                if not os.path.isabs(data['path']): data['path'] = os.path.abspath(data['path'])
-                results.append(data)
-            return results
-        except Exception as e:
-            logger.error(f"Error: {e}"); return []
-
-    @Slot(result=list)
-    def get_db_models(self): return ["All Models"] + get_all_models()
-
-    @Slot(str, result=bool)
-    def delete_image(self, path): 
-        if os.path.exists(path): os.remove(path)
-        return delete_image_record(path)
+    def _gallery_images(self, search_text, sort_by, model_filter, limit, offset):
+        page = get_images_page(search_text, sort_by, model_filter, limit=limit, offset=offset)
+        results = []
+        thumbnails = self.engine.thumbnails
+        for row in page.items:
+            data = dict(row)
+            if not os.path.isabs(data['path']): data['path'] = os.path.abspath(data['path'])
+            # Cached thumbnail if there is one; otherwise create it in the background for the next refresh
+            data['thumb_path'] = thumbnails.lookup(data['path'], GALLERY_THUMB_SIZE) or ""
+            if not data['thumb_path'] and os.path.exists(data['path']):
+                thumbnails.request(data['path'], [GALLERY_THUMB_SIZE])
+            results.append(data)
+        return results
+
+    @Slot(str, str, str, int, int, result=int)
+    def request_gallery_images(self, search_text, sort_by, model_filter, limit, offset):
+        return self._calls.submit("gallery", self._gallery_images, search_text, sort_by, model_filter, limit, offset)
+
+    @Slot()
+    def scan_library(self):
+        """Imports new images from output_images in the background."""
+        def run():
+            try: count = scan_library(progress_callback=self.scanProgress.emit)
+            except Exception as e:
+                logger.error(f"Library scan failed: {e}"); count = 0
+            self.scanFinished.emit(count)
+        threading.Thread(target=run, name="LibraryScanBridge", daemon=True).start()
+
+    @Slot(result=int)
+    def request_db_models(self): return self._calls.submit("db_models", lambda: ["All Models"] + get_all_models())
+
+    @Slot(str, result=int)
+    def request_delete_image(self, path):
+        """Deletes file and record; the result is the path ("" on failure). Deletes are never coalesced."""
+        return self._calls.submit("delete_image", delete_image_file, path, coalesce=False)
 
     # --- Characters ---
-    @Slot(result=list)
-    def get_characters(self): return get_characters()
+    @Slot(result=int)
+    def request_characters(self): return self._calls.submit("characters", get_characters)
     @Slot(str, str, str, str, str, str, float, result=bool)
     def add_character(self, n, d, t, p, no, l, ls): return add_character(n, d, t, p, no, l, ls)
     @Slot(int, str, str, str, str, str, str, float, result=bool)
@@ -98,8 +157,8 @@ class KamiBridge(QObject):
     def delete_character(self, id): return delete_character(id)
 
     # --- Presets ---
-    @Slot(result=list)
-    def get_presets(self): return get_presets()
+    @Slot(result=int)
+    def request_presets(self): return self._calls.submit("presets", get_presets)
     @Slot(str, str, str, float, int, float, str, str, result=bool)
     def add_preset(self, n, m, l, ls, s, c, p, ng): return add_preset(n, m, l, ls, s, c, p, ng)
     @Slot(int, result=bool)
@@ -111,7 +170,10 @@ class KamiBridge(QObject):
     def cancel(self):
         """Stops the current generation process."""
         logger.info("UI requested cancellation.")
-        self.engine.abort_generation()
+        if self._active_job and not self._active_job.finished:
+            self.scheduler.cancel(self._active_job.id)
+        else:
+            self.engine.abort_generation()
 
     @Slot(str, str, int, float, str, bool, str, str, float)
     def generate(self, prompt: str, neg_prompt: str, steps: int, cfg: float, seed_str: str, 
@@ -120,7 +182,7 @@ class KamiBridge(QObject):
         logger.info(f"UI requested generation: '{prompt[:30]}...'")
         self.statusUpdated.emit("Starting generation...")
         
-        real_model_path = model_name if model_name == "stabilityai/stable-diffusion-xl-base-1.0" else os.path.join("models/checkpoints", model_name)
+        real_model_path = resolve_model_path(model_name)
         real_lora_path = os.path.join("models/loras", lora_name) if lora_name and lora_name != "None" else None
         
         seed: Optional[int] = None
@@ -131,36 +193,48 @@ class KamiBridge(QObject):
         final_prompt = (self.config.pony_prefix + prompt) if self.config.pony_mode else prompt
         final_neg = (self.config.pony_neg + neg_prompt) if (self.config.pony_mode and "score_4" not in neg_prompt) else neg_prompt
         freeu_args = self.config.freeu_args if self.config.use_freeu else None
+        # Remembered so the next start warms up this checkpoint
+        if model_name and model_name != self.config.model_path:
+            self.config.model_path = model_name
+            self.config.save_session_state()
         
-        def run_job():
-            try:
-                if self.engine.base_model_id != real_model_path:
-                    logger.info("Switching model...")
-                    self.engine.base_model_id = real_model_path
-                    self.engine.base_pipeline = None 
-                
-                # Helper to emit progress
-                def on_progress(step, total):
-                    self.progressChanged.emit(step, total)
-
-                path = self.engine.generate(
-                    prompt=final_prompt, negative_prompt=final_neg, steps=steps, guidance_scale=cfg,
-                    seed=seed, use_refiner=use_refiner, lora_path=real_lora_path, lora_scale=lora_scale,
-                    freeu_args=freeu_args, progress_callback=on_progress
-                )
-                self.generationFinished.emit(path)
+        # Helper to emit progress
+        def on_progress(step, total):
+            self.progressChanged.emit(step, total)
+
+        def on_done(job: Job):
+            if job.state == JobState.DONE:
+                self.generationFinished.emit(job.result)
                 self.statusUpdated.emit("Ready")
-            except GenerationCancelled:
+            elif job.state == JobState.CANCELLED:
                 logger.info("Worker: Generation cancelled.")
                 self.statusUpdated.emit("Cancelled")
                 # We emit finished with empty path to reset UI state if needed, or handle via status
                 self.generationFinished.emit("") 
-            except Exception as e:
-                logger.error(f"Generation failed: {e}")
-                self.errorOccurred.emit(str(e))
+            else:
+                logger.error(f"Generation failed: {job.error}")
+                self.errorOccurred.emit(job.error or "Generation failed")
                 self.statusUpdated.emit("Error occurred")
 
-        threading.Thread(target=run_job, daemon=True).start()
+        self._active_job = self.scheduler.submit({
+            "prompt": final_prompt, "negative_prompt": final_neg, "steps": steps, "guidance_scale": cfg,
+            "seed": seed, "use_refiner": use_refiner, "lora_path": real_lora_path, "lora_scale": lora_scale,
+            "freeu_args": freeu_args, "model_id": real_model_path
+        }, priority=PRIORITY_INTERACTIVE, source="desktop", progress_callback=on_progress, done_callback=on_done)
+
+        # Live previews are served from memory by the image provider; the step in the URL defeats QML's cache
+        job = self._active_job
+        job.request_previews(self.config.preview_interval)
+        last_step = [0]
+        def on_change():
+            if job.preview_step != last_step[0]:
+                last_step[0] = job.preview_step
+                self.previewUpdated.emit(f"image://{PROVIDER_ID}/preview/{job.id}/{job.preview_step}")
+        job.add_listener(on_change)
+
+        position = self.scheduler.describe(self._active_job)["position"]
+        if position:
+            self.statusUpdated.emit(f"Queued (position {position})")
 
 def main():
     app = QGuiApplication(sys.argv)
@@ -171,20 +245,54 @@ def main():
     logger.info("Loading Session Config...")
     config = SessionConfig()
     logger.info("Initializing T2I Engine...")
-    engine = T2IEngine()
+    engine = T2IEngine(
+        pipeline_cache_size=config.pipeline_cache_size,
+        pipeline_cache_budget_gb=config.pipeline_cache_budget_gb,
+        thumbnail_cache_mb=config.thumbnail_cache_mb,
+        lora_cache_mb=config.lora_cache_mb,
+        max_lora_adapters=config.max_lora_adapters,
+        fuse_loras=config.fuse_loras,
+        fused_lora_cache_mb=config.fused_lora_cache_mb,
+        offload_mode=config.offload_mode,
+        device=config.device,
+        dtype=config.dtype,
+        num_threads=config.num_threads or None,
+        channels_last=config.channels_last,
+        compile_unet=config.compile_unet
+    )
+    
+    scheduler = EngineScheduler(engine)
+    scheduler.start()
     
     server_module.shared_engine = engine; server_module.shared_config = config 
+    server_module.shared_scheduler = scheduler
 
     logger.info("Starting API Server...")
     threading.Thread(target=start_server_thread, kwargs={'host': '0.0.0.0', 'port': 8000}, daemon=True).start()
 
     qml_engine = QQmlApplicationEngine()
-    bridge = KamiBridge(engine, config)
+    bridge = KamiBridge(engine, config, scheduler)
     qml_engine.rootContext().setContextProperty("backend", bridge)
+    # The engine takes ownership of the provider
+    qml_engine.addImageProvider(PROVIDER_ID, KamiImageProvider(engine.thumbnails, bridge.preview_image))
 
     qml_engine.load(QUrl.fromLocalFile("resources/qml/main.qml"))
     if not qml_engine.rootObjects(): sys.exit(-1)
 
+    # Load the last used checkpoint while the user is still typing; jobs queue behind it
+    if config.warmup_on_start:
+        engine.start_warm_up(model_id=resolve_model_path(config.model_path), use_refiner=config.warmup_refiner,
+                             steps=config.warmup_steps)
+
+    # Flush images that are still being written before the process exits
+    app.aboutToQuit.connect(lambda: engine.image_writer.shutdown(wait=True))
+    if config.watch_library:
+        watcher = LibraryWatcher(poll_interval=config.watch_poll_interval, on_change=bridge.libraryChanged.emit)
+        watcher.start()
+        app.aboutToQuit.connect(watcher.stop)
+    app.aboutToQuit.connect(bridge.shutdown)
+    app.aboutToQuit.connect(close_connections)
+
     logger.info("Kami Hybrid started. GUI is ready.")
     sys.exit(app.exec())
 
@@ -8,6 +8,7 @@ import traceback
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.engine import T2IEngine
+from app.scheduler import EngineScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
 
 # Configure logging to console for CLI usage (or file if preferred)
 logging.basicConfig(
@@ -31,28 +32,46 @@ def main():
     parser.add_argument("--lora", type=str, default=None, help="Path to LoRA file")
     parser.add_argument("--lora-scale", type=float, default=1.0, help="LoRA strength (0.0 to 1.0)")
     parser.add_argument("--model", type=str, default="stabilityai/stable-diffusion-xl-base-1.0", help="Base model path or HF ID")
+    parser.add_argument("--batch", action="store_true", help="Submit as low-priority batch job")
+    
+    # Execution backend (e.g. --device cpu on GPU-less render boxes)
+    parser.add_argument("--device", type=str, default="auto", help="auto, cuda, cuda:N or cpu")
+    parser.add_argument("--dtype", type=str, default="auto", choices=["auto", "fp16", "bf16", "fp32"], help="Weight dtype (auto: fp16 on GPU, bf16/fp32 on CPU)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op CPU threads (default: all available cores)")
+    parser.add_argument("--channels-last", action=argparse.BooleanOptionalAction, default=None, help="channels_last memory format (default: on for CPU)")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the UNet (slow first image)")
+    parser.add_argument("--offload", type=str, default="auto", help="auto, resident, vae_tiling, model_offload or sequential_offload")
     
     args = parser.parse_args()
 
     try:
         logger.info(f"Initializing engine with model: {args.model}")
-        engine = T2IEngine(base_model_id=args.model)
+        engine = T2IEngine(base_model_id=args.model, device=args.device, dtype=args.dtype, num_threads=args.threads,
+                           channels_last=args.channels_last, compile_unet=args.compile, offload_mode=args.offload)
 
         if not (0.0 <= args.lora_scale <= 1.0):
             logger.error("LoRA scale must be between 0.0 and 1.0")
             return
 
+        scheduler = EngineScheduler(engine)
+
         logger.info(f"Starting generation for prompt: '{args.prompt}'")
-        output_path = engine.generate(
-            prompt=args.prompt,
-            negative_prompt=args.neg,
-            steps=args.steps,
-            guidance_scale=args.guidance,
-            seed=args.seed,
-            use_refiner=args.refiner,
-            lora_path=args.lora,
-            lora_scale=args.lora_scale
-        )
+        job = scheduler.submit({
+            "prompt": args.prompt,
+            "negative_prompt": args.neg,
+            "steps": args.steps,
+            "guidance_scale": args.guidance,
+            "seed": args.seed,
+            "use_refiner": args.refiner,
+            "lora_path": args.lora,
+            "lora_scale": args.lora_scale
+        }, priority=PRIORITY_BATCH if args.batch else PRIORITY_INTERACTIVE, source="cli")
+
+        try:
+            output_path = job.wait()
+        except KeyboardInterrupt:
+            scheduler.cancel(job.id)
+            raise
         
         print(f"\nSUCCESS: Image saved to: {output_path}")
 
@@ -9,10 +9,24 @@ Item {
 
     // --- State ---
     property int currentTab: 0 
+    property var modelList: []
+    property var loraList: []
     
     // Signal to tell main.qml to switch to Generate tab
     signal restoreParameters(string prompt, string neg, int steps, double cfg, string seed, string model, string lora, double lora_scale)
 
+    // All DB/file queries run in the background; results arrive via resultReady
+    Component.onCompleted: { backend.request_models(); backend.request_loras() }
+    Connections {
+        target: backend
+        function onResultReady(requestId, kind, result) {
+            if (kind === "presets") presetView.model = result
+            else if (kind === "characters") charView.model = result
+            else if (kind === "models") root.modelList = result
+            else if (kind === "loras") root.loraList = result
+        }
+    }
+
     ColumnLayout {
         anchors.fill: parent
         anchors.margins: 20
@@ -73,12 +87,20 @@ Item {
                 property string sortBy: "Newest First"
                 property string modelFilter: "All Models"
                 
+                // The model loads further pages in the background (fetchMore while scrolling)
                 function refreshGallery() {
-                    var imgs = backend.get_gallery_images(searchText, sortBy, modelFilter, 100, 0)
-                    galleryView.model = imgs
+                    backend.galleryModel.setFilter(searchText, sortBy, modelFilter)
                 }
                 Component.onCompleted: refreshGallery()
 
+                property string scanText: ""
+                Connections {
+                    target: backend
+                    function onScanProgress(processed, total) { tabGallery.scanText = total > 0 ? processed + "/" + total : "" }
+                    function onScanFinished(count) { tabGallery.scanText = ""; tabGallery.refreshGallery() }
+                    function onLibraryChanged(added, removed) { tabGallery.refreshGallery() }
+                }
+
                 ColumnLayout {
                     anchors.fill: parent
                     spacing: 10
@@ -103,8 +125,9 @@ Item {
                             }
                         }
                         Button {
-                            text: "Refresh"
-                            onClicked: tabGallery.refreshGallery()
+                            text: tabGallery.scanText !== "" ? tabGallery.scanText : "Refresh"
+                            // Import new files; the gallery reloads after the scan
+                            onClicked: backend.scan_library()
                             background: Rectangle { 
                                 color: Theme.SURFACE0
                                 radius: Theme.BORDER_RADIUS 
@@ -125,7 +148,8 @@ Item {
                         clip: true
                         cellWidth: 230
                         cellHeight: 230
-                        model: [] 
+                        model: backend.galleryModel
+                        cacheBuffer: 2 * cellHeight
                         
                         delegate: Item {
                             width: galleryView.cellWidth
@@ -142,13 +166,14 @@ Item {
                                 MouseArea {
                                     anchors.fill: parent
                                     cursorShape: Qt.PointingHandCursor
-                                    onClicked: detailPopup.openImage(modelData)
+                                    onClicked: detailPopup.openImage(backend.galleryModel.get(index))
                                 }
 
                                 Image {
                                     anchors.fill: parent
                                     anchors.margins: 2
-                                    source: "file://" + modelData.path
+                                    // Thumbnail via the image provider (memory LRU + disk cache)
+                                    source: "image://kami/thumb/" + encodeURIComponent(model.path)
                                     fillMode: Image.PreserveAspectCrop
                                     asynchronous: true
                                     sourceSize.width: 250 
@@ -178,7 +203,7 @@ Item {
                                             anchors.fill: parent
                                             cursorShape: Qt.PointingHandCursor
                                             onClicked: {
-                                                if (backend.delete_image(modelData.path)) tabGallery.refreshGallery()
+                                                backend.galleryModel.deleteRow(index)
                                             }
                                         }
                                     }
@@ -201,7 +226,7 @@ Item {
                 id: tabPresets
                 
                 function refreshPresets() {
-                    presetView.model = backend.get_presets()
+                    backend.request_presets()
                 }
                 
                 onVisibleChanged: if (visible) refreshPresets()
@@ -352,7 +377,7 @@ Item {
                 id: tabCharacters
                 
                 function refreshCharacters() {
-                    charView.model = backend.get_characters()
+                    backend.request_characters()
                 }
                 
                 onVisibleChanged: if (visible) refreshCharacters()
@@ -717,10 +742,9 @@ Item {
                         verticalAlignment: Text.AlignVCenter 
                     }
                     onClicked: { 
-                        if (backend.delete_image(detailPopup.currentData.path)) { 
-                            tabGallery.refreshGallery()
-                            detailPopup.close() 
-                        } 
+                        // Deletes in the background, then removes the row from the gallery model
+                        backend.request_delete_image(detailPopup.currentData.path)
+                        detailPopup.close()
                     }
                 }
                 
@@ -838,7 +862,7 @@ Item {
                 ComboBox { 
                     id: comboCLora
                     Layout.fillWidth: true
-                    model: backend.get_loras() 
+                    model: root.loraList
                     background: Rectangle { 
                         color: Theme.MANTLE
                         radius: 4
@@ -999,7 +1023,7 @@ Item {
                 ComboBox { 
                     id: comboPModel
                     Layout.fillWidth: true
-                    model: backend.get_models() 
+                    model: root.modelList
                     background: Rectangle { 
                         color: Theme.MANTLE
                         radius: 4
@@ -1016,7 +1040,7 @@ Item {
                 ComboBox { 
                     id: comboPLora
                     Layout.fillWidth: true
-                    model: backend.get_loras()
+                    model: root.loraList
                     background: Rectangle { 
                         color: Theme.MANTLE
                         radius: 4
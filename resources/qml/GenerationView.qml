@@ -8,9 +8,12 @@ Item {
     
     // --- Internal State ---
     property string lastImagePath: ""
+    property string previewSource: ""
     property bool isGenerating: false
     property int currentStep: 0
     property int totalSteps: 1
+    // Model to select once the (asynchronously loaded) model list arrives
+    property string pendingModel: ""
     
     // --- Data Loading ---
     function loadDefaults() {
@@ -20,13 +23,19 @@ Item {
         txtNeg.text = cfg.neg_prompt
         chkRefiner.checked = cfg.use_refiner
         
-        comboModel.model = backend.get_models()
-        var mIdx = comboModel.find(cfg.model_path)
-        if (mIdx !== -1) comboModel.currentIndex = mIdx
-        
-        comboLora.model = backend.get_loras()
+        root.pendingModel = cfg.model_path
+        backend.request_models()
+        backend.request_loras()
         console.log("Generation defaults loaded.")
     }
+    
+    // Replaces a combo's entries but keeps the current (or pending) selection
+    function setComboItems(combo, items, preferred) {
+        var keep = preferred || combo.currentText
+        combo.model = items
+        var idx = combo.find(keep)
+        if (idx !== -1) combo.currentIndex = idx
+    }
 
     Component.onCompleted: loadDefaults()
     
@@ -36,9 +45,14 @@ Item {
         function onGenerationFinished(path) {
             console.log("Finished: " + path)
             root.isGenerating = false
+            root.previewSource = ""
             if (path !== "") root.lastImagePath = "file://" + path 
         }
         
+        function onPreviewUpdated(url) {
+            root.previewSource = url
+        }
+        
         function onProgressChanged(step, total) {
             root.isGenerating = true
             root.currentStep = step
@@ -47,6 +61,16 @@ Item {
         
         function onErrorOccurred(msg) {
             root.isGenerating = false
+            root.previewSource = ""
+        }
+        
+        function onResultReady(requestId, kind, result) {
+            if (kind === "models") {
+                root.setComboItems(comboModel, result, root.pendingModel)
+                root.pendingModel = ""
+            } else if (kind === "loras") {
+                root.setComboItems(comboLora, result, "")
+            }
         }
     }
     
@@ -247,7 +271,8 @@ Item {
                 fillMode: Image.PreserveAspectFit
                 source: root.lastImagePath
                 asynchronous: true
-                cache: false 
+                // Every result has its own path, so the pixmap cache can't serve stale images
+                cache: true
                 visible: !root.isGenerating // Hide old image during generation
                 
                 Text {
@@ -264,6 +289,18 @@ Item {
                 color: Theme.BASE
                 visible: root.isGenerating
                 
+                // Live preview from the latents (served from memory, no temp files)
+                Image {
+                    anchors.fill: parent
+                    anchors.margins: 10
+                    fillMode: Image.PreserveAspectFit
+                    source: root.previewSource
+                    asynchronous: true
+                    cache: false
+                    opacity: 0.6
+                    visible: root.previewSource !== ""
+                }
+                
                 ColumnLayout {
                     anchors.centerIn: parent
                     spacing: 20
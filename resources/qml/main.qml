@@ -87,8 +87,15 @@ ApplicationWindow {
                     spacing: 10
                     
                     Text {
-                        text: "🟢 System Ready"
-                        color: Theme.GREEN
+                        readonly property var states: ({
+                            "cold":    { label: "⚪ Model not loaded", color: Theme.OVERLAY0 },
+                            "loading": { label: "🟡 Loading model...", color: Theme.YELLOW },
+                            "warm":    { label: "🔵 Model loaded",     color: Theme.BLUE },
+                            "ready":   { label: "🟢 System Ready",     color: Theme.GREEN }
+                        })
+                        readonly property var current: states[backend.engineState] || states["cold"]
+                        text: current.label
+                        color: current.color
                         font.pixelSize: 12
                     }
                 }
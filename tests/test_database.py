@@ -0,0 +1,73 @@
+import pytest
+
+import app.database as db
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "library.db"))
+    db.init_db()
+    yield db
+    db.close_connections()
+
+def _insert(rows):
+    conn = db.get_connection()
+    with conn:
+        conn.executemany("INSERT INTO images (path, prompt, model, steps, timestamp) VALUES (?, ?, ?, ?, ?)", rows)
+
+def _all_pages(sort_by, limit):
+    paths, cursor = [], None
+    while True:
+        page = db.get_images_page(sort_by=sort_by, limit=limit, cursor=cursor)
+        paths.extend(r["path"] for r in page.items)
+        cursor = page.next_cursor
+        if cursor is None: return paths
+
+@pytest.mark.parametrize("sort_by", ["Newest", "Oldest", "Steps (High-Low)"])
+def test_pages_include_rows_with_null_sort_values(library, sort_by):
+    rows = [(f"/img/{i}.png", "p", "m", None if i % 3 == 0 else i, None if i % 2 == 0 else f"2024-01-{i + 1:02d} 12:00:00")
+            for i in range(10)]
+    _insert(rows)
+    paths = _all_pages(sort_by, limit=3)
+    assert len(paths) == len(set(paths)) == 10
+
+    # Expected: NULLs as the lowest value, ties broken by id in the sort direction
+    column, direction = db._SORT_ORDERS[sort_by]
+    index = 3 if column == "steps" else 4
+    fallback = -1 if column == "steps" else ""
+    keyed = [(row[index] if row[index] is not None else fallback, i + 1, row[0]) for i, row in enumerate(rows)]
+    assert paths == [path for _, _, path in sorted(keyed, reverse=direction == "DESC")]
+
+def test_null_rows_sort_last_when_newest_first(library):
+    _insert([("/img/old.png", "p", "m", 20, "2024-01-01 12:00:00"), ("/img/legacy.png", "p", "m", None, None),
+             ("/img/new.png", "p", "m", 30, "2024-02-01 12:00:00")])
+    assert _all_pages("Newest", limit=1) == ["/img/new.png", "/img/old.png", "/img/legacy.png"]
+    assert _all_pages("Steps (High-Low)", limit=1)[-1] == "/img/legacy.png"
+
+@pytest.mark.parametrize("sort_by, index", [("Newest", "idx_images_sort_timestamp"), ("Oldest", "idx_images_sort_timestamp"),
+                                            ("Steps (High-Low)", "idx_images_sort_steps")])
+def test_keyset_pages_use_the_sort_index(library, sort_by, index):
+    _insert([(f"/img/{i}.png", "p", "m", i, f"2024-01-{i + 1:02d} 12:00:00") for i in range(20)])
+    cursor = db.get_images_page(sort_by=sort_by, limit=5).next_cursor
+
+    # Explain the statement the second page actually runs (with its parameters inlined)
+    conn = db.get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        db.get_images_page(sort_by=sort_by, limit=5, cursor=cursor)
+    finally:
+        conn.set_trace_callback(None)
+    query = next(s for s in statements if "ORDER BY" in s)
+    plan = " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+    assert index in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_generation_record_fills_in_a_row_the_watcher_indexed_first(library):
+    _insert([("/img/new.png", "from png", "m", 30, "2024-01-01 12:00:00")])
+    row_id = db.get_image_by_path("/img/new.png")["id"]
+    db.add_image_record("/img/new.png", "a cat", "blurry", "base.safetensors", 30, 7.0, 42, metrics='{"steps": 30}')
+    row = db.get_image_by_path("/img/new.png")
+    assert (row["id"], row["timestamp"]) == (row_id, "2024-01-01 12:00:00")
+    assert (row["prompt"], row["negative_prompt"], row["model"], row["seed"], row["metrics"]) == \
+        ("a cat", "blurry", "base.safetensors", "42", '{"steps": 30}')
+    assert [r["path"] for r in db.get_images_page(search_text="cat").items] == ["/img/new.png"]
@@ -0,0 +1,19 @@
+from app.lora import format_loras
+from app.pnginfo import parse_parameters
+
+def _parameters(lora_txt):
+    return ("a cat\nNegative prompt: blurry\n"
+            "Steps: 30, CFG scale: 7.0, Seed: 42, Mode: T2I, Model: base.safetensors, "
+            f"Scheduler: DPM++ 2M Karras, FreeU: False, LoRA: {lora_txt}")
+
+def test_several_loras_round_trip():
+    loras = [("/models/loras/a.safetensors", 0.8), ("/models/loras/b.safetensors", 1.0)]
+    params = parse_parameters(_parameters(format_loras(loras)))
+    assert params.extra["LoRA"] == "a.safetensors:0.8, b.safetensors:1"
+    assert set(params.extra) == {"Mode", "Scheduler", "FreeU", "LoRA"}
+    assert (params.steps, params.cfg, params.seed, params.model) == (30, 7.0, "42", "base.safetensors")
+
+def test_single_and_no_lora_stay_unquoted():
+    assert format_loras([("/models/loras/a.safetensors", 0.5)]) == "a.safetensors:0.5"
+    assert format_loras([]) == "None"
+    assert parse_parameters(_parameters(format_loras([]))).extra["LoRA"] == "None"
@@ -0,0 +1,134 @@
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt6.QtCore import QObject, QAbstractListModel, QModelIndex, QRect, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QColor, QPainter, QPainterPath, QPen, QPixmap, QPixmapCache
+from app.style import CAT_COLORS
+from ui.workers import ThumbnailLoader
+
+THUMB_SIZE = 200
+# QPixmapCache ist ein LRU; 200x200 RGBA ≈ 160 KB -> etwa 800 Vorschaubilder
+PIXMAP_CACHE_KB = 128 * 1024
+
+# Rolle für das komplette Zeilen-Dict
+ROW_ROLE = Qt.ItemDataRole.UserRole + 1
+
+def _cache_key(path):
+    return f"gallery:{THUMB_SIZE}:{path}"
+
+class ThumbnailPipeline(QObject):
+    """Lädt Vorschaubilder im Hintergrund in den QPixmapCache; nicht mehr benötigte Aufträge werden abgebrochen."""
+    ready = pyqtSignal(str)
+
+    def __init__(self, thumbnails=None, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(4)
+        self._pending = {}  # Pfad -> ThumbnailLoader
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), PIXMAP_CACHE_KB))
+
+    def pixmap(self, path):
+        pix = QPixmapCache.find(_cache_key(path))
+        return pix if pix is not None and not pix.isNull() else None
+
+    def request(self, path, priority=0):
+        if path in self._pending or self.pixmap(path) is not None: return
+        loader = ThumbnailLoader(path, THUMB_SIZE, self.thumbnails)
+        # Der Loader wird mitgegeben, damit ein abgebrochener nicht den Eintrag seines Nachfolgers entfernt
+        loader.signals.loaded.connect(lambda p, image, l=loader: self._on_loaded(l, p, image))
+        loader.signals.failed.connect(lambda p, l=loader: self._forget(l, p))
+        self._pending[path] = loader
+        self.pool.start(loader, priority)
+
+    def cancel_except(self, keep):
+        """
+        Bricht alle Aufträge ab, deren Pfad nicht in keep ist (noch wartende werden aus der Queue genommen).
+        Laufende werden vergessen, damit ein späteres request() für denselben Pfad neu lädt.
+        """
+        for path, loader in list(self._pending.items()):
+            if path in keep: continue
+            loader.cancelled = True
+            self.pool.tryTake(loader)
+            del self._pending[path]
+
+    def _forget(self, loader, path):
+        if self._pending.get(path) is loader: del self._pending[path]
+
+    def _on_loaded(self, loader, path, image):
+        self._forget(loader, path)
+        # Pixmaps nur im GUI-Thread erzeugen
+        QPixmapCache.insert(_cache_key(path), QPixmap.fromImage(image))
+        self.ready.emit(path)
+
+    def shutdown(self):
+        self.cancel_except(set())
+        self.pool.waitForDone(2000)
+
+class GalleryListModel(QAbstractListModel):
+    """Die Bilder einer Galerie-Seite. Vorschaubilder werden erst beim Zeichnen angefordert."""
+
+    def __init__(self, pipeline, parent=None):
+        super().__init__(parent)
+        self.pipeline = pipeline
+        self.rows = []
+        self._row_of = {}
+        pipeline.ready.connect(self._on_thumbnail_ready)
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = [dict(r) for r in rows]
+        self._row_of = {r['path']: i for i, r in enumerate(self.rows)}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DecorationRole:
+            pix = self.pipeline.pixmap(row['path'])
+            # Sichtbare Kacheln zuerst laden
+            if pix is None: self.pipeline.request(row['path'], priority=1)
+            return pix
+        if role == Qt.ItemDataRole.ToolTipRole: return (row.get('prompt') or "")[:300]
+        if role == ROW_ROLE: return row
+        return None
+
+    def _on_thumbnail_ready(self, path):
+        i = self._row_of.get(path)
+        if i is not None:
+            idx = self.index(i)
+            self.dataChanged.emit(idx, idx, [Qt.ItemDataRole.DecorationRole])
+
+class GalleryDelegate(QStyledItemDelegate):
+    """Zeichnet die Kacheln selbst (abgerundet, Hover-Rahmen), statt pro Bild ein Widget anzulegen."""
+
+    def __init__(self, cell=THUMB_SIZE, parent=None):
+        super().__init__(parent)
+        self.cell = cell
+
+    def sizeHint(self, option, index):
+        return QSize(self.cell, self.cell)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = QRect(option.rect).adjusted(2, 2, -2, -2)
+        clip = QPainterPath(); clip.addRoundedRect(rect.toRectF(), 8, 8)
+        painter.fillPath(clip, QColor(CAT_COLORS['MANTLE']))
+
+        pix = index.data(Qt.ItemDataRole.DecorationRole)
+        if pix is not None:
+            # Wie "KeepAspectRatioByExpanding": mittig zuschneiden
+            scaled = pix.size().scaled(rect.size(), Qt.AspectRatioMode.KeepAspectRatioByExpanding)
+            target = QRect(0, 0, scaled.width(), scaled.height()); target.moveCenter(rect.center())
+            painter.setClipPath(clip)
+            painter.drawPixmap(target, pix)
+            painter.setClipping(False)
+
+        hovered = option.state & QStyle.StateFlag.State_MouseOver
+        selected = option.state & QStyle.StateFlag.State_Selected
+        color = CAT_COLORS['BLUE'] if (hovered or selected) else CAT_COLORS['SURFACE1']
+        painter.setPen(QPen(QColor(color), 2))
+        painter.drawPath(clip)
+        painter.restore()
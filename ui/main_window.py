@@ -1,4 +1,5 @@
 import os
+from collections import OrderedDict
 import qtawesome as qta
 from PIL import Image
 
@@ -8,31 +9,44 @@ from PyQt6.QtWidgets import (
     QFileDialog, QScrollArea, QGridLayout, QSplitter,
     QProgressBar, QMessageBox, QComboBox, QListWidget, QGroupBox,
     QInputDialog, QLineEdit, QSpinBox, QDoubleSpinBox, QStackedWidget,
-    QButtonGroup, QFrame
+    QButtonGroup, QFrame, QListView, QAbstractItemView
 )
-from PyQt6.QtCore import Qt, QThread, QThreadPool, QSize
+from PyQt6.QtCore import Qt, QThread, QThreadPool, QSize, QTimer, pyqtSignal
 from PyQt6.QtGui import QPixmap, QIcon
 
 from app.engine import T2IEngine
+from app.scheduler import EngineScheduler
 from app.config import SessionConfig, STYLES
 from app.utils import get_file_list, generate_random_prompt
 from app.style import get_stylesheet, CAT_COLORS
-from app.database import get_filtered_images, get_all_models, delete_image_record
+from app.database import get_images_page, get_all_models, delete_image_record, close_connections
+from app.watcher import LibraryWatcher
 
-from ui.workers import GeneratorWorker, DBScannerWorker, ThumbnailLoader
+from ui.workers import GeneratorWorker, DBScannerWorker
+from ui.gallery import ThumbnailPipeline, GalleryListModel, GalleryDelegate, ROW_ROLE
 from ui.widgets import ClickableLabel, setup_combo_view, ImageViewerDialog
 
 CHECKPOINTS_DIR = "models/checkpoints"
 LORAS_DIR = "models/loras"
 
 class MainWindow(QMainWindow):
+    # Vom Watcher-Thread ausgelöst (added, removed)
+    library_changed = pyqtSignal(int, int)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Kami - SDXL Station")
         self.resize(1600, 950)
         
-        self.engine = T2IEngine()
         self.config = SessionConfig()
+        self.engine = T2IEngine(pipeline_cache_size=self.config.pipeline_cache_size,
+                                pipeline_cache_budget_gb=self.config.pipeline_cache_budget_gb,
+                                thumbnail_cache_mb=self.config.thumbnail_cache_mb, lora_cache_mb=self.config.lora_cache_mb,
+                                max_lora_adapters=self.config.max_lora_adapters, fuse_loras=self.config.fuse_loras,
+                                fused_lora_cache_mb=self.config.fused_lora_cache_mb, offload_mode=self.config.offload_mode,
+                                device=self.config.device, dtype=self.config.dtype, num_threads=self.config.num_threads or None,
+                                channels_last=self.config.channels_last, compile_unet=self.config.compile_unet)
+        self.scheduler = EngineScheduler(self.engine)
         self.history = []
         self.threadpool = QThreadPool()
         
@@ -40,6 +54,10 @@ class MainWindow(QMainWindow):
         self.gallery_page_size = 50     
         self.gallery_current_page = 0 
         self.selected_gallery_item = None
+        # Zuletzt geladene Seiten: (Suche, Sortierung, Modell, Seite) -> (Zeilen, Gesamtzahl)
+        self.gallery_pages = OrderedDict()
+        self.gallery_pages_max = 5
+        self.thumb_pipeline = ThumbnailPipeline(self.engine.thumbnails, self)
         
         os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
         os.makedirs(LORAS_DIR, exist_ok=True)
@@ -49,6 +67,22 @@ class MainWindow(QMainWindow):
         self.load_settings_from_config()
         self.start_db_scan()
 
+        # Optional: Änderungen in output_images live übernehmen statt neu zu scannen
+        self.watcher = None
+        if self.config.watch_library:
+            self.library_changed.connect(lambda *_: self.refresh_gallery_view())
+            self.watcher = LibraryWatcher(poll_interval=self.config.watch_poll_interval, on_change=self.library_changed.emit)
+            self.watcher.start()
+
+    def closeEvent(self, event):
+        if self.watcher: self.watcher.stop()
+        self.thumb_pipeline.shutdown()
+        # Noch wartende Bilder auf die Platte schreiben
+        self.scheduler.shutdown()
+        self.engine.image_writer.shutdown(wait=True)
+        close_connections()
+        super().closeEvent(event)
+
     def apply_theme(self):
         self.setStyleSheet(get_stylesheet())
 
@@ -415,10 +449,10 @@ class MainWindow(QMainWindow):
         self.combo_sort = setup_combo_view(QComboBox())
         self.combo_sort.setFixedWidth(150)
         self.combo_sort.setMinimumHeight(35)
-        self.combo_sort.addItems(["Newest First", "Oldest First", "Steps (High-Low)"])
+        self.combo_sort.addItems(["Newest First", "Oldest First", "Steps (High-Low)", "Relevance"])
         self.combo_sort.currentIndexChanged.connect(self.on_gallery_search_changed)
         
-        btn_scan = QPushButton(" Rescan")
+        self.btn_scan = btn_scan = QPushButton(" Rescan")
         btn_scan.setIcon(qta.icon('fa5s.sync-alt', color=CAT_COLORS['TEXT']))
         btn_scan.setFixedSize(100, 35)
         btn_scan.clicked.connect(self.start_db_scan)
@@ -438,18 +472,23 @@ class MainWindow(QMainWindow):
         left_layout.setContentsMargins(0, 0, 0, 0)
         left_layout.setSpacing(0)
         
-        self.gal_scroll = QScrollArea()
-        self.gal_scroll.setWidgetResizable(True)
-        self.gal_scroll.setFrameShape(QScrollArea.Shape.NoFrame)
-        self.gal_scroll.setStyleSheet(f"background-color: {CAT_COLORS['BASE']};")
-        
-        self.db_grid = QWidget()
-        self.db_layout = QGridLayout(self.db_grid)
-        self.db_layout.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
-        self.db_layout.setContentsMargins(15, 15, 15, 15)
-        self.db_layout.setSpacing(10)
-        self.gal_scroll.setWidget(self.db_grid)
-        left_layout.addWidget(self.gal_scroll)
+        # Model/View statt einem Widget pro Bild: nur sichtbare Kacheln werden gezeichnet (und geladen)
+        self.gallery_model = GalleryListModel(self.thumb_pipeline, self)
+        self.gallery_view = QListView()
+        self.gallery_view.setViewMode(QListView.ViewMode.IconMode)
+        self.gallery_view.setMovement(QListView.Movement.Static)
+        self.gallery_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.gallery_view.setUniformItemSizes(True)
+        self.gallery_view.setSpacing(10)
+        self.gallery_view.setMouseTracking(True)
+        self.gallery_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.gallery_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.gallery_view.setFrameShape(QFrame.Shape.NoFrame)
+        self.gallery_view.setStyleSheet(f"QListView {{ background-color: {CAT_COLORS['BASE']}; padding: 5px; }}")
+        self.gallery_view.setItemDelegate(GalleryDelegate(parent=self.gallery_view))
+        self.gallery_view.setModel(self.gallery_model)
+        self.gallery_view.clicked.connect(self.on_gallery_item_clicked)
+        left_layout.addWidget(self.gallery_view)
         
         pag_container = QWidget()
         pag_container.setFixedHeight(50)
@@ -506,64 +545,76 @@ class MainWindow(QMainWindow):
         spinbox.valueChanged.connect(lambda v: slider.setValue(int(v * factor)))
 
     def start_db_scan(self):
+        # Läuft schon ein Scan, reicht dieser (er findet auch die neuen Dateien)
+        if getattr(self, "scan_thread", None) and self.scan_thread.isRunning(): return
         self.scan_thread = QThread()
         self.scan_worker = DBScannerWorker()
         self.scan_worker.moveToThread(self.scan_thread)
         self.scan_thread.started.connect(self.scan_worker.run)
+        self.scan_worker.progress.connect(self.on_scan_progress)
         self.scan_worker.finished.connect(lambda c: print(f"Scanned {c} new images"))
+        self.scan_worker.finished.connect(lambda _: self.btn_scan.setText(" Rescan"))
         self.scan_worker.finished.connect(self.refresh_gallery_view)
         self.scan_worker.finished.connect(self.scan_thread.quit)
         self.scan_thread.start()
 
+    def on_scan_progress(self, done, total):
+        if total: self.btn_scan.setText(f" {done}/{total}")
+
     def on_gallery_search_changed(self):
         self.gallery_current_page = 0
         self.refresh_gallery_view()
 
     def refresh_gallery_view(self):
+        # Daten haben sich geändert (Scan, Löschen, Filter) -> gecachte Seiten verwerfen
+        self.gallery_pages.clear()
         current_models = [self.combo_filter_model.itemText(i) for i in range(self.combo_filter_model.count())]
         for m in get_all_models():
             if m not in current_models: self.combo_filter_model.addItem(m)
         
-        self.gallery_results = get_filtered_images(
-            self.txt_search.text(), 
-            self.combo_sort.currentText(), 
-            "All" if self.combo_filter_model.currentText() == "All Models" else self.combo_filter_model.currentText()
-        )
         self.render_gallery_page()
 
-    def render_gallery_page(self):
-        for i in reversed(range(self.db_layout.count())): 
-            w = self.db_layout.itemAt(i).widget()
-            if w: w.setParent(None)
+    def gallery_page_key(self, page):
+        model = self.combo_filter_model.currentText()
+        return (self.txt_search.text(), self.combo_sort.currentText(), "All" if model == "All Models" else model, page)
+
+    def load_gallery_page(self, page):
+        """Liefert (Zeilen, Gesamtzahl) einer Seite, aus dem Seiten-Cache oder per SQL (LIMIT/OFFSET)."""
+        key = self.gallery_page_key(page)
+        if key in self.gallery_pages:
+            self.gallery_pages.move_to_end(key)
+            return self.gallery_pages[key]
+        search, sort_by, model, _ = key
+        result = get_images_page(search, sort_by, model, limit=self.gallery_page_size,
+                                 offset=page * self.gallery_page_size, with_total=True)
+        entry = ([dict(r) for r in result.items], result.total)
+        self.gallery_pages[key] = entry
+        while len(self.gallery_pages) > self.gallery_pages_max: self.gallery_pages.popitem(last=False)
+        return entry
 
-        total_items = len(self.gallery_results)
-        start_idx = self.gallery_current_page * self.gallery_page_size
-        end_idx = start_idx + self.gallery_page_size
-        visible_items = self.gallery_results[start_idx:end_idx]
-        
-        for i, row in enumerate(visible_items):
-            loader = ThumbnailLoader(row['path'], row['prompt'][:300], dict(row))
-            loader.signals.loaded.connect(self.add_thumbnail_to_grid)
-            self.threadpool.start(loader)
-            
+    def render_gallery_page(self):
+        rows, total_items = self.load_gallery_page(self.gallery_current_page)
+        self.gallery_results = rows
+        # Aufträge der verlassenen Seite abbrechen, damit sie die neue nicht ausbremsen
+        self.thumb_pipeline.cancel_except({r['path'] for r in rows})
+        self.gallery_model.set_rows(rows)
         self.update_pagination_controls(total_items)
+        # Nachbarseiten erst nach dem Zeichnen der aktuellen Seite vorladen
+        QTimer.singleShot(0, lambda page=self.gallery_current_page, total=total_items: self.prefetch_gallery_pages(page, total))
 
-    def add_thumbnail_to_grid(self, path, pixmap, tooltip, row_data):
-        if self.db_layout.count() >= self.gallery_page_size: return
+    def prefetch_gallery_pages(self, page, total_items):
+        if page != self.gallery_current_page: return
+        total_pages = (total_items + self.gallery_page_size - 1) // self.gallery_page_size
+        for p in (page + 1, page - 1):
+            if not 0 <= p < total_pages: continue
+            rows, _ = self.load_gallery_page(p)
+            # Niedrige Priorität: sichtbare Kacheln (Priorität 1) laufen vor
+            for row in rows: self.thumb_pipeline.request(row['path'], priority=0)
 
-        count = self.db_layout.count()
-        cols = 5
-        lbl = ClickableLabel(path)
-        lbl.setPixmap(pixmap)
-        lbl.setFixedSize(200, 200) 
-        lbl.setScaledContents(True) 
-        lbl.setStyleSheet(f"""
-            QLabel {{ border: 2px solid {CAT_COLORS['SURFACE1']}; border-radius: 8px; background-color: {CAT_COLORS['MANTLE']}; }}
-            QLabel:hover {{ border: 2px solid {CAT_COLORS['BLUE']}; }}
-        """)
-        lbl.setToolTip(tooltip)
-        lbl.clicked.connect(lambda: self.show_gallery_details(row_data, pixmap))
-        self.db_layout.addWidget(lbl, count // cols, count % cols)
+    def on_gallery_item_clicked(self, index):
+        row = index.data(ROW_ROLE)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if row: self.show_gallery_details(row, pixmap if pixmap is not None else QPixmap())
 
     def update_pagination_controls(self, total_items):
         for i in reversed(range(self.pag_layout.count())): 
@@ -605,7 +656,7 @@ class MainWindow(QMainWindow):
     def change_gallery_page(self, new_page):
         self.gallery_current_page = new_page
         self.render_gallery_page()
-        self.gal_scroll.verticalScrollBar().setValue(0)
+        self.gallery_view.scrollToTop()
 
     def show_gallery_details(self, row, pixmap):
         self.selected_gallery_item = row
@@ -747,7 +798,7 @@ class MainWindow(QMainWindow):
             "freeu_args": {"s1":0.9, "s2":0.2, "b1":1.3, "b2":1.4} if self.chk_freeu.isChecked() else None
         }
         self.thread = QThread()
-        self.worker = GeneratorWorker(self.engine, params)
+        self.worker = GeneratorWorker(self.scheduler, params)
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)
         self.worker.finished.connect(self.on_generation_finished)
@@ -807,7 +858,7 @@ class MainWindow(QMainWindow):
             }
             
             self.thread = QThread()
-            self.worker = GeneratorWorker(self.engine, params)
+            self.worker = GeneratorWorker(self.scheduler, params)
             self.worker.moveToThread(self.thread)
             self.thread.started.connect(self.worker.run)
             self.worker.finished.connect(self.on_iotd_finished)
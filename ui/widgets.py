@@ -1,11 +1,14 @@
+import os
+from collections import OrderedDict
 from PyQt6.QtWidgets import (
-    QLabel, QListView, QComboBox, QDialog, QScrollArea, 
+    QLabel, QListView, QComboBox, QDialog,
     QVBoxLayout, QPushButton, QHBoxLayout, QSizePolicy, QWidget, QMessageBox
 )
-from PyQt6.QtCore import pyqtSignal, Qt
-from PyQt6.QtGui import QPixmap, QAction
+from PyQt6.QtCore import pyqtSignal, Qt, QPointF, QRectF, QThreadPool, QTimer
+from PyQt6.QtGui import QAction, QColor, QPainter
 import qtawesome as qta
 from app.style import CAT_COLORS
+from ui.workers import ImagePyramidLoader
 
 class ClickableLabel(QLabel):
     clicked = pyqtSignal()
@@ -21,6 +24,157 @@ def setup_combo_view(combo: QComboBox):
     combo.setView(QListView())
     return combo
 
+# Die letzten Bildpyramiden: (Pfad, mtime) -> Stufen. Erneutes Öffnen dekodiert nicht noch einmal.
+_PYRAMID_CACHE = OrderedDict()
+_PYRAMID_CACHE_SIZE = 3
+
+def _pyramid_key(path):
+    try: return (path, os.stat(path).st_mtime_ns)
+    except OSError: return None
+
+class ImageCanvas(QWidget):
+    """
+    Zeichnet ein Bild aus einer Mip-Pyramide mit Zoom (Mausrad) und Pan (Ziehen).
+    Es wird immer nur der sichtbare Ausschnitt der passenden Stufe gezeichnet, ohne skalierte Kopien.
+    Während Größenänderung/Zoom wird schnell (nearest) gezeichnet, kurz danach wieder glatt.
+    """
+    zoom_changed = pyqtSignal(float)
+    MIN_ZOOM, MAX_ZOOM = 0.02, 16.0
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.levels = []
+        self.message = "Loading..."
+        self.zoom = 1.0
+        self.fit_mode = True
+        self.offset = QPointF(0, 0)  # Position der linken oberen Bildecke im Widget
+        self.smooth = True
+        self._drag_pos = None
+        self._refine = QTimer(self)
+        self._refine.setSingleShot(True)
+        self._refine.setInterval(150)
+        self._refine.timeout.connect(self._on_refine)
+        self.setMouseTracking(False)
+
+    def set_levels(self, levels):
+        self.levels = levels
+        self.fit()
+
+    def set_message(self, text):
+        self.levels = []; self.message = text
+        self.update()
+
+    def image_size(self):
+        return self.levels[0].size() if self.levels else None
+
+    def fit_zoom(self):
+        size = self.image_size()
+        if not size or size.isEmpty() or self.width() <= 0 or self.height() <= 0: return 1.0
+        return min(self.width() / size.width(), self.height() / size.height())
+
+    def fit(self):
+        self.fit_mode = True
+        self._set_zoom(self.fit_zoom())
+        self.update()
+
+    def actual_size(self, anchor=None):
+        self.fit_mode = False
+        self._set_zoom(1.0, anchor)
+        self.update()
+
+    def _set_zoom(self, zoom, anchor=None):
+        zoom = min(max(zoom, min(self.MIN_ZOOM, self.fit_zoom())), self.MAX_ZOOM)
+        if anchor is None: anchor = QPointF(self.width() / 2, self.height() / 2)
+        # Der Bildpunkt unter dem Anker bleibt an seiner Stelle
+        img_pt = (anchor - self.offset) / self.zoom
+        self.offset = anchor - img_pt * zoom
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.zoom_changed.emit(zoom)
+        self._clamp()
+
+    def _clamp(self):
+        size = self.image_size()
+        if not size: return
+        x, y = self.offset.x(), self.offset.y()
+        sw, sh = size.width() * self.zoom, size.height() * self.zoom
+        # Kleiner als das Fenster: zentrieren, sonst keine Ränder zulassen
+        x = (self.width() - sw) / 2 if sw <= self.width() else min(0.0, max(self.width() - sw, x))
+        y = (self.height() - sh) / 2 if sh <= self.height() else min(0.0, max(self.height() - sh, y))
+        self.offset = QPointF(x, y)
+
+    def _interact(self):
+        self.smooth = False
+        self._refine.start()
+        self.update()
+
+    def _on_refine(self):
+        self.smooth = True
+        self.update()
+
+    def _level_for_zoom(self):
+        # Kleinste Stufe, die noch mindestens so groß ist wie die Darstellung
+        full = self.levels[0].width()
+        for level in reversed(self.levels):
+            if level.width() / full >= self.zoom: return level
+        return self.levels[0]
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("black"))
+        if not self.levels:
+            painter.setPen(QColor(CAT_COLORS['SUBTEXT0']))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, self.message)
+            return
+
+        full = self.levels[0]
+        level = self._level_for_zoom()
+        scale = level.width() / full.width()
+        # Sichtbarer Ausschnitt in Bildkoordinaten
+        view = QRectF(-self.offset.x() / self.zoom, -self.offset.y() / self.zoom, self.width() / self.zoom, self.height() / self.zoom)
+        visible = view.intersected(QRectF(0, 0, full.width(), full.height()))
+        if visible.isEmpty(): return
+        source = QRectF(visible.x() * scale, visible.y() * scale, visible.width() * scale, visible.height() * scale)
+        target = QRectF(self.offset + visible.topLeft() * self.zoom, visible.size() * self.zoom)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, self.smooth)
+        painter.drawImage(target, level, source)
+
+    def resizeEvent(self, event):
+        if self.levels:
+            if self.fit_mode: self._set_zoom(self.fit_zoom())
+            else: self._clamp()
+            self._interact()
+        super().resizeEvent(event)
+
+    def wheelEvent(self, event):
+        if not self.levels: return
+        steps = event.angleDelta().y() / 120
+        if not steps: return
+        self.fit_mode = False
+        self._set_zoom(self.zoom * (1.25 ** steps), event.position())
+        self._interact()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton and self.levels:
+            self._drag_pos = event.position()
+            self.setCursor(Qt.CursorShape.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_pos is None: return
+        self.offset += event.position() - self._drag_pos
+        self._drag_pos = event.position()
+        self._clamp()
+        self._interact()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_pos = None
+        self.unsetCursor()
+
+    def mouseDoubleClickEvent(self, event):
+        # Doppelklick: zwischen Einpassen und 1:1 an der Mausposition wechseln
+        if self.fit_mode: self.actual_size(event.position())
+        else: self.fit()
+
 class ImageViewerDialog(QDialog):
     # Neues Signal, das den Pfad des zu löschenden Bildes sendet
     delete_confirmed = pyqtSignal(str)
@@ -35,21 +189,10 @@ class ImageViewerDialog(QDialog):
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         
-        # Scroll Area
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setStyleSheet("border: none;")
-        self.scroll_area.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        self.image_label = QLabel()
-        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.image_label.setStyleSheet("background-color: black;")
-        
-        self.pixmap = QPixmap(image_path)
-        self.image_label.setPixmap(self.pixmap)
-        
-        self.scroll_area.setWidget(self.image_label)
-        layout.addWidget(self.scroll_area)
+        # Zeichenfläche mit Zoom/Pan (ersetzt QScrollArea + QLabel)
+        self.canvas = ImageCanvas()
+        self.canvas.zoom_changed.connect(lambda z: self.lbl_zoom.setText(f"{z * 100:.0f}%"))
+        layout.addWidget(self.canvas, 1)
         
         # Toolbar
         toolbar = QWidget()
@@ -62,6 +205,9 @@ class ImageViewerDialog(QDialog):
         
         btn_100 = QPushButton(" 1:1")
         btn_100.clicked.connect(self.show_original_size)
+
+        self.lbl_zoom = QLabel("")
+        self.lbl_zoom.setStyleSheet(f"color: {CAT_COLORS['SUBTEXT0']}; border: none;")
         
         # NEU: Delete Button
         btn_del = QPushButton(" Delete")
@@ -74,12 +220,32 @@ class ImageViewerDialog(QDialog):
 
         tb_layout.addWidget(btn_del) # Delete links
         tb_layout.addStretch()
+        tb_layout.addWidget(self.lbl_zoom)
         tb_layout.addWidget(btn_fit)
         tb_layout.addWidget(btn_100)
         tb_layout.addWidget(btn_close)
         
         layout.addWidget(toolbar)
-        self.fit_to_window()
+        self.load_image()
+
+    def load_image(self):
+        # Dekodieren + Pyramide im Hintergrund, der Dialog erscheint sofort
+        key = _pyramid_key(self.image_path)
+        if key in _PYRAMID_CACHE:
+            _PYRAMID_CACHE.move_to_end(key)
+            self.canvas.set_levels(_PYRAMID_CACHE[key])
+            return
+        loader = ImagePyramidLoader(self.image_path)
+        loader.signals.loaded.connect(self.on_image_loaded)
+        loader.signals.failed.connect(lambda path, err: self.canvas.set_message(f"Could not load image: {err}"))
+        QThreadPool.globalInstance().start(loader)
+
+    def on_image_loaded(self, path, levels):
+        key = _pyramid_key(path)
+        if key:
+            _PYRAMID_CACHE[key] = levels
+            while len(_PYRAMID_CACHE) > _PYRAMID_CACHE_SIZE: _PYRAMID_CACHE.popitem(last=False)
+        if path == self.image_path: self.canvas.set_levels(levels)
 
     def ask_delete(self):
         # Sicherheitsabfrage direkt im Viewer
@@ -90,16 +256,7 @@ class ImageViewerDialog(QDialog):
             self.close()
 
     def fit_to_window(self):
-        if not self.pixmap.isNull():
-            avail_size = self.scroll_area.size()
-            scaled = self.pixmap.scaled(avail_size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.image_label.setPixmap(scaled)
-            self.image_label.adjustSize()
+        self.canvas.fit()
 
     def show_original_size(self):
-        self.image_label.setPixmap(self.pixmap)
-        self.image_label.adjustSize()
-
-    def resizeEvent(self, event):
-        self.fit_to_window()
-        super().resizeEvent(event)
+        self.canvas.actual_size()
@@ -1,30 +1,29 @@
 import os
 from PyQt6.QtCore import QObject, pyqtSignal, QRunnable, Qt
-from PyQt6.QtGui import QImageReader, QPixmap
-from app.database import scan_and_import_folder
+from PyQt6.QtGui import QImage, QImageReader
+from app.scanner import scan_library
+from app.scheduler import PRIORITY_INTERACTIVE
 
 class GeneratorWorker(QObject):
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
 
     # mode und input_image entfernt
-    def __init__(self, engine, params):
+    def __init__(self, scheduler, params):
         super().__init__()
-        self.engine = engine
+        self.scheduler = scheduler
         self.params = params
 
     def run(self):
         try:
-            # Check model switching
-            if self.engine.base_model_id != self.params.get("model_path"):
-                self.engine.base_model_id = self.params.get("model_path")
-                self.engine.base_pipeline = None 
-            
             # strength entfernt, da es nur für I2I relevant war
             gen_args = {k: v for k, v in self.params.items() if k not in ["model_path", "strength"]}
+            # Modellwechsel übernimmt die Engine (Pipeline-Cache)
+            gen_args["model_id"] = self.params.get("model_path")
             
-            # Nur T2I-Generierung
-            path = self.engine.generate(**gen_args)
+            # Nur T2I-Generierung, über die gemeinsame Job-Queue
+            job = self.scheduler.submit(gen_args, priority=PRIORITY_INTERACTIVE, source="desktop")
+            path = job.wait()
             
             self.finished.emit(path)
         except Exception as e:
@@ -32,34 +31,77 @@ class GeneratorWorker(QObject):
 
 class DBScannerWorker(QObject):
     finished = pyqtSignal(int)
+    # Fortschritt: verarbeitete / neue Dateien
+    progress = pyqtSignal(int, int)
     def run(self):
-        # Scannt den Ordner und gibt Anzahl neuer Bilder zurück
-        self.finished.emit(scan_and_import_folder())
+        # Scannt nur geänderte Ordner und gibt Anzahl neuer Bilder zurück
+        self.finished.emit(scan_library(progress_callback=self.progress.emit))
 
 class ThumbnailLoaderSignals(QObject):
-    # WICHTIG: Das Signal sendet jetzt 4 Werte: Pfad, Bild, Tooltip-Text, Daten-Dict
-    loaded = pyqtSignal(str, QPixmap, str, dict)
+    # Pfad + fertig skaliertes Bild. QImage statt QPixmap: Pixmaps dürfen nur im GUI-Thread entstehen
+    loaded = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str)
 
 class ThumbnailLoader(QRunnable):
-    def __init__(self, path, prompt, data, size=200):
+    def __init__(self, path, size=200, thumbnails=None):
         super().__init__()
         self.path = path
-        self.prompt = prompt
-        self.data = data  # Wir speichern die kompletten Zeilen-Daten
         self.size = size
+        self.thumbnails = thumbnails  # ThumbnailService (Disk-Cache), optional
         self.signals = ThumbnailLoaderSignals()
+        # Wird vom Aufrufer gesetzt, wenn das Ergebnis nicht mehr gebraucht wird
+        self.cancelled = False
 
     def run(self):
-        if not os.path.exists(self.path):
+        if self.cancelled or not os.path.exists(self.path):
+            self.signals.failed.emit(self.path)
             return
             
-        reader = QImageReader(self.path)
+        # Kleines Vorschaubild aus dem Cache statt das volle PNG zu dekodieren
+        source = self.path
+        if self.thumbnails:
+            try: source = self.thumbnails.get(self.path, self.size)
+            except Exception: pass
+            
+        reader = QImageReader(source)
         # Performance: Bild direkt beim Laden skalieren (spart RAM)
         orig = reader.size()
         if orig.isValid():
             reader.setScaledSize(orig.scaled(self.size, self.size, Qt.AspectRatioMode.KeepAspectRatio))
             
         img = reader.read()
-        if not img.isNull():
-            # Wir senden die Daten (self.data) wieder zurück an die GUI
-            self.signals.loaded.emit(self.path, QPixmap.fromImage(img), self.prompt, self.data)
+        if img.isNull() or self.cancelled:
+            self.signals.failed.emit(self.path)
+        else:
+            self.signals.loaded.emit(self.path, img)
+
+class ImagePyramidSignals(QObject):
+    # Pfad + Stufen [Original, 1/2, 1/4, ...]
+    loaded = pyqtSignal(str, list)
+    failed = pyqtSignal(str, str)
+
+class ImagePyramidLoader(QRunnable):
+    """Dekodiert ein Bild im Hintergrund und baut die Mip-Stufen bis min_edge herunter."""
+    def __init__(self, path, min_edge=256):
+        super().__init__()
+        self.path = path
+        self.min_edge = min_edge
+        self.signals = ImagePyramidSignals()
+
+    def run(self):
+        reader = QImageReader(self.path)
+        reader.setAutoTransform(True)
+        img = reader.read()
+        if img.isNull():
+            self.signals.failed.emit(self.path, reader.errorString())
+            return
+
+        # Einheitliches Format, damit drawImage nicht bei jedem Zeichnen konvertieren muss
+        img = img.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied if img.hasAlphaChannel() else QImage.Format.Format_RGB32)
+        levels = [img]
+        # Jede Stufe aus der vorherigen halbieren (günstiger und schärfer als alles aus dem Original)
+        while max(levels[-1].width(), levels[-1].height()) > self.min_edge * 2:
+            prev = levels[-1]
+            levels.append(prev.scaled(max(1, prev.width() // 2), max(1, prev.height() // 2),
+                                      Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        self.signals.loaded.emit(self.path, levels)